@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trunk.middleware.server_timing_middleware',
     'corsheaders.middleware.CorsMiddleware', #
     'django.middleware.common.CommonMiddleware', #
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,12 +82,60 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres switches to PostgreSQL with psycopg's connection pool;
+# the default is the SQLite file, tuned for concurrent readers plus one writer.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'trunk'),
+            'USER': os.getenv('POSTGRES_USER', 'trunk'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Pooled connections are reused by the pool, so CONN_MAX_AGE must stay 0
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                },
+            },
+        }
+    }
+else:
+    SQLITE_PATH = Path(os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'))
+    # journal_mode=WAL is stored in the file's header, so it would rewrite the
+    # development db.sqlite3 checked into the repo: it's on for any other file
+    # (point SQLITE_PATH elsewhere when deploying). SQLITE_WAL=1/0 overrides.
+    _committed_db = SQLITE_PATH.resolve() == (BASE_DIR / 'db.sqlite3').resolve()
+    SQLITE_WAL = os.getenv('SQLITE_WAL', '0' if _committed_db else '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+            # Keep connections across requests instead of reopening the file each time
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # WAL lets readers run alongside the single writer; IMMEDIATE takes the
+                # write lock at BEGIN so concurrent creates queue on busy_timeout
+                # instead of failing with "database is locked" on lock upgrade.
+                'init_command': (
+                    ('PRAGMA journal_mode=WAL;' if SQLITE_WAL else '')
+                    + 'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', 65536))};"
+                    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', 268435456))};"
+                ),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -131,3 +180,86 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 OPENROUTESERVICE_API_KEY = os.getenv('ORS_KEY') #
+
+# Geocode cache: in-process LRU in front of the GeocodeCacheEntry table
+GEOCODE_CACHE_TTL_SECONDS = int(os.getenv('GEOCODE_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 20000))
+GEOCODE_CACHE_MEMORY_SIZE = int(os.getenv('GEOCODE_CACHE_MEMORY_SIZE', 2048))
+
+# Concurrent geocoding in TripViewSet.create: pool size and one deadline for the whole stage
+GEOCODE_MAX_WORKERS = int(os.getenv('GEOCODE_MAX_WORKERS', 8))
+GEOCODE_STAGE_DEADLINE_SECONDS = float(os.getenv('GEOCODE_STAGE_DEADLINE_SECONDS', 12))
+# Deadline for the directions call (with its retries) of one trip, sync or async
+ROUTE_STAGE_DEADLINE_SECONDS = float(os.getenv('ROUTE_STAGE_DEADLINE_SECONDS', 45))
+
+# Shared ORS HTTP client. Point ORS_BASE_URL at a local stand-in for tests/load tests.
+ORS_BASE_URL = os.getenv('ORS_BASE_URL', 'https://api.openrouteservice.org')
+ORS_POOL_SIZE = int(os.getenv('ORS_POOL_SIZE', 10))
+# Connections for the async path (POST /api/trips/plan/ under ASGI), where one
+# process can have this many ORS calls in flight without a thread each
+ORS_ASYNC_POOL_SIZE = int(os.getenv('ORS_ASYNC_POOL_SIZE', 100))
+ORS_TIMEOUTS = {
+    'geocode': float(os.getenv('ORS_GEOCODE_TIMEOUT', 10)),
+    'directions': float(os.getenv('ORS_DIRECTIONS_TIMEOUT', 30)),
+}
+ORS_MAX_RETRIES = int(os.getenv('ORS_MAX_RETRIES', 3))
+ORS_BACKOFF_BASE_SECONDS = float(os.getenv('ORS_BACKOFF_BASE_SECONDS', 0.5))
+ORS_BACKOFF_MAX_SECONDS = float(os.getenv('ORS_BACKOFF_MAX_SECONDS', 8))
+# Per-endpoint circuit breaker: after this many consecutive failures, fail fast
+# with a 503 for ORS_BREAKER_RESET_SECONDS, then let a probe through
+ORS_BREAKER_FAILURE_THRESHOLD = int(os.getenv('ORS_BREAKER_FAILURE_THRESHOLD', 5))
+ORS_BREAKER_RESET_SECONDS = float(os.getenv('ORS_BREAKER_RESET_SECONDS', 30))
+ORS_BREAKER_HALF_OPEN_PROBES = int(os.getenv('ORS_BREAKER_HALF_OPEN_PROBES', 1))
+
+# Directions cache keyed on coordinates rounded to ROUTE_CACHE_PRECISION decimals (4 ≈ 11 m)
+ROUTE_CACHE_PRECISION = int(os.getenv('ROUTE_CACHE_PRECISION', 4))
+ROUTE_CACHE_TTL_SECONDS = int(os.getenv('ROUTE_CACHE_TTL_SECONDS', 6 * 3600))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv('ROUTE_CACHE_MAX_ENTRIES', 512))
+ROUTE_CACHE_MAX_BYTES = int(os.getenv('ROUTE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Background trip planning: POST /api/trips/?async=1 (or always, when TRIP_PLANNING_ASYNC=1)
+# returns 202 and `python manage.py run_planning_workers` finishes the trip.
+TRIP_PLANNING_ASYNC = os.getenv('TRIP_PLANNING_ASYNC', '0') == '1'
+PLANNING_MAX_ATTEMPTS = int(os.getenv('PLANNING_MAX_ATTEMPTS', 3))
+PLANNING_RETRY_DELAY_SECONDS = int(os.getenv('PLANNING_RETRY_DELAY_SECONDS', 30))
+PLANNING_STALE_AFTER_SECONDS = int(os.getenv('PLANNING_STALE_AFTER_SECONDS', 300))
+
+# POST /api/trips/batch/
+BATCH_MAX_TRIPS = int(os.getenv('BATCH_MAX_TRIPS', 500))
+# Directions calls in flight at once, shared by every batch in the process
+BATCH_ROUTE_CONCURRENCY = int(os.getenv('BATCH_ROUTE_CONCURRENCY', 4))
+# Deadline for each of the batch geocode and route stages
+BATCH_STAGE_DEADLINE_SECONDS = float(os.getenv('BATCH_STAGE_DEADLINE_SECONDS', 120))
+
+# Stop placement (services.stops). TRUCK_STOPS_FILE: optional CSV (name,lon,lat) or GeoJSON points
+FUEL_INTERVAL_MILES = float(os.getenv('FUEL_INTERVAL_MILES', 1000))
+TRUCK_STOPS_FILE = os.getenv('TRUCK_STOPS_FILE', '')
+TRUCK_STOP_SNAP_MILES = float(os.getenv('TRUCK_STOP_SNAP_MILES', 15))
+TRUCK_STOP_GRID_DEGREES = float(os.getenv('TRUCK_STOP_GRID_DEGREES', 0.5))
+
+# Rendered log sheets (HTML/PDF), see trunk.services.artifact_cache
+ARTIFACT_CACHE_DIR = os.getenv('ARTIFACT_CACHE_DIR', str(BASE_DIR / 'artifact_cache'))
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv('ARTIFACT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+ARTIFACT_CACHE_MEMORY_SIZE = int(os.getenv('ARTIFACT_CACHE_MEMORY_SIZE', 64))
+
+# Fleet log export: render processes for manage.py export_logs (GET /api/trips/export/
+# renders in the web process, through the artifact cache)
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', os.cpu_count() or 2))
+EXPORT_MAX_TRIPS = int(os.getenv('EXPORT_MAX_TRIPS', 20000))
+EXPORT_MERGED_PDF_MAX_TRIPS = int(os.getenv('EXPORT_MERGED_PDF_MAX_TRIPS', 500))
+
+# ROUTING_BACKEND=offline answers directions from a local road graph built with
+# `python manage.py build_road_graph` instead of calling ORS
+ROUTING_BACKEND = os.getenv('ROUTING_BACKEND', 'ors')
+ROAD_GRAPH_DIR = os.getenv('ROAD_GRAPH_DIR', str(BASE_DIR / 'road_graph'))
+ROAD_GRAPH_SNAP_MILES = float(os.getenv('ROAD_GRAPH_SNAP_MILES', 5))
+
+# GEOCODER_BACKEND=local resolves locations from the gazetteer built with
+# `python manage.py build_gazetteer` first and only asks ORS on a miss
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'ors')
+GAZETTEER_DIR = os.getenv('GAZETTEER_DIR', str(BASE_DIR / 'gazetteer'))
+
+# Stage timers, Server-Timing headers and /api/metrics (Prometheus text).
+# With METRICS_ENABLED=0 the timers are no-ops and the middleware unloads.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', '1') == '1'
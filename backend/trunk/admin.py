@@ -1,6 +1,9 @@
 from django.contrib import admin
-from .models import Trip
+from .models import Trip, GeocodeCacheEntry, PlanningJob, DriverRecap
 
 admin.site.register(Trip)
+admin.site.register(GeocodeCacheEntry)
+admin.site.register(PlanningJob)
+admin.site.register(DriverRecap)
 
 
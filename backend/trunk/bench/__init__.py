@@ -0,0 +1,6 @@
+"""
+Performance tooling: a local ORS stand-in and load/micro benchmarks.
+
+Nothing here is imported by the app itself; it is driven from the
+`loadtest` and `microbench` management commands.
+"""
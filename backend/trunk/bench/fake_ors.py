@@ -0,0 +1,170 @@
+"""
+Local OpenRouteService stand-in for load tests.
+
+Serves /geocode/search and /v2/directions/* on a loopback port with a
+configurable latency and error profile, so a benchmark measures our code
+and not the public API (or its quota). Point ORS_BASE_URL at `.url` and
+call ors_client.reset_client().
+
+Answers are deterministic: a place string always geocodes to the same
+point in the continental US, and directions are straight lines between
+the waypoints at 55 mph, returned in ORS's JSON "routes" format with an
+encoded polyline geometry.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from ..services import polyline
+from ..services.route_index import haversine_miles
+
+ROAD_FACTOR = 1.2           # road miles per great-circle mile
+POINTS_PER_LEG = 200
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts into 1s SYN retries
+    request_queue_size = 1024
+
+
+@dataclass
+class Profile:
+    """
+    latency_ms + uniform(0, jitter_ms) per request; slow_rate of requests
+    take slow_ms instead (the tail); error_rate of requests fail with
+    error_status (429s carry Retry-After: 1).
+    """
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    slow_rate: float = 0.0
+    slow_ms: float = 2000.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+def fake_geocode(text):
+    digest = hashlib.blake2b(text.strip().lower().encode(), digest_size=8).digest()
+    a, b = int.from_bytes(digest[:4], "big"), int.from_bytes(digest[4:], "big")
+    return [round(-122 + 47 * a / 2 ** 32, 6), round(29 + 18 * b / 2 ** 32, 6)]
+
+
+def fake_directions(coordinates):
+    points, segments, way_points = [coordinates[0]], [], [0]
+    for (lon1, lat1), (lon2, lat2) in zip(coordinates, coordinates[1:]):
+        points.extend([lon1 + (lon2 - lon1) * t / POINTS_PER_LEG, lat1 + (lat2 - lat1) * t / POINTS_PER_LEG]
+                      for t in range(1, POINTS_PER_LEG + 1))
+        miles = float(haversine_miles(lon1, lat1, lon2, lat2)) * ROAD_FACTOR
+        segments.append({"distance": round(miles, 1), "duration": round(miles / 55 * 3600, 1)})
+        way_points.append(len(points) - 1)
+    summary = {
+        "distance": round(sum(s["distance"] for s in segments), 1),
+        "duration": round(sum(s["duration"] for s in segments), 1),
+    }
+    return {"routes": [{
+        "summary": summary,
+        "segments": segments,
+        "way_points": way_points,
+        "geometry": polyline.encode(points),
+    }]}
+
+
+class FakeORSServer:
+    """
+    with FakeORSServer(Profile(latency_ms=120)) as ors:
+        settings.ORS_BASE_URL = ors.url
+    """
+
+    def __init__(self, profile=None, host="127.0.0.1", port=0, seed=None):
+        self.profile = profile or Profile()
+        self.counts = {"geocode": 0, "directions": 0, "errors": 0, "slow": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ors", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draw(self, endpoint):
+        """(delay seconds, error status or None) for the next request."""
+        p = self.profile
+        with self._lock:
+            self.counts[endpoint] += 1
+            slow = self._random.random() < p.slow_rate
+            failed = self._random.random() < p.error_rate
+            jitter = self._random.uniform(0, p.jitter_ms)
+            self.counts["slow"] += slow
+            self.counts["errors"] += failed
+        delay_ms = p.slow_ms if slow else p.latency_ms + jitter
+        return delay_ms / 1000, (p.error_status if failed else None)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"       # keep-alive, like the real API
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != "/geocode/search":
+                    return self._send(404, {"error": "not found"})
+                text = (parse_qs(url.query).get("text") or [""])[0]
+                self._answer("geocode", lambda: {"features": [
+                    {"geometry": {"type": "Point", "coordinates": fake_geocode(text)}}
+                ]})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if not self.path.startswith("/v2/directions/"):
+                    return self._send(404, {"error": "not found"})
+                try:
+                    coordinates = json.loads(body)["coordinates"]
+                except (ValueError, KeyError):
+                    return self._send(400, {"error": "coordinates required"})
+                self._answer("directions", lambda: fake_directions(coordinates))
+
+            def _answer(self, endpoint, build):
+                delay, error = server._draw(endpoint)
+                time.sleep(delay)
+                if error:
+                    headers = {"Retry-After": "1"} if error == 429 else {}
+                    return self._send(error, {"error": f"injected {error}"}, headers)
+                self._send(200, build())
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,254 @@
+"""
+End-to-end load test of the trip API.
+
+Each stage fires `requests` calls at `concurrency` against the Django app,
+in process and without a network socket. Under WSGI, that means
+django.test.Client on a thread per worker. Under ASGI, it means
+AsyncClient with one task per worker. The stages are:
+
+    create  POST /api/trips/                 geocode + route (fake ORS) + HOS plan
+    plan    POST /api/trips/plan/            the same, on the native async view
+    list    GET  /api/trips/                 keyset page of the lightweight listing
+    logs    GET  /api/trips/<id>/logs/       rendered log sheets (artifact cache)
+
+Everything runs against a throwaway database, a local FakeORSServer and
+an empty artifact cache directory, so runs are repeatable and never touch
+real data or the ORS quota. Caches are cleared before each interface, so
+WSGI and ASGI both start cold.
+"""
+import asyncio
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from ..services import artifact_cache, geocode_cache, ors_client, route_cache
+from .fake_ors import FakeORSServer
+
+STAGES = ("create", "plan", "list", "logs")
+INTERFACES = ("wsgi", "asgi")
+STATES = ("TX", "OK", "KS", "NM", "CO", "AR", "LA", "MO", "NE", "AZ")
+
+
+@dataclass
+class StageResult:
+    interface: str
+    stage: str
+    concurrency: int
+    seconds: float = 0.0
+    latencies: list = field(default_factory=list, repr=False)
+    statuses: dict = field(default_factory=dict)
+    errors: int = 0
+
+    def record(self, seconds, status):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status >= 400:
+            self.errors += 1
+
+    def summary(self):
+        ms = np.asarray(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+        return {
+            "interface": self.interface,
+            "stage": self.stage,
+            "concurrency": self.concurrency,
+            "requests": len(ms),
+            "errors": self.errors,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "seconds": round(self.seconds, 3),
+            "throughput_rps": round(len(ms) / self.seconds, 2) if self.seconds else 0.0,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(ms.max()), 2) if len(ms) else 0.0,
+            "mean_ms": round(float(ms.mean()), 2) if len(ms) else 0.0,
+        }
+
+
+class Workload:
+    """
+    The request behind call i of each stage. Locations come from a pool of
+    `places` names, so geocode and route caches see realistic reuse; logs
+    requests cycle over the trips the create stage made.
+    """
+
+    def __init__(self, places=200, seed=0):
+        rng = random.Random(seed)
+        self.places = [f"Terminal {k:04d}, {rng.choice(STATES)}" for k in range(places)]
+        self.trip_ids = []
+
+    def create_body(self, i, stage="create"):
+        # Seeded per stage, so plan doesn't just replay create's (now cached) lanes
+        rng = random.Random(f"{stage}-{i}")
+        current, pickup, dropoff = rng.sample(self.places, 3)
+        return {
+            "current_location": current,
+            "pickup_location": pickup,
+            "dropoff_location": dropoff,
+            "cycle_used_hours": rng.choice([0, 8, 20, 35, 52]),
+            "driver_id": f"load-{i % 50:02d}",
+        }
+
+    def request(self, stage, i):
+        """(method, path, json body or None)."""
+        if stage == "create":
+            return "post", "/api/trips/", self.create_body(i, stage)
+        if stage == "plan":
+            return "post", "/api/trips/plan/", self.create_body(i, stage)
+        if stage == "list":
+            return "get", "/api/trips/", None
+        if not self.trip_ids:
+            raise RuntimeError("The logs stage needs trips; run the create or plan stage first")
+        return "get", f"/api/trips/{self.trip_ids[i % len(self.trip_ids)]}/logs/", None
+
+    def collect(self, stage, response):
+        if stage in ("create", "plan") and response.status_code == 201:
+            self.trip_ids.append(response.json()["trip_id"])
+
+
+def _call(client, method, path, body):
+    if method == "post":
+        return client.post(path, body, content_type="application/json")
+    return client.get(path)
+
+
+def run_stage_wsgi(workload, stage, requests, concurrency):
+    result = StageResult("wsgi", stage, concurrency)
+    calls = itertools.count()
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        try:
+            while (i := next(calls)) < requests:
+                method, path, body = workload.request(stage, i)
+                started = time.perf_counter()
+                response = _call(client, method, path, body)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    result.record(elapsed, response.status_code)
+                    workload.collect(stage, response)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, name=f"load-{n}") for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def run_stage_asgi(workload, stage, requests, concurrency):
+    result = StageResult("asgi", stage, concurrency)
+
+    async def worker(calls):
+        client = AsyncClient()
+        while (i := next(calls)) < requests:
+            method, path, body = workload.request(stage, i)
+            started = time.perf_counter()
+            response = await _call(client, method, path, body)
+            result.record(time.perf_counter() - started, response.status_code)
+            workload.collect(stage, response)
+
+    async def main():
+        calls = itertools.count()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(calls) for _ in range(concurrency)))
+        result.seconds = time.perf_counter() - started
+        # Sync views ran on asgiref's shared thread; close what it opened
+        await sync_to_async(connections.close_all)()
+
+    asyncio.run(main())
+    return result
+
+
+RUNNERS = {"wsgi": run_stage_wsgi, "asgi": run_stage_asgi}
+
+
+@contextmanager
+def throwaway_database():
+    """A fresh, migrated test database for the default alias (a temp file on SQLite)."""
+    connection = connections["default"]
+    old_name = connection.settings_dict["NAME"]
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        # Not the in-memory default: shared-cache memory databases lock whole tables
+        tmp_dir = tempfile.mkdtemp(prefix="trunk-loadtest-")
+        test_settings["NAME"] = os.path.join(tmp_dir, "loadtest.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        # Points the alias back at the real database
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _clear_caches():
+    route_cache.clear()
+    geocode_cache.clear()
+    artifact_cache.clear()
+
+
+def run_load_test(interfaces=INTERFACES, stages=STAGES, requests=200, concurrency=8,
+                  profile=None, places=200, on_result=None):
+    """
+    Run every stage under every interface; returns a JSON-ready report.
+    `on_result(summary)` is called after each stage.
+    """
+    report = {
+        "config": {
+            "interfaces": list(interfaces), "stages": list(stages), "requests": requests,
+            "concurrency": concurrency, "places": places,
+            "ors_profile": asdict(profile) if profile else None,
+        },
+        "results": [],
+    }
+    artifact_dir = tempfile.mkdtemp(prefix="trunk-loadtest-artifacts-")
+    try:
+        with FakeORSServer(profile, seed=0) as ors, throwaway_database(), override_settings(
+            DEBUG=False,
+            ORS_BASE_URL=ors.url,
+            ROUTING_BACKEND="ors",
+            GEOCODER_BACKEND="ors",
+            TRIP_PLANNING_ASYNC=False,
+            ARTIFACT_CACHE_DIR=artifact_dir,
+        ):
+            ors_client.reset_client()
+            try:
+                for interface in interfaces:
+                    _clear_caches()
+                    workload = Workload(places=places)
+                    for stage in stages:
+                        summary = RUNNERS[interface](workload, stage, requests, concurrency).summary()
+                        report["results"].append(summary)
+                        if on_result:
+                            on_result(summary)
+            finally:
+                # Still inside the overrides: only the test database and temp dir are wiped
+                _clear_caches()
+                ors_client.reset_client()
+            report["ors"] = dict(ors.counts)
+    finally:
+        shutil.rmtree(artifact_dir, ignore_errors=True)
+    return report
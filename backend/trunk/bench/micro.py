@@ -0,0 +1,238 @@
+"""
+Micro-benchmarks for the CPU-side hot paths of a trip request.
+
+Every benchmark runs on a fixed fixture (same trips, same route, same start
+date), so numbers only move when the code does:
+
+    plan.short / plan.long / plan.reset   plan_hos_compliant_trip without a route
+    plan.long_route                       ... with fuel stops placed on a RouteIndex
+    route.simplify                        zoom levels precomputed when a route is saved
+    pdf.day                               one log sheet drawn into a canvas
+    pdf.trip                              generate_trip_logs_pdf for the long trip
+    html.trip                             render_logs_html (TripViewSet.print_logs)
+
+Timing is timeit-style: warm up, calibrate a loop count that makes one
+round take at least `min_time`, then time `rounds` rounds and report
+per-call statistics. A saved baseline (save_baseline) is compared against
+with compare(): a benchmark regresses when its median is more than
+`tolerance` slower and the gap is larger than the baseline's own spread.
+"""
+import gc
+import io
+import json
+import platform
+import statistics
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+from django.utils import timezone
+from reportlab.lib.pagesizes import LETTER
+from reportlab.pdfgen import canvas
+
+from ..services.hos_planner import plan_hos_compliant_trip
+from ..services.log_html import render_logs_html
+from ..services.logsheet_generator import daily_logs, draw_daily_log, generate_trip_logs_pdf
+from ..services.route_geometry import simplify
+from ..services.route_index import RouteIndex
+from .fake_ors import fake_directions
+
+BASELINE_VERSION = 1
+START_DATE = date(2025, 3, 3)
+TRIP_ID = uuid.UUID("00000000-0000-4000-8000-000000000021")
+
+# (driving hours, cycle hours used): one day, a week on the road, and a
+# trip that runs out of 70-hour cycle and needs a 34-hour restart
+PLANS = {
+    "short": (6.5, Decimal("12")),
+    "long": (44, Decimal("8")),
+    "reset": (30, Decimal("60")),
+}
+# Dallas -> Chicago -> Seattle, as the fake ORS routes it
+ROUTE_WAYPOINTS = [[-96.80, 32.78], [-87.63, 41.88], [-122.33, 47.61]]
+
+
+def _plan_args(name):
+    hours, cycle = PLANS[name]
+    return int(hours * 3600), cycle
+
+
+def _trip(plan, miles):
+    return SimpleNamespace(
+        id=TRIP_ID,
+        current_location="Dallas, TX",
+        pickup_location="Chicago, IL",
+        dropoff_location="Seattle, WA",
+        total_distance_miles=Decimal(str(miles)),
+        hos_plan=plan,
+        hos_computed_at=timezone.now(),
+    )
+
+
+def _bench_plan(name):
+    seconds, cycle = _plan_args(name)
+    return lambda: plan_hos_compliant_trip(seconds, cycle, START_DATE)
+
+
+def _bench_plan_route():
+    route = fake_directions(ROUTE_WAYPOINTS)
+    index = RouteIndex.from_route(route)
+    seconds = int(route["routes"][0]["summary"]["duration"])
+    return lambda: plan_hos_compliant_trip(seconds, Decimal("8"), START_DATE, route_index=index)
+
+
+def _bench_simplify():
+    route = fake_directions(ROUTE_WAYPOINTS)
+    return lambda: simplify(route)
+
+
+def _long_trip():
+    seconds, cycle = _plan_args("long")
+    return _trip(plan_hos_compliant_trip(seconds, cycle, START_DATE), 2400)
+
+
+def _bench_pdf_day():
+    trip = _long_trip()
+    day = daily_logs(trip)[0]
+
+    def run():
+        c = canvas.Canvas(io.BytesIO(), pagesize=LETTER)
+        draw_daily_log(c, day, trip)
+        c.save()
+    return run
+
+
+def _bench_pdf_trip():
+    trip = _long_trip()
+    return lambda: generate_trip_logs_pdf(trip)
+
+
+def _bench_html_trip():
+    trip = _long_trip()
+    return lambda: render_logs_html(trip)
+
+
+# name -> setup(); setup builds the fixture once and returns the timed callable
+BENCHMARKS = {
+    "plan.short": lambda: _bench_plan("short"),
+    "plan.long": lambda: _bench_plan("long"),
+    "plan.reset": lambda: _bench_plan("reset"),
+    "plan.long_route": _bench_plan_route,
+    "route.simplify": _bench_simplify,
+    "pdf.day": _bench_pdf_day,
+    "pdf.trip": _bench_pdf_trip,
+    "html.trip": _bench_html_trip,
+}
+
+
+def _time(fn, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - started
+
+
+def measure(fn, rounds=15, warmup=0.2, min_time=0.05):
+    """Per-call timing statistics for `fn`, in seconds."""
+    deadline = time.perf_counter() + warmup
+    fn()
+    while time.perf_counter() < deadline:
+        fn()
+
+    number = 1
+    while True:
+        elapsed = _time(fn, number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()                # a collection mid-round is noise, not the code under test
+    try:
+        samples = [_time(fn, number) / number for _ in range(rounds)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    q1, q3 = np.percentile(samples, [25, 75])
+    return {
+        "rounds": rounds,
+        "loops": number,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if rounds > 1 else 0.0,
+        "iqr": float(q3 - q1),
+        "max": max(samples),
+    }
+
+
+def run_benchmarks(names=None, rounds=15, warmup=0.2, min_time=0.05, on_result=None):
+    """{name: stats} for the selected benchmarks (all by default), in registry order."""
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup(), rounds=rounds, warmup=warmup, min_time=min_time)
+        if on_result:
+            on_result(name, results[name])
+    return results
+
+
+def environment():
+    import reportlab
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "reportlab": reportlab.Version,
+    }
+
+
+def save_baseline(results, path):
+    with open(path, "w") as f:
+        json.dump({
+            "version": BASELINE_VERSION,
+            "created": timezone.now().isoformat(),
+            "environment": environment(),
+            "benchmarks": results,
+        }, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{path} is baseline version {baseline.get('version')}, expected {BASELINE_VERSION}")
+    return baseline
+
+
+def compare(results, baseline, tolerance=0.10):
+    """
+    One row per benchmark present in both: {name, baseline, current, ratio,
+    status}, status being "regressed", "improved" or "same". Medians are
+    compared; a change only counts if it exceeds both `tolerance` and the
+    baseline's interquartile range.
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        ratio = current["median"] / before["median"]
+        gap = abs(current["median"] - before["median"])
+        significant = gap > before["iqr"]
+        if ratio > 1 + tolerance and significant:
+            status = "regressed"
+        elif ratio < 1 - tolerance and significant:
+            status = "improved"
+        else:
+            status = "same"
+        rows.append({"name": name, "baseline": before["median"], "current": current["median"],
+                     "ratio": ratio, "status": status})
+    return rows
@@ -0,0 +1,123 @@
+import json
+import zlib
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .services import polyline
+
+MAGIC = b"CR1"
+POLYLINE_KEY = "__polyline__"
+PRECISION = 6  # ~0.1 m, lossless for ORS output (5-6 decimals)
+
+
+class PackedRoute(bytes):
+    """Raw column value that hasn't been decoded yet."""
+
+
+def pack_route(data):
+    """
+    Compact encoding for ORS responses: every LineString coordinate array is
+    replaced by a delta-encoded polyline, then the whole envelope is zlib'd.
+    """
+    envelope = _replace_coordinates(data)
+    return MAGIC + zlib.compress(json.dumps(envelope, separators=(",", ":")).encode(), 9)
+
+
+def unpack_route(blob):
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    if not blob.startswith(MAGIC):
+        # Pre-migration rows / anything written as plain JSON
+        return json.loads(blob)
+    return _restore_coordinates(json.loads(zlib.decompress(blob[len(MAGIC):])))
+
+
+def _is_line(value):
+    return (
+        isinstance(value, list) and len(value) > 1
+        and all(isinstance(p, list) and len(p) == 2
+                and all(isinstance(c, (int, float)) for c in p) for p in value)
+    )
+
+
+def _replace_coordinates(value):
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k == "coordinates" and _is_line(v):
+                out[k] = {POLYLINE_KEY: polyline.encode(v, PRECISION)}
+            else:
+                out[k] = _replace_coordinates(v)
+        return out
+    if isinstance(value, list):
+        return [_replace_coordinates(v) for v in value]
+    return value
+
+
+def _restore_coordinates(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and POLYLINE_KEY in value:
+            return polyline.decode(value[POLYLINE_KEY], PRECISION)
+        return {k: _restore_coordinates(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore_coordinates(v) for v in value]
+    return value
+
+
+class LazyRouteAttribute(DeferredAttribute):
+    """Decode the packed column on first attribute access, not when the row is loaded."""
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, PackedRoute):
+            value = unpack_route(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # Defining __set__ makes this a data descriptor, so __get__ runs even
+        # though the value lives in instance.__dict__.
+        instance.__dict__[self.field.attname] = value
+
+
+class CompactRouteField(models.BinaryField):
+    """
+    Stores JSON route documents (ORS directions responses) as a compressed
+    blob. Reads and writes plain dicts, like the JSONField it replaces.
+    """
+
+    descriptor_class = LazyRouteAttribute
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("editable") is True:
+            del kwargs["editable"]
+        else:
+            kwargs["editable"] = False
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return PackedRoute(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, PackedRoute):
+            return bytes(value)
+        return pack_route(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return unpack_route(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trunk.services.gazetteer import build_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the local geocoder index (GEOCODER_BACKEND=local) from a places CSV with columns "
+        "name, lon, lat and optionally state, zip, population."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Places CSV (cities, ZIP centroids, terminals, ...)")
+        parser.add_argument("--out", default=None, help="Output directory (default GAZETTEER_DIR)")
+
+    def handle(self, *args, **options):
+        out = options["out"] or settings.GAZETTEER_DIR
+        started = time.perf_counter()
+        try:
+            meta = build_index(options["source"], out)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not build gazetteer: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {out}: {meta['keys']} keys for {meta['places']} places "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trunk.services.road_graph import build_graph
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the offline routing graph (ROUTING_BACKEND=offline) from OSM road lines exported as "
+        "GeoJSON or GeoJSONSeq, e.g. `osmium export -f geojsonseq roads.osm.pbf -o roads.geojsonl`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="GeoJSON / .geojsonl file of highway=* lines with OSM tags as properties")
+        parser.add_argument("--out", default=None, help="Output directory (default ROAD_GRAPH_DIR)")
+        parser.add_argument("--max-speed", type=float, default=65, help="Truck speed cap in mph")
+        parser.add_argument("--weight", type=float, default=36, help="Truck weight in tonnes, for maxweight")
+        parser.add_argument("--height", type=float, default=4.1, help="Truck height in metres, for maxheight")
+
+    def handle(self, *args, **options):
+        out = options["out"] or settings.ROAD_GRAPH_DIR
+        started = time.perf_counter()
+        try:
+            meta = build_graph(
+                options["source"], out,
+                max_speed_mph=options["max_speed"],
+                weight_tonnes=options["weight"],
+                height_m=options["height"],
+            )
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not build road graph: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {out}: {meta['nodes']} nodes, {meta['edges']} edges from {meta['ways']} ways "
+            f"({meta['skipped_ways']} skipped) in {time.perf_counter() - started:.1f}s"
+        ))
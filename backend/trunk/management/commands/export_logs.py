@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trunk.services.fleet_export import (
+    ExportError, parse_bound, select_trips, stream_export_zip, export_merged_pdf,
+)
+
+
+class Command(BaseCommand):
+    help = "Export the daily logs of every planned trip created in [--start, --end) to a zip or one PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", required=True, help="YYYY-MM-DD or ISO datetime (inclusive)")
+        parser.add_argument("--end", required=True, help="YYYY-MM-DD or ISO datetime (exclusive)")
+        parser.add_argument("--out", required=True, help="Output file")
+        parser.add_argument("--format", choices=["zip", "pdf"], default="zip")
+        parser.add_argument("--workers", type=int, default=None, help="Render processes (default EXPORT_WORKERS)")
+        parser.add_argument("--quiet", action="store_true", help="Don't print per-trip timings")
+
+    def handle(self, *args, **options):
+        try:
+            start, end = parse_bound(options["start"]), parse_bound(options["end"])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        trips = select_trips(start, end)
+        count = trips.count()
+        self.stdout.write(f"Exporting {count} trip(s) created in [{start:%Y-%m-%d %H:%M}, {end:%Y-%m-%d %H:%M})")
+        stats = {"trips": 0, "seconds": 0.0}
+
+        def report(trip_id, pages, size, seconds):
+            stats["trips"] += 1
+            stats["seconds"] += seconds
+            if not options["quiet"]:
+                self.stdout.write(f"  {trip_id}  {pages:3d} page(s)  {seconds * 1000:8.1f} ms")
+
+        started = time.perf_counter()
+        with open(options["out"], "wb") as out:
+            if options["format"] == "pdf":
+                try:
+                    out.write(export_merged_pdf(list(trips), on_result=report).getvalue())
+                except ExportError as e:
+                    raise CommandError(str(e))
+            else:
+                for chunk in stream_export_zip(trips.iterator(chunk_size=200), options["workers"], on_result=report):
+                    out.write(chunk)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['out']}: {stats['trips']} trip(s) in {elapsed:.2f}s "
+            f"(render time {stats['seconds']:.2f}s)"
+        ))
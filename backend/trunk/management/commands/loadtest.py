@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trunk.bench.fake_ors import Profile
+from trunk.bench.load import INTERFACES, STAGES, run_load_test
+
+COLUMNS = ("interface", "stage", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+class Command(BaseCommand):
+    help = ("Load-test POST /trips/, GET /trips/ and GET /trips/<id>/logs/ under WSGI and ASGI "
+            "against a throwaway database and a local fake ORS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interface", choices=INTERFACES + ("both",), default="both")
+        parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per stage")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+        parser.add_argument("--places", type=int, default=200, help="Distinct locations trips are drawn from")
+        parser.add_argument("--ors-latency-ms", type=float, default=50.0)
+        parser.add_argument("--ors-jitter-ms", type=float, default=20.0)
+        parser.add_argument("--ors-slow-rate", type=float, default=0.0, help="Fraction of ORS calls that take --ors-slow-ms")
+        parser.add_argument("--ors-slow-ms", type=float, default=2000.0)
+        parser.add_argument("--ors-error-rate", type=float, default=0.0, help="Fraction of ORS calls that fail")
+        parser.add_argument("--ors-error-status", type=int, default=503)
+        parser.add_argument("--json", dest="json_path", help="Also write the full report here")
+
+    def handle(self, *args, **options):
+        stages = [s.strip() for s in options["stages"].split(",") if s.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+        if "logs" in stages and not {"create", "plan"} & set(stages):
+            raise CommandError("The logs stage needs the create or plan stage")
+        interfaces = INTERFACES if options["interface"] == "both" else (options["interface"],)
+        profile = Profile(
+            latency_ms=options["ors_latency_ms"],
+            jitter_ms=options["ors_jitter_ms"],
+            slow_rate=options["ors_slow_rate"],
+            slow_ms=options["ors_slow_ms"],
+            error_rate=options["ors_error_rate"],
+            error_status=options["ors_error_status"],
+        )
+
+        self.stdout.write("  ".join(f"{c:>14}" for c in COLUMNS))
+
+        def report_row(summary):
+            self.stdout.write("  ".join(f"{summary[c]:>14}" for c in COLUMNS))
+
+        report = run_load_test(
+            interfaces=interfaces,
+            stages=stages,
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            profile=profile,
+            places=options["places"],
+            on_result=report_row,
+        )
+        ors = report["ors"]
+        self.stdout.write(f"Fake ORS: {ors['geocode']} geocode, {ors['directions']} directions, "
+                          f"{ors['errors']} injected error(s), {ors['slow']} slow")
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['json_path']}"))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trunk.bench.micro import BENCHMARKS, compare, load_baseline, run_benchmarks, save_baseline
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:10.3f}"
+
+
+class Command(BaseCommand):
+    help = ("Time the planner, PDF log sheets and HTML logs on fixed fixtures; "
+            "save a JSON baseline or compare against one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+        parser.add_argument("--rounds", type=int, default=15)
+        parser.add_argument("--warmup", type=float, default=0.2, help="Warmup seconds per benchmark")
+        parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+        parser.add_argument("--save", metavar="PATH", help="Write the results as a baseline")
+        parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline; fails on regressions")
+        parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before a regression (0.10 = 10%%)")
+
+    def handle(self, *args, **options):
+        unknown = set(options["names"]) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = load_baseline(options["compare"])
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(f"{'benchmark':<18}{'median ms':>10}{'iqr ms':>10}{'min ms':>10}{'mean ms':>10}  loops x rounds")
+
+        def report(name, stats):
+            self.stdout.write(f"{name:<18}{_ms(stats['median'])}{_ms(stats['iqr'])}{_ms(stats['min'])}"
+                              f"{_ms(stats['mean'])}  {stats['loops']} x {stats['rounds']}")
+
+        results = run_benchmarks(
+            names=options["names"],
+            rounds=options["rounds"],
+            warmup=options["warmup"],
+            min_time=options["min_time"],
+            on_result=report,
+        )
+
+        if options["save"]:
+            save_baseline(results, options["save"])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save']}"))
+
+        if baseline:
+            rows = compare(results, baseline, options["tolerance"])
+            self.stdout.write(f"\nAgainst {options['compare']} ({baseline['created']}):")
+            for row in rows:
+                line = (f"{row['name']:<18}{_ms(row['baseline'])} -> {_ms(row['current'])} ms  "
+                        f"x{row['ratio']:.2f}  {row['status']}")
+                style = {"regressed": self.style.ERROR, "improved": self.style.SUCCESS}.get(row["status"])
+                self.stdout.write(style(line) if style else line)
+            regressed = [row["name"] for row in rows if row["status"] == "regressed"]
+            if regressed:
+                raise CommandError(f"Regressed: {', '.join(regressed)}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from trunk.services.planning_queue import run_workers
+
+
+class Command(BaseCommand):
+    help = "Process trips queued by POST /api/trips/?async=1 (pending → route_calculated → hos_compliant)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of planning threads")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls of an empty queue")
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} planning worker(s)")
+        run_workers(
+            num_workers=options["workers"],
+            poll_interval=options["poll"],
+            drain=options["drain"],
+        )
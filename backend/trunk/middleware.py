@@ -0,0 +1,46 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from .services import metrics
+
+
+def _finish(request, response, token, started):
+    total = time.perf_counter() - started
+    timings = metrics.end_request(token)
+    match = getattr(request, "resolver_match", None)
+    metrics.observe(
+        "trunk_http_request_seconds", total,
+        view=match.view_name if match else "unmatched",
+        method=request.method,
+        status=f"{response.status_code // 100}xx",
+    )
+    if settings.SERVER_TIMING_ENABLED:
+        response["Server-Timing"] = metrics.server_timing(timings, total)
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """
+    Times every request, collects the metrics.timer() blocks run while
+    handling it and reports them in a Server-Timing header. Unloaded
+    entirely when METRICS_ENABLED is off.
+    """
+    if not settings.METRICS_ENABLED:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started, token = time.perf_counter(), metrics.begin_request()
+            response = await get_response(request)
+            return _finish(request, response, token, started)
+    else:
+        def middleware(request):
+            started, token = time.perf_counter(), metrics.begin_request()
+            response = get_response(request)
+            return _finish(request, response, token, started)
+    return middleware
@@ -0,0 +1,42 @@
+# Moves Trip.route_raw from an uncompressed JSONField to CompactRouteField.
+
+from django.db import migrations
+
+import trunk.fields
+
+
+def pack_existing_routes(apps, schema_editor):
+    Trip = apps.get_model('trunk', 'Trip')
+    for trip in Trip.objects.filter(route_raw__isnull=False).only('id', 'route_raw').iterator():
+        Trip.objects.filter(pk=trip.pk).update(route_packed=trip.route_raw)
+
+
+def unpack_existing_routes(apps, schema_editor):
+    Trip = apps.get_model('trunk', 'Trip')
+    for trip in Trip.objects.filter(route_packed__isnull=False).only('id', 'route_packed').iterator():
+        Trip.objects.filter(pk=trip.pk).update(route_raw=trip.route_packed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trunk', '0005_planningjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_packed',
+            field=trunk.fields.CompactRouteField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_existing_routes, unpack_existing_routes),
+        migrations.RemoveField(
+            model_name='trip',
+            name='route_raw',
+        ),
+        migrations.RenameField(
+            model_name='trip',
+            old_name='route_packed',
+            new_name='route_raw',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trunk', '0007_trip_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverRecap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_id', models.CharField(max_length=64, unique=True)),
+                ('as_of', models.DateField()),
+                ('minutes', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='driver_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='trip_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver_id', '-created_at', '-id'], name='trip_driver_created_idx'),
+        ),
+    ]
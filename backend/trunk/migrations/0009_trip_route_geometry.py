@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trunk', '0008_driver_recap_trip_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_geometry',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
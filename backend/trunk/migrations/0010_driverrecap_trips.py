@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trunk', '0009_trip_route_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverrecap',
+            name='trips',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trunk', '0010_driverrecap_trips'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_computed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
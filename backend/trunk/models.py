@@ -1,19 +1,27 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 import json
 
+from .fields import CompactRouteField
+
 class Trip(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     current_location = models.CharField(max_length=200)
     pickup_location = models.CharField(max_length=200)
     dropoff_location = models.CharField(max_length=200)
     cycle_used_hours = models.DecimalField(max_digits=5, decimal_places=2)
+    driver_id = models.CharField(max_length=64, blank=True, default="")
 
     
     total_distance_miles = models.DecimalField(max_digits=8, decimal_places=1, null=True, blank=True)
     total_driving_hours = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
-    route_raw = models.JSONField(null=True, blank=True) 
+    route_raw = CompactRouteField(null=True, blank=True)  # full ORS response, geometry polyline-packed
+    # When route_raw was last (re)calculated; versions the per-process RouteIndex cache
+    route_computed_at = models.DateTimeField(null=True, blank=True)
     route_summary = models.JSONField(null=True, blank=True) 
+    # Simplified polylines per map zoom, see services.route_geometry
+    route_geometry = models.JSONField(null=True, blank=True)
 
     hos_plan = models.JSONField(null=True, blank=True)
     hos_computed_at = models.DateTimeField(null=True, blank=True)
@@ -21,5 +29,72 @@ class Trip(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default="pending")
 
+    class Meta:
+        indexes = [
+            # Keyset pagination in TripViewSet.list walks (created_at, id) newest first
+            models.Index(fields=['-created_at', '-id'], name='trip_created_id_idx'),
+            # ?status= / ?driver_id= listings walk the same keyset within one value
+            models.Index(fields=['status', '-created_at', '-id'], name='trip_status_created_idx'),
+            models.Index(fields=['driver_id', '-created_at', '-id'], name='trip_driver_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trip {self.id} - {self.pickup_location} → {self.dropoff_location}"
+
+
+class GeocodeCacheEntry(models.Model):
+    # Normalized location string, see services.geocode_cache.normalize_location
+    query = models.CharField(max_length=200, unique=True)
+    longitude = models.FloatField()
+    latitude = models.FloatField()
+    hits = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.query} → ({self.longitude}, {self.latitude})"
+
+
+
+class PlanningJob(models.Model):
+    """DB-backed queue entry for trips planned in the background (see services.planning_queue)."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATE_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name="planning_job")
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["state", "available_at"])]
+
+    def __str__(self):
+        return f"PlanningJob {self.trip_id} [{self.state}]"
+
+
+class DriverRecap(models.Model):
+    """
+    A driver's 70-hour/8-day history (see services.recap.recap_on): on-duty
+    minutes for the days ending on `as_of`, oldest first, from before their
+    planned trips, and each planned trip's own days keyed by trip id (the
+    plan's `cycle_days`), so re-planning a trip replaces its hours.
+    """
+    driver_id = models.CharField(max_length=64, unique=True)
+    as_of = models.DateField()
+    minutes = models.JSONField(default=list)
+    trips = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"Trip {self.id} - {self.pickup_location} → {self.dropoff_location}"
\ No newline at end of file
+        return f"DriverRecap {self.driver_id} as of {self.as_of}"
@@ -0,0 +1,81 @@
+import base64
+import uuid
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TripKeysetPagination(BasePagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+
+    The cursor is the position of the last row on the page, so each page is a
+    single index range scan on trip_created_id_idx no matter how deep the
+    client pages, unlike OFFSET pagination. The id breaks ties between trips
+    created in the same instant, so no row is skipped or repeated.
+
+    Responses are an envelope, {"next": <url or null>, "page_size": N,
+    "results": [...]}, where GET /api/trips/ used to return a bare list.
+    A cursor that doesn't decode is a 400.
+    """
+    page_size = 25
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.order_by("-created_at", "-id")
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, trip):
+        raw = f"{trip.created_at.isoformat()}|{trip.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            created_at = parse_datetime(created_at)
+            pk = uuid.UUID(pk)
+        except (ValueError, TypeError, UnicodeDecodeError):
+            raise ParseError("Invalid cursor")
+        if created_at is None:
+            raise ParseError("Invalid cursor")
+        return created_at, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("page_size", self.page_size),
+            ("results", data),
+        ]))
@@ -2,11 +2,21 @@ from rest_framework import serializers
 from .models import Trip
 
 class TripSerializer(serializers.ModelSerializer):
+    route_raw = serializers.JSONField(required=False, allow_null=True)
+
+    def __init__(self, *args, **kwargs):
+        # Sparse fieldsets: TripSerializer(trips, many=True, fields=['id', 'status'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Trip
         fields = [
             'id', 'current_location', 'pickup_location', 'dropoff_location',
-            'cycle_used_hours', 'total_distance_miles', 'total_driving_hours', 'route_raw',
+            'cycle_used_hours', 'driver_id', 'total_distance_miles', 'total_driving_hours', 'route_raw',
             'route_summary', 'hos_plan', 'created_at', 'status'
         ]
         read_only_fields = ['id', 'total_distance_miles', 'total_driving_hours', 'route_summary', 'hos_plan', 'created_at', 'status']
@@ -0,0 +1,174 @@
+"""
+Content-addressed cache for rendered log sheets.
+
+An artifact's key is a hash of everything the renderer reads (the trip
+id, which the PDF carries in its title, hos_plan, the three locations and
+the distance) plus the renderer's version, so a replanned trip or a
+renderer change simply produces a new key and stale entries age out. Keys
+double as ETags.
+
+Two tiers: a small in-process LRU, then files under ARTIFACT_CACHE_DIR.
+Disk hits bump the file's mtime and the directory is trimmed oldest-mtime
+first whenever it grows past ARTIFACT_CACHE_MAX_BYTES.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from . import metrics
+from .cache import LRUCache
+from .log_html import render_logs_html
+from .logsheet_generator import generate_trip_logs_pdf
+
+logger = logging.getLogger(__name__)
+
+# Bump a version whenever its renderer's output changes
+RENDERERS = {
+    "html": ("1", "text/html", lambda trip: render_logs_html(trip).encode()),
+    "pdf": ("1", "application/pdf", lambda trip: generate_trip_logs_pdf(trip).getvalue()),
+}
+
+_memory = LRUCache(maxsize=settings.ARTIFACT_CACHE_MEMORY_SIZE)
+_disk_lock = threading.Lock()
+_disk_bytes = None          # running size of the disk tier, scanned once per process
+_counters = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "evicted_files": 0}
+
+
+class Artifact:
+    __slots__ = ("key", "content_type", "data")
+
+    def __init__(self, key, content_type, data):
+        self.key = key
+        self.content_type = content_type
+        self.data = data
+
+    @property
+    def etag(self):
+        return f'"{self.key}"'
+
+
+def artifact_key(trip, kind):
+    version = RENDERERS[kind][0]
+    inputs = json.dumps([
+        kind, version, str(trip.id), trip.hos_plan,
+        trip.current_location, trip.pickup_location, trip.dropoff_location,
+        str(trip.total_distance_miles),
+    ], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(inputs.encode()).hexdigest()
+
+
+def get_artifact(trip, kind, key=None):
+    """Rendered `kind` ("html"/"pdf") for the trip, from cache or freshly rendered."""
+    _, content_type, render = RENDERERS[kind]
+    key = key or artifact_key(trip, kind)
+
+    data = _memory.get(key)
+    if data is not None:
+        _counters["memory_hits"] += 1
+        return Artifact(key, content_type, data)
+
+    data = _read_disk(key)
+    if data is not None:
+        _counters["disk_hits"] += 1
+    else:
+        _counters["renders"] += 1
+        with metrics.timer(f"render_{kind}"):
+            data = render(trip)
+        _write_disk(key, data)
+    _memory.set(key, data)
+    return Artifact(key, content_type, data)
+
+
+def _path(key):
+    return os.path.join(settings.ARTIFACT_CACHE_DIR, key[:2], key)
+
+
+def _read_disk(key):
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)          # mtime is the LRU clock
+        return data
+    except OSError:
+        return None
+
+
+def _write_disk(key, data):
+    global _disk_bytes
+    path = _path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)   # readers never see a partial file
+    except OSError as e:
+        logger.warning(f"Artifact cache write failed for {key}: {e}")
+        return
+
+    with _disk_lock:
+        if _disk_bytes is None:
+            _disk_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _disk_bytes += len(data)
+        if _disk_bytes > settings.ARTIFACT_CACHE_MAX_BYTES:
+            _evict()
+
+
+def _scan():
+    """(mtime, size, path) for every file in the disk tier."""
+    entries = []
+    for root, _, files in os.walk(settings.ARTIFACT_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _evict():
+    """Delete least recently used files down to 90% of the cap. Caller holds _disk_lock."""
+    global _disk_bytes
+    entries = sorted(_scan())
+    total = sum(size for _, size, _ in entries)
+    target = settings.ARTIFACT_CACHE_MAX_BYTES * 0.9
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        _counters["evicted_files"] += 1
+    _disk_bytes = total
+
+
+def clear():
+    global _disk_bytes
+    _memory.clear()
+    with _disk_lock:
+        for _, _, path in _scan():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _disk_bytes = 0
+
+
+def stats():
+    return {
+        **_counters,
+        "memory": _memory.stats(),
+        "disk_bytes": _disk_bytes,
+        "disk_max_bytes": settings.ARTIFACT_CACHE_MAX_BYTES,
+    }
@@ -0,0 +1,126 @@
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import DriverRecap, Trip
+from .recap import recap_on, trip_end
+from .routing import GeocodingError, GeocodingTimeout, RoutingTimeout, geocode_locations, get_truck_routes
+from .trip_pipeline import route_fields, plan_hos, store_driver_recap, PlanningError
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FIELDS = ("current_location", "pickup_location", "dropoff_location")
+
+
+def plan_trips_batch(items):
+    """
+    Plan many trips at once.
+
+    `items` is a list of (index, validated_data) pairs. Location strings and
+    lanes are deduplicated across the whole batch, so the network cost is
+    O(unique locations + unique lanes) rather than O(3N + N). Successful trips
+    are written with bulk_create. Returns one result dict per item.
+    """
+    results = {}
+
+    # 1. Geocode every distinct location once
+    unique_locations = list(dict.fromkeys(
+        data[field] for _, data in items for field in LOCATION_FIELDS
+    ))
+    coords = dict(zip(unique_locations, geocode_locations(
+        unique_locations,
+        deadline_seconds=settings.BATCH_STAGE_DEADLINE_SECONDS,
+        fail_fast=False,
+    )))
+
+    routable = []
+    for index, data in items:
+        errors = [coords[data[f]] for f in LOCATION_FIELDS if isinstance(coords[data[f]], GeocodingError)]
+        if errors:
+            # A location that wasn't found at all beats one ORS merely didn't answer for
+            error = next((e for e in errors if type(e) is GeocodingError), errors[0])
+            results[index] = _error(index, str(error), timed_out=isinstance(error, GeocodingTimeout))
+        else:
+            routable.append((index, data))
+
+    # 2. Route every distinct lane once (route_cache collapses repeats)
+    lanes = [[coords[data[f]] for f in LOCATION_FIELDS] for _, data in routable]
+    routes = get_truck_routes(lanes, deadline_seconds=settings.BATCH_STAGE_DEADLINE_SECONDS)
+
+    # 3. HOS per trip, then persist in a single transaction. A driver's trips
+    # in one batch run back to back, each planned from the recap the
+    # previous one leaves
+    trips = []
+    now = timezone.now()
+    drivers = {}
+    for (index, data), route_data in zip(routable, routes):
+        if isinstance(route_data, RoutingTimeout):
+            results[index] = _error(index, str(route_data), timed_out=True)
+            continue
+        try:
+            fields = route_fields([data[f] for f in LOCATION_FIELDS], route_data)
+        except PlanningError as e:
+            results[index] = _error(index, str(e))
+            continue
+        trip = Trip(**data, **fields, status="route_calculated")
+        trip.hos_plan = _plan_in_sequence(trip, drivers)
+        trip.hos_computed_at = now
+        trip.status = "hos_compliant"
+        trips.append((index, trip))
+
+    with transaction.atomic():
+        Trip.objects.bulk_create([trip for _, trip in trips], batch_size=200)
+        for _, trip in trips:
+            store_driver_recap(trip)
+
+    for index, trip in trips:
+        results[index] = {
+            "index": index,
+            "ok": True,
+            "trip_id": str(trip.id),
+            "status": trip.status,
+            "total_distance_miles": trip.route_summary["total_distance_miles"],
+            "total_days_needed": trip.hos_plan["total_days_needed"],
+        }
+
+    return [results[index] for index, _ in items]
+
+
+def _plan_in_sequence(trip, drivers):
+    """
+    plan_hos() for the driver's next trip in the batch, departing the day
+    after their previous one ends. `drivers` holds each driver's history,
+    planned trips' cycle_days and next departure day between calls.
+    """
+    if not trip.driver_id:
+        return plan_hos(trip, None)
+    state = drivers.get(trip.driver_id)
+    if state is None:
+        stored = DriverRecap.objects.filter(driver_id=trip.driver_id).first()
+        state = drivers[trip.driver_id] = {
+            "history": (stored.minutes, stored.as_of) if stored else None,
+            "trips": list(stored.trips.values()) if stored else [],
+            "start": date.today(),
+        }
+    recap = None
+    if state["history"] is not None:
+        recap = recap_on(*state["history"], state["trips"], state["start"])
+    plan = plan_hos(trip, recap, start_date=state["start"])
+    if state["history"] is None:
+        # A new driver's first trip: it was planned from cycle_used_hours
+        departure = plan["recap_at_departure"]
+        state["history"] = (departure["minutes"], date.fromisoformat(departure["as_of"]))
+    state["trips"].append(plan["cycle_days"])
+    state["start"] = trip_end(plan["cycle_days"]) + timedelta(days=1)
+    return plan
+
+
+def _error(index, message, timed_out=False):
+    error = {"index": index, "ok": False, "message": message}
+    if timed_out:
+        # Worth submitting again, unlike a location that doesn't exist
+        error["timed_out"] = True
+    return error
@@ -0,0 +1,148 @@
+"""
+Export the daily logs of every trip in a created_at range.
+
+ReportLab rendering is CPU-bound, so the export_logs command renders
+trips in a process pool and writes them into a zip in trip order as they
+finish. At most `workers * IN_FLIGHT_PER_WORKER` trips are queued or held
+in memory at once, whatever the size of the range. The HTTP export renders
+in the request's own process through the artifact cache instead: a web
+worker never forks a pool, and trips already rendered are cache hits.
+The archive ends with timings.csv: one row per trip with its page count,
+PDF size and render time.
+"""
+import csv
+import io
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from reportlab.lib.pagesizes import LETTER
+from reportlab.pdfgen import canvas
+
+from ..models import Trip
+from .artifact_cache import get_artifact
+from .logsheet_generator import ChunkSink, daily_logs, draw_daily_log, generate_trip_logs_pdf, log_filename
+
+IN_FLIGHT_PER_WORKER = 4
+# Everything artifact_key() hashes, so cached renders need no further queries
+EXPORT_FIELDS = ("id", "created_at", "current_location", "pickup_location", "dropoff_location",
+                 "total_distance_miles", "hos_plan")
+
+
+class ExportError(Exception):
+    pass
+
+
+def parse_bound(value):
+    """A range bound: YYYY-MM-DD (midnight) or an ISO datetime, in the current time zone if naive."""
+    try:
+        moment = parse_datetime(value) or (parse_date(value) and datetime.combine(parse_date(value), dt_time()))
+    except ValueError:
+        moment = None
+    if not moment:
+        raise ExportError(f"Invalid date: {value!r}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def select_trips(start, end):
+    """Planned trips with start <= created_at < end, oldest first, without the route blob."""
+    return (
+        Trip.objects.filter(created_at__gte=start, created_at__lt=end, hos_plan__isnull=False)
+        .only(*EXPORT_FIELDS)
+        .order_by("created_at", "id")
+    )
+
+
+def _payload(trip):
+    # Plain data crosses the process boundary, not model instances
+    return {"id": str(trip.id), "current_location": trip.current_location, "hos_plan": trip.hos_plan}
+
+
+def render_trip(payload):
+    """Pool worker: (trip id, PDF bytes, pages, seconds). Needs no database access."""
+    started = time.perf_counter()
+    trip = SimpleNamespace(**payload)
+    data = generate_trip_logs_pdf(trip).getvalue()
+    return payload["id"], data, len(daily_logs(trip)), time.perf_counter() - started
+
+
+def render_cached(trip):
+    """render_trip() in-process, through the artifact cache."""
+    started = time.perf_counter()
+    data = get_artifact(trip, "pdf").data
+    return str(trip.id), data, len(daily_logs(trip)), time.perf_counter() - started
+
+
+def render_trips(trips, workers=None):
+    """
+    Yield render_trip() results in input order, rendering in a process pool
+    with a bounded window of queued trips. workers=1 renders in-process
+    through the artifact cache.
+    """
+    workers = workers or settings.EXPORT_WORKERS
+    if workers <= 1:
+        yield from map(render_cached, trips)
+        return
+
+    payloads = (_payload(trip) for trip in trips)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for payload in payloads:
+            pending.append(pool.submit(render_trip, payload))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Also runs when a streaming client disconnects mid-export
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def stream_export_zip(trips, workers=None, on_result=None):
+    """Yield a zip (one PDF per trip plus timings.csv) chunk by chunk."""
+    timings = io.StringIO()
+    writer = csv.writer(timings)
+    writer.writerow(["trip_id", "pages", "bytes", "render_seconds"])
+
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for trip_id, data, pages, seconds in render_trips(trips, workers):
+            archive.writestr(log_filename(SimpleNamespace(id=trip_id)), data)
+            writer.writerow([trip_id, pages, len(data), f"{seconds:.4f}"])
+            if on_result:
+                on_result(trip_id, pages, len(data), seconds)
+            yield sink.drain()
+        archive.writestr("timings.csv", timings.getvalue())
+    yield sink.drain()
+
+
+def export_merged_pdf(trips, on_result=None):
+    """
+    Every trip's pages in one PDF. This is a single canvas, so it renders
+    in-process and is capped at EXPORT_MERGED_PDF_MAX_TRIPS; use the zip
+    for large ranges.
+    """
+    if len(trips) > settings.EXPORT_MERGED_PDF_MAX_TRIPS:
+        raise ExportError(
+            f"{len(trips)} trips is too many for one PDF (max {settings.EXPORT_MERGED_PDF_MAX_TRIPS}), "
+            f"export a zip instead"
+        )
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=LETTER)
+    for trip in trips:
+        started = time.perf_counter()
+        days = daily_logs(trip)
+        for day_data in days:
+            draw_daily_log(c, day_data, trip)
+        if on_result:
+            on_result(str(trip.id), len(days), None, time.perf_counter() - started)
+    c.save()
+    buffer.seek(0)
+    return buffer
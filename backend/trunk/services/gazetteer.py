@@ -0,0 +1,290 @@
+"""
+Local gazetteer geocoder (GEOCODER_BACKEND = "local").
+
+`manage.py build_gazetteer places.csv` turns a places file into a compact
+on-disk index under GAZETTEER_DIR:
+
+    keys.bin        normalized lookup keys, sorted, concatenated UTF-8
+    key_offsets.npy int64[k + 1] byte offset of each key in keys.bin
+    key_places.npy  int32[k] place behind each key
+    coords.npy      float64[p, 2] [lon, lat] per place
+    rank.npy        float32[p] tie-breaker (population), higher wins
+
+Every place is indexed as "name,st", "name" and its ZIP, so "Dallas, TX",
+"dallas texas", "Dallas" and "75201" all land on it (normalized text has
+no commas, so the state can't be confused with part of a name). keys.bin
+and key_offsets.npy are read through mmap and searched by bisection over
+the offsets, so a lookup touches a few dozen bytes and never loads the
+index into Python objects.
+
+Only the place name is ever matched loosely (prefix, typos); a state in
+the query must match exactly. A wrong city is worse than no answer, since
+no answer just falls back to ORS.
+"""
+import bisect
+import csv
+import json
+import mmap
+import os
+import re
+import threading
+
+import numpy as np
+
+INDEX_VERSION = 2
+MAX_PREFIX_SCAN = 64
+MIN_PREFIX = 4              # "n" or "new" must not complete to "new york"
+MIN_FUZZY = 4               # shorter names are too close to each other for typo matching
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+STATE_CODES = set(US_STATES.values())
+_TRAILING_STATE = re.compile(
+    r"^(.+) (" + "|".join(sorted(US_STATES, key=len, reverse=True)) + r"|[a-z]{2})$")
+_COUNTRY = re.compile(r"^(usa|us|united states( of america)?)$")
+_TRAILING_COUNTRY = re.compile(r" (usa|united states( of america)?)$")
+
+
+def normalize(text):
+    """'New York, N.Y.' → 'new york ny'. Punctuation and case never matter."""
+    key = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", key).strip()
+
+
+def state_code(text):
+    """'Texas' / 'tx' → 'tx'; None if it isn't a US state."""
+    key = normalize(text)
+    code = US_STATES.get(key, key)
+    return code if code in STATE_CODES else None
+
+
+def parse(text):
+    """
+    (name, state code or None): 'Dallas, Texas, USA' → ('dallas', 'tx').
+    The state is only ever read from the trailing component, so place names
+    that are also state names stay names: 'New York' → ('new york', None),
+    'Washington, DC' → ('washington', 'dc').
+    """
+    parts = [normalize(p) for p in (text or "").split(",")]
+    parts = [p for p in parts if p]
+    while len(parts) > 1 and _COUNTRY.match(parts[-1]):
+        parts.pop()
+    if len(parts) > 1:
+        state = state_code(parts[-1])
+        if state:
+            return " ".join(parts[:-1]), state
+        return " ".join(parts), None
+
+    key = _TRAILING_COUNTRY.sub("", parts[0]) if parts else ""
+    match = _TRAILING_STATE.match(key)
+    if match and state_code(match.group(2)):
+        return match.group(1), state_code(match.group(2))
+    return key, None
+
+
+def _key(name, state):
+    return f"{name},{state}" if state else name
+
+
+def build_index(source, out_dir):
+    """
+    Build the index from a CSV with columns name, lon, lat and optionally
+    state, zip, population. Returns the meta dict.
+    """
+    coords, ranks, entries = [], [], []
+    with open(source, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = normalize(row["name"])
+            if not name:
+                continue
+            place = len(coords)
+            coords.append((float(row["lon"]), float(row["lat"])))
+            ranks.append(float(row.get("population") or 0))
+            entries.append((name, place))
+            state = state_code(row.get("state") or "")
+            if state:
+                entries.append((_key(name, state), place))
+            if row.get("zip"):
+                entries.append((row["zip"].strip(), place))
+
+    # One entry per key: the highest-ranked place wins ambiguous names
+    best = {}
+    for key, place in entries:
+        if key not in best or ranks[place] > ranks[best[key]]:
+            best[key] = place
+    keys = sorted(best)
+
+    encoded = [k.encode() for k in keys]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(k) for k in encoded], out=offsets[1:])
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "keys.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(out_dir, "key_offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "key_places.npy"), np.asarray([best[k] for k in keys], dtype=np.int32))
+    np.save(os.path.join(out_dir, "coords.npy"), np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    np.save(os.path.join(out_dir, "rank.npy"), np.asarray(ranks, dtype=np.float32))
+    meta = {"version": INDEX_VERSION, "places": len(coords), "keys": len(keys),
+            "source": os.path.basename(source)}
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class _Keys:
+    """Sequence view of keys.bin for bisect: key i is decoded only when compared."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i:i + 2].tolist()
+        return self.data[start:end].decode()
+
+
+class Gazetteer:
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Gazetteer in {directory} is version {self.meta.get('version')}, rebuild it")
+        with open(os.path.join(directory, "keys.bin"), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+        def load(name):
+            return np.asarray(np.load(os.path.join(directory, name), mmap_mode="r"))
+
+        self._offsets = load("key_offsets.npy")
+        self._places = load("key_places.npy")
+        self._coords = load("coords.npy")
+        self._rank = load("rank.npy")
+        self.keys = _Keys(self._data, self._offsets)
+
+    def _coords_for(self, i):
+        lon, lat = self._coords[self._places[i]].tolist()
+        return [lon, lat]
+
+    def lookup(self, text):
+        """
+        [lon, lat] for a place string, or None. Exact, then a prefix of the
+        name, then a typo in the name; with a state, only places in it.
+        """
+        name, state = parse(text)
+        if not name:
+            return None
+        query = _key(name, state)
+        i = bisect.bisect_left(self.keys, query)
+        if i < len(self.keys) and self.keys[i] == query:
+            return self._coords_for(i)
+        return self._prefix(name, state) or self._fuzzy(name, state)
+
+    def _matches_state(self, key, state):
+        """The name part of `key` if its state is `state` (None: a bare name key)."""
+        name, _, key_state = key.partition(",")
+        if (key_state or None) != state:
+            return None
+        return name
+
+    def _prefix(self, name, state):
+        """Best-ranked place whose name extends `name`, in `state` if given ('dall, tx' → 'dallas,tx')."""
+        if len(name) < MIN_PREFIX:
+            return None
+        best = None
+        start = bisect.bisect_left(self.keys, name)
+        for i in range(start, min(start + MAX_PREFIX_SCAN, len(self.keys))):
+            key = self.keys[i]
+            if not key.startswith(name):
+                break
+            if self._matches_state(key, state) is None:
+                continue
+            if best is None or self._rank[self._places[i]] > self._rank[self._places[best]]:
+                best = i
+        return self._coords_for(best) if best is not None else None
+
+    def _fuzzy(self, name, state):
+        """
+        Typos in the name: keys sharing its first two characters whose length
+        is within the edit budget (filtered in numpy on the offsets), then a
+        bounded edit distance on the name part of those in the right state.
+        """
+        if len(name) < MIN_FUZZY:
+            return None
+        budget = 1 if len(name) < 8 else 2
+        suffix = len(state) + 1 if state else 0
+        lo = bisect.bisect_left(self.keys, name[:2])
+        hi = bisect.bisect_left(self.keys, name[:2] + "\U0010ffff", lo)
+        if lo >= hi:
+            return None
+        lengths = np.diff(self._offsets[lo:hi + 1])
+        near = np.flatnonzero(np.abs(lengths - suffix - len(name.encode())) <= budget) + lo
+
+        best, best_key = None, None
+        for i in near.tolist():
+            candidate = self._matches_state(self.keys[i], state)
+            if candidate is None:
+                continue
+            distance = edit_distance(name, candidate, budget)
+            if distance <= budget:
+                key = (distance, -self._rank[self._places[i]])
+                if best_key is None or key < best_key:
+                    best, best_key = i, key
+        return self._coords_for(best) if best is not None else None
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance, or limit + 1 as soon as it must exceed `limit`.
+    Only the diagonal band |i - j| <= limit of the DP table is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        ca = a[i - 1]
+        row_min = current[0]
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer(directory):
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer(directory)
+    return _gazetteer
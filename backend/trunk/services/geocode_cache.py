@@ -0,0 +1,193 @@
+import re
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import GeocodeCacheEntry
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Tier 1: per-process LRU. Tier 2: GeocodeCacheEntry table shared by all workers.
+_memory = LRUCache(
+    maxsize=settings.GEOCODE_CACHE_MEMORY_SIZE,
+    ttl=settings.GEOCODE_CACHE_TTL_SECONDS,
+)
+
+_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "db_evictions": 0}
+
+# stats() runs on every metrics scrape; the table's COUNT(*) is refreshed at most this often
+DB_ENTRIES_MAX_AGE_SECONDS = 60
+_db_entries = {"count": None, "at": 0.0}
+_db_entries_lock = threading.Lock()
+
+# _evict() counts the table only every EVICT_EVERY_WRITES stores, so it may briefly
+# run that many rows over GEOCODE_CACHE_MAX_ENTRIES
+EVICT_EVERY_WRITES = 100
+_writes = {"since_evict": 0}
+_writes_lock = threading.Lock()
+
+
+def normalize_location(location_str):
+    """'  Dallas ,TX. ' and 'dallas, tx' should share one cache entry."""
+    key = (location_str or "").strip().lower()
+    key = re.sub(r"\s*,\s*", ", ", key)
+    key = re.sub(r"\s+", " ", key)
+    return key.strip(" .,")
+
+
+def lookup(location_str):
+    key = normalize_location(location_str)
+    if not key:
+        return None
+    coords = _memory_lookup(key)
+    return coords if coords is not None else _db_lookup(key)
+
+
+async def alookup(location_str):
+    """lookup() for async callers: memory hits stay on the event loop, only the DB tier leaves it."""
+    key = normalize_location(location_str)
+    if not key:
+        return None
+    coords = _memory_lookup(key)
+    return coords if coords is not None else await sync_to_async(_db_lookup)(key)
+
+
+def _memory_lookup(key):
+    coords = _memory.get(key)
+    if coords is None:
+        return None
+    _counters["memory_hits"] += 1
+    return list(coords)
+
+
+def _db_lookup(key):
+    try:
+        found = _db_read(key)
+    except Exception as e:
+        # Like a failed cache write, an unreadable cache must not fail the trip: geocode it instead
+        logger.warning(f"Geocode cache read failed for {key!r}: {e}")
+        found = None
+    if found is None:
+        _counters["misses"] += 1
+        return None
+    coords, ttl_left = found
+    # The memory copy expires with the row, not a fresh GEOCODE_CACHE_TTL_SECONDS from now
+    _memory.set(key, tuple(coords), ttl=ttl_left)
+    _counters["db_hits"] += 1
+    return coords
+
+
+def _db_read(key):
+    """(coords, seconds of TTL left) for `key` if cached and unexpired (counting the hit), else None."""
+    entry = GeocodeCacheEntry.objects.filter(query=key).first()
+    if entry is None:
+        return None
+    expires_at = entry.created_at + timedelta(seconds=settings.GEOCODE_CACHE_TTL_SECONDS)
+    ttl_left = (expires_at - timezone.now()).total_seconds()
+    if ttl_left <= 0:
+        entry.delete()
+        return None
+
+    GeocodeCacheEntry.objects.filter(pk=entry.pk).update(
+        hits=F("hits") + 1, last_used_at=timezone.now()
+    )
+    return [entry.longitude, entry.latitude], ttl_left
+
+
+def store(location_str, coords):
+    key = normalize_location(location_str)
+    if not key or not coords:
+        return
+
+    _memory.set(key, tuple(coords))
+    _db_store(key, coords)
+
+
+async def astore(location_str, coords):
+    key = normalize_location(location_str)
+    if not key or not coords:
+        return
+
+    _memory.set(key, tuple(coords))
+    await sync_to_async(_db_store)(key, coords)
+
+
+def _db_store(key, coords):
+    try:
+        GeocodeCacheEntry.objects.update_or_create(
+            query=key,
+            defaults={
+                "longitude": coords[0],
+                "latitude": coords[1],
+                "created_at": timezone.now(),
+                "last_used_at": timezone.now(),
+            },
+        )
+        if _evict_due():
+            _evict()
+    except Exception as e:
+        # A cache write must never fail the trip being planned
+        logger.warning(f"Geocode cache write failed for {key!r}: {e}")
+
+
+def _evict_due():
+    """True on every EVICT_EVERY_WRITES-th store, so the table isn't counted on each one."""
+    with _writes_lock:
+        _writes["since_evict"] += 1
+        if _writes["since_evict"] < EVICT_EVERY_WRITES:
+            return False
+        _writes["since_evict"] = 0
+        return True
+
+
+def _evict():
+    max_entries = settings.GEOCODE_CACHE_MAX_ENTRIES
+    count = GeocodeCacheEntry.objects.count()
+    overflow = count - max_entries
+    if overflow > 0:
+        stale_ids = list(
+            GeocodeCacheEntry.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow]
+        )
+        GeocodeCacheEntry.objects.filter(pk__in=stale_ids).delete()
+        _counters["db_evictions"] += len(stale_ids)
+        count -= len(stale_ids)
+    # We just paid for the COUNT(*); let stats() reuse it
+    with _db_entries_lock:
+        _db_entries["count"] = count
+        _db_entries["at"] = time.monotonic()
+
+
+def _db_entry_count():
+    """Rows in the cache table, as of at most DB_ENTRIES_MAX_AGE_SECONDS ago."""
+    with _db_entries_lock:
+        if _db_entries["count"] is None or time.monotonic() - _db_entries["at"] > DB_ENTRIES_MAX_AGE_SECONDS:
+            _db_entries["count"] = GeocodeCacheEntry.objects.count()
+            _db_entries["at"] = time.monotonic()
+        return _db_entries["count"]
+
+
+def clear():
+    _memory.clear()
+    GeocodeCacheEntry.objects.all().delete()
+    with _db_entries_lock:
+        _db_entries["count"] = None
+    with _writes_lock:
+        _writes["since_evict"] = 0
+
+
+def stats():
+    lookups = _counters["memory_hits"] + _counters["db_hits"] + _counters["misses"]
+    hits = _counters["memory_hits"] + _counters["db_hits"]
+    return {
+        **_counters,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "memory": _memory.stats(),
+        "db_entries": _db_entry_count(),
+    }
@@ -0,0 +1,197 @@
+"""
+Vectorized what-if evaluation of the HOS engine.
+
+Runs the same day-by-day rules as hos_engine.build_timeline, but for a
+whole array of starting cycle values at once: each loop iteration plans
+"one more day" for every scenario still driving. Departure hour only
+shifts the clock (shift lengths, breaks and restarts don't depend on it),
+so it is applied by broadcasting at the end.
+"""
+import numpy as np
+
+from .hos_engine import (
+    DAY_MINUTES, MAX_DRIVING_PER_DAY, BREAK_AFTER_DRIVING, BREAK_MINUTES,
+    DUTY_WINDOW, OFF_DUTY_RESET, RESTART_MINUTES, PICKUP_MINUTES,
+    DROPOFF_MINUTES, FUEL_STOP_MINUTES, MIN_REMAINING_DRIVING,
+    MIN_USEFUL_DRIVING,
+)
+from .recap import WINDOW_DAYS, CYCLE_LIMIT_MINUTES
+
+MAX_DAYS = 366
+
+
+class _RecapArray:
+    """CycleRecap for many scenarios at once: one ring-buffer row per scenario."""
+
+    def __init__(self, n):
+        self.rows = np.arange(n)
+        self.slots = np.zeros((n, WINDOW_DAYS), dtype=np.int64)
+        self.head = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n, dtype=np.int64)
+
+    @property
+    def available(self):
+        return np.maximum(CYCLE_LIMIT_MINUTES - self.total, 0)
+
+    def add(self, minutes):
+        self.slots[self.rows, self.head] += minutes
+        self.total += minutes
+
+    def advance(self, days):
+        """`days` per row; rows with 0 stay put."""
+        for step in range(int(days.max(initial=0))):
+            moving = days > step
+            self.head = np.where(moving, (self.head + 1) % WINDOW_DAYS, self.head)
+            expiring = np.where(moving, self.slots[self.rows, self.head], 0)
+            self.total -= expiring
+            self.slots[self.rows, self.head] -= expiring
+
+    def available_after(self, days):
+        expiring = np.zeros_like(self.total)
+        for step in range(1, int(days.max(initial=0)) + 1):
+            expiring += np.where(days >= step, self.slots[self.rows, (self.head + step) % WINDOW_DAYS], 0)
+        return np.maximum(CYCLE_LIMIT_MINUTES - (self.total - expiring), 0)
+
+    def reset(self, mask):
+        self.slots[mask] = 0
+        self.total[mask] = 0
+
+
+def evaluate_scenarios(total_driving_seconds, cycle_used_hours, departure_hours, fuel_stops=()):
+    cycle_used_hours = np.asarray(cycle_used_hours, dtype=float)
+    departure_hours = np.asarray(departure_hours, dtype=float)
+
+    n = cycle_used_hours.size
+    recap = _RecapArray(n)
+    recap.add(np.rint(cycle_used_hours * 60).astype(np.int64))   # booked on the day before departure
+    recap.advance(np.ones(n, dtype=np.int64))
+
+    left = np.full(n, int(round(total_driving_seconds / 60)), dtype=np.int64)
+    t = np.zeros(n, dtype=np.int64)             # minutes since departure
+    arrival = np.zeros(n, dtype=np.int64)
+    driven = np.zeros(n, dtype=np.int64)
+    fuel_stops = np.asarray(fuel_stops, dtype=np.int64)
+    days = np.zeros(n, dtype=np.int64)
+    restarts = np.zeros(n, dtype=np.int64)
+    total_on_duty = np.zeros(n, dtype=np.int64)
+
+    def restart_from(mask, start):
+        restart_end = start + RESTART_MINUTES
+        recap.reset(mask)
+        return np.where(mask, restart_end + (-restart_end) % DAY_MINUTES, t)
+
+    active = left > MIN_REMAINING_DRIVING
+    blocked = active & (recap.available - PICKUP_MINUTES < np.minimum(left, MIN_USEFUL_DRIVING))
+    t = restart_from(blocked, t)
+    restarts += blocked
+
+    for day in range(1, MAX_DAYS + 1):
+        if not active.any():
+            break
+
+        pickup = (PICKUP_MINUTES if day == 1 else 0) * active
+        drive, on_duty, clock, _ = _drive_day(
+            active, t + pickup, pickup, np.minimum(MAX_DRIVING_PER_DAY, left), driven,
+            recap.available, t + DUTY_WINDOW, fuel_stops)
+        last = active & (left - drive <= MIN_REMAINING_DRIVING)
+        driven += drive
+
+        on_duty = on_duty + DROPOFF_MINUTES * last
+        work_end = clock + DROPOFF_MINUTES * last
+
+        left -= drive
+        recap.add(on_duty)
+        total_on_duty += on_duty
+        days += active
+        arrival = np.where(last, work_end, arrival)
+
+        continuing = active & ~last
+        next_start = np.maximum(t + DUTY_WINDOW + OFF_DUTY_RESET, work_end + OFF_DUTY_RESET)
+        days_ahead = np.where(continuing, (next_start - t) // DAY_MINUTES, 0)
+        restart = continuing & (
+            recap.available_after(days_ahead) < np.minimum(left, MIN_USEFUL_DRIVING)
+        )
+        recap.advance(np.where(restart, 0, days_ahead))
+        restarted_start = restart_from(restart, work_end)
+        restarts += restart
+        t = np.where(restart, restarted_start, np.where(continuing, next_start, t))
+        active = continuing
+
+    # Arrival clock for every (cycle, departure) pair
+    arrival_abs = np.rint(departure_hours * 60).astype(np.int64)[None, :] + arrival[:, None]
+
+    return {
+        "cycle_used_hours": cycle_used_hours,
+        "departure_hours": departure_hours,
+        "total_days_needed": days,
+        "requires_34h_reset": restarts > 0,
+        "restarts": restarts,
+        "total_on_duty_minutes": total_on_duty,
+        "remaining_cycle_minutes": recap.available,
+        "elapsed_minutes": arrival,
+        "arrival_day_offset": arrival_abs // DAY_MINUTES,
+        "arrival_minute_of_day": arrival_abs % DAY_MINUTES,
+    }
+
+
+def _drive_day(active, clock, on_duty, limit, driven, available, window_end, fuel_stops):
+    """
+    hos_engine._drive_day for every active scenario: one step (a break, or a
+    stint up to the next limit or fuel stop) per iteration, for all rows still
+    driving. Returns (minutes driven, on_duty, clock, fuel stops made).
+    """
+    driving = np.zeros_like(clock)
+    since_break = np.zeros_like(clock)
+    fuel_count = np.zeros_like(clock)
+    going = active.copy()
+    while True:
+        going &= driving < limit
+        if not going.any():
+            break
+        needs_break = going & (since_break >= BREAK_AFTER_DRIVING)
+        breaking = needs_break & (np.minimum(available - on_duty, window_end - clock) - BREAK_MINUTES > 0)
+        going &= ~(needs_break & ~breaking)
+        clock = clock + BREAK_MINUTES * breaking
+        on_duty = on_duty + BREAK_MINUTES * breaking
+        since_break = np.where(breaking, 0, since_break)
+
+        driving_now = going & ~needs_break
+        stint = np.minimum(np.minimum(limit - driving, BREAK_AFTER_DRIVING - since_break),
+                           np.minimum(available - on_duty, window_end - clock))
+        going &= ~(driving_now & (stint <= 0))
+        driving_now &= stint > 0
+
+        position = driven + driving
+        i = np.searchsorted(fuel_stops, position, side="right")
+        next_stop = fuel_stops[np.minimum(i, len(fuel_stops) - 1)] if len(fuel_stops) else position
+        fuel = driving_now & (i < len(fuel_stops)) & (next_stop <= position + stint)
+        stint = np.where(fuel, next_stop - position, np.where(driving_now, stint, 0))
+
+        clock = clock + stint + FUEL_STOP_MINUTES * fuel
+        driving = driving + stint
+        on_duty = on_duty + stint + FUEL_STOP_MINUTES * fuel
+        fuel_count += fuel
+        since_break = since_break + stint
+        if FUEL_STOP_MINUTES >= BREAK_MINUTES:
+            since_break = np.where(fuel, 0, since_break)
+    return driving, on_duty, clock, fuel_count
+
+
+def scenarios_to_json(result):
+    """Plain-list version of evaluate_scenarios() output for API responses."""
+    minutes = result["arrival_minute_of_day"]
+    return {
+        "cycle_used_hours": result["cycle_used_hours"].tolist(),
+        "departure_hours": result["departure_hours"].tolist(),
+        "total_days_needed": result["total_days_needed"].tolist(),
+        "requires_34h_reset": result["requires_34h_reset"].tolist(),
+        # Rounded exactly like hos_planner so both endpoints agree
+        "total_on_duty_hours": [round(m / 60, 1) for m in result["total_on_duty_minutes"].tolist()],
+        "remaining_cycle_after_trip": [round(m / 60, 1) for m in result["remaining_cycle_minutes"].tolist()],
+        "elapsed_hours": [round(m / 60, 2) for m in result["elapsed_minutes"].tolist()],
+        # [cycle index][departure index]
+        "arrival_day_offset": result["arrival_day_offset"].tolist(),
+        "arrival_time": [
+            [f"{m // 60:02d}:{m % 60:02d}" for m in row] for row in minutes.tolist()
+        ],
+    }
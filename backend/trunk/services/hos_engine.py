@@ -0,0 +1,257 @@
+"""
+Event-based HOS engine working in integer minutes.
+
+build_timeline() lays the trip out as a sequence of DutyEvent records
+(off duty, sleeper berth, driving, on duty not driving) on one absolute
+clock: minute 0 is midnight of the first trip day. hos_planner turns the
+result into the JSON stored on Trip.hos_plan; the log renderers draw the
+per-day duty periods straight from it.
+"""
+from bisect import bisect_right
+
+from .recap import CycleRecap
+
+OFF_DUTY = "off_duty"
+SLEEPER = "sleeper_berth"
+DRIVING = "driving"
+ON_DUTY = "on_duty"
+
+DAY_MINUTES = 24 * 60
+DEFAULT_START_MINUTE = 5 * 60            # first shift starts 05:00
+
+MAX_DRIVING_PER_DAY = 11 * 60
+BREAK_AFTER_DRIVING = 8 * 60
+BREAK_MINUTES = 30
+DUTY_WINDOW = 14 * 60
+OFF_DUTY_RESET = 10 * 60
+RESTART_MINUTES = 34 * 60
+PICKUP_MINUTES = 60
+DROPOFF_MINUTES = 60
+FUEL_STOP_MINUTES = 30
+MIN_REMAINING_DRIVING = 6                # leftovers under 0.1h aren't worth another day
+MIN_USEFUL_DRIVING = 60                  # below this a 34h restart beats waiting for hours to roll off
+
+
+class DutyEvent:
+    __slots__ = ("status", "start", "end", "note")
+
+    def __init__(self, status, start, end, note=""):
+        self.status = status
+        self.start = start
+        self.end = end
+        self.note = note
+
+    @property
+    def minutes(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"DutyEvent({self.status}, {self.start}-{self.end}{', ' + self.note if self.note else ''})"
+
+
+class PlannedDay:
+    __slots__ = ("number", "start", "work_end", "next_start", "driving", "on_duty",
+                 "break_taken", "fuel_stops")
+
+    def __init__(self, number, start):
+        self.number = number
+        self.start = start
+        self.work_end = start
+        self.next_start = start
+        self.driving = 0
+        self.on_duty = 0
+        self.break_taken = False
+        self.fuel_stops = 0
+
+    @property
+    def fuel_stop(self):
+        return self.fuel_stops > 0
+
+
+class Restart:
+    __slots__ = ("after_day", "start", "end")
+
+    def __init__(self, after_day, start, end):
+        self.after_day = after_day
+        self.start = start
+        self.end = end
+
+
+class Timeline:
+    __slots__ = ("events", "days", "restarts", "cycle_used_start", "total_driving", "total_on_duty",
+                 "recap")
+
+    def __init__(self, cycle_used_start):
+        self.recap = None
+        self.events = []
+        self.days = []
+        self.restarts = []
+        self.cycle_used_start = cycle_used_start
+        self.total_driving = 0
+        self.total_on_duty = 0
+
+    def add(self, status, start, minutes, note=""):
+        event = DutyEvent(status, start, start + minutes, note)
+        self.events.append(event)
+        return event.end
+
+    def duty_periods_by_day(self):
+        """
+        One pass over the events, clipped to calendar days:
+        {day_index: [(status, start, end), ...]} in minutes of that day,
+        each day covering 0..1440 with gaps filled as off duty.
+        """
+        days = {}
+        cursor = 0
+        for event in self.events:
+            if event.start > cursor:
+                _split_by_day(days, OFF_DUTY, cursor, event.start)
+            _split_by_day(days, event.status, event.start, event.end)
+            cursor = event.end
+        if cursor % DAY_MINUTES:
+            _split_by_day(days, OFF_DUTY, cursor, (cursor // DAY_MINUTES + 1) * DAY_MINUTES)
+        return days
+
+
+def _split_by_day(days, status, start, end):
+    while start < end:
+        index = start // DAY_MINUTES
+        offset = index * DAY_MINUTES
+        stop = min(end, offset + DAY_MINUTES)
+        periods = days.setdefault(index, [])
+        if periods and periods[-1][0] == status and periods[-1][2] == start - offset:
+            periods[-1] = (status, periods[-1][1], stop - offset)
+        else:
+            periods.append((status, start - offset, stop - offset))
+        start = stop
+
+
+def build_timeline(total_driving_minutes, cycle_used_minutes=0, start_minute=DEFAULT_START_MINUTE,
+                   recap=None, fuel_stops=()):
+    """
+    `recap` is a CycleRecap positioned on the departure day; without one the
+    scalar `cycle_used_minutes` seeds it (see CycleRecap.from_prior_total).
+    The recap is advanced in place as the plan moves through calendar days.
+
+    `fuel_stops` are sorted driving-minute offsets where the truck has to
+    pull in for fuel (see stops.fuel_stop_offsets); each one splits the
+    driving stint it falls in with a FUEL_STOP_MINUTES on-duty stop. Fuel
+    stops count against the 70-hour and 14-hour limits like any other
+    on-duty time, and one of at least BREAK_MINUTES is the 30-minute break.
+    """
+    if recap is None:
+        recap = CycleRecap.from_prior_total(cycle_used_minutes)
+    timeline = Timeline(recap.used)
+    driving_left = total_driving_minutes
+    driven = 0
+    t = start_minute
+    number = 1
+
+    # Not enough cycle left to even start: restart before departure
+    if driving_left > MIN_REMAINING_DRIVING and \
+            recap.available - PICKUP_MINUTES < min(driving_left, MIN_USEFUL_DRIVING):
+        t = _restart(timeline, recap, 0, t, start_minute)
+
+    while driving_left > MIN_REMAINING_DRIVING:
+        day = PlannedDay(number, t)
+        on_duty = 0
+
+        if number == 1:
+            t = timeline.add(ON_DUTY, t, PICKUP_MINUTES, "Pickup")
+            on_duty += PICKUP_MINUTES
+
+        t, driving_today, on_duty = _drive_day(
+            timeline, day, t, min(MAX_DRIVING_PER_DAY, driving_left), driven, on_duty,
+            recap.available, fuel_stops)
+
+        last_day = driving_left - driving_today <= MIN_REMAINING_DRIVING
+        driven += driving_today
+
+        if last_day:
+            t = timeline.add(ON_DUTY, t, DROPOFF_MINUTES, "Dropoff")
+            on_duty += DROPOFF_MINUTES
+
+        day.driving = driving_today
+        day.on_duty = on_duty
+        day.work_end = t
+
+        driving_left -= driving_today
+        recap.add(on_duty)
+        timeline.total_driving += driving_today
+        timeline.total_on_duty += on_duty
+
+        next_start = max(day.start + DUTY_WINDOW + OFF_DUTY_RESET, t + OFF_DUTY_RESET)
+        if not last_day:
+            days_ahead = next_start // DAY_MINUTES - day.start // DAY_MINUTES
+            if recap.available_after(days_ahead) < min(driving_left, MIN_USEFUL_DRIVING):
+                next_start = _restart(timeline, recap, number, t, start_minute)
+            else:
+                timeline.add(OFF_DUTY, t, next_start - t)
+                recap.advance(days_ahead)
+
+        day.next_start = next_start
+        timeline.days.append(day)
+        t = next_start
+        number += 1
+
+    timeline.recap = recap
+    return timeline
+
+
+def _drive_day(timeline, day, t, limit, driven, on_duty, available, fuel_stops):
+    """
+    Drive up to `limit` minutes of one duty day, starting `driven` minutes
+    into the trip with `on_duty` minutes already worked. Driving stops at
+    whichever comes first: the limit, the 70-hour rule (on duty reaching
+    `available`; on-duty work afterwards, like the dropoff, is still fine)
+    or the end of the 14-hour window. A 30-minute break follows 8 hours of
+    driving without one, and fuel stops are made at their offsets.
+    Returns (t, minutes driven, on_duty).
+    """
+    window_end = day.start + DUTY_WINDOW
+    driving = since_break = 0
+    while driving < limit:
+        if since_break >= BREAK_AFTER_DRIVING:
+            # Only worth taking if there is still driving to do after it
+            if min(available - on_duty, window_end - t) - BREAK_MINUTES <= 0:
+                break
+            t = timeline.add(ON_DUTY, t, BREAK_MINUTES, "30-min break")
+            on_duty += BREAK_MINUTES
+            since_break = 0
+            day.break_taken = True
+            continue
+
+        stint = min(limit - driving, BREAK_AFTER_DRIVING - since_break, available - on_duty, window_end - t)
+        if stint <= 0:
+            break
+        position = driven + driving
+        i = bisect_right(fuel_stops, position)
+        fuel = i < len(fuel_stops) and fuel_stops[i] <= position + stint
+        if fuel:
+            stint = fuel_stops[i] - position
+        t = timeline.add(DRIVING, t, stint)
+        driving += stint
+        on_duty += stint
+        since_break += stint
+
+        if fuel:
+            t = timeline.add(ON_DUTY, t, FUEL_STOP_MINUTES, "Fuel stop")
+            on_duty += FUEL_STOP_MINUTES
+            day.fuel_stops += 1
+            if FUEL_STOP_MINUTES >= BREAK_MINUTES:
+                day.break_taken = day.break_taken or since_break > 0
+                since_break = 0
+    return t, driving, on_duty
+
+
+def _restart(timeline, recap, after_day, start, start_minute):
+    """
+    At least 34 consecutive hours off duty from `start`, then back on the
+    usual shift start so no shift runs past midnight. Returns the new start.
+    """
+    restart_end = start + RESTART_MINUTES
+    next_start = restart_end + (start_minute - restart_end) % DAY_MINUTES
+    timeline.add(OFF_DUTY, start, next_start - start, "34-hour restart")
+    timeline.restarts.append(Restart(after_day, start, next_start))
+    recap.reset()
+    return next_start
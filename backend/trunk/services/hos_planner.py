@@ -1,96 +1,112 @@
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from decimal import Decimal
 
-def plan_hos_compliant_trip(total_driving_seconds: int, cycle_used_hours: Decimal):
-    total_driving_hours = round(total_driving_seconds / 3600, 2)
-    driving_left = Decimal(str(total_driving_hours))
-    cycle_used = Decimal(cycle_used_hours)
-    remaining_cycle = Decimal('70') - cycle_used
-
+from .hos_engine import build_timeline, DAY_MINUTES
+from .recap import CycleRecap
+from .stops import fuel_stop_offsets, place_stops
+
+
+def plan_hos_compliant_trip(total_driving_seconds: int, cycle_used_hours: Decimal, start_date: date = None,
+                            recap=None, route_index=None):
+    """
+    `recap` (a CycleRecap positioned on the departure day) takes precedence
+    over the scalar `cycle_used_hours` when the driver's daily history is known.
+    With a `route_index` fuel stops are placed by distance and every stop is
+    located on the route (plan["stops"]).
+    """
+    start_date = start_date or date.today()
+    if recap is None:
+        recap = CycleRecap.from_prior_total(int(round(Decimal(str(cycle_used_hours)) * 60)))
+    # build_timeline advances the recap through the trip
+    recap_at_departure = {"as_of": start_date.strftime("%Y-%m-%d"), "minutes": recap.days()}
+    timeline = build_timeline(
+        total_driving_minutes=int(round(total_driving_seconds / 60)),
+        recap=recap,
+        fuel_stops=fuel_stop_offsets(route_index) if route_index is not None else (),
+    )
+    plan = timeline_to_plan(timeline, start_date)
+    plan["recap_at_departure"] = recap_at_departure
+    if route_index is not None:
+        plan["stops"] = place_stops(timeline, route_index, start_date)
+    return plan
+
+
+def timeline_to_plan(timeline, start_date):
+    """
+    JSON view of a hos_engine.Timeline, in the shape stored on Trip.hos_plan.
+    Each day also carries `duty_periods`: [{"status", "start", "end"}] in
+    minutes of that calendar day, covering 00:00-24:00, for the log grids.
+    """
+    restarts_after = {r.after_day for r in timeline.restarts}
+    periods_by_day = timeline.duty_periods_by_day()
     daily_plan = []
-    day = 1
-    current_time = datetime.now().replace(hour=5, minute=0, second=0, microsecond=0)
-    cumulative_driving = Decimal('0')
-
-    while driving_left > Decimal('0.1'):
-        day_entry = {
-            "day": day,
-            "date": current_time.strftime("%Y-%m-%d"),
-            "start_time": current_time.strftime("%H:%M"),
-            "driving_hours": 0.0,
-            "on_duty_hours": 0.0,
-            "events": [],
-            "fuel_stop": False,
-            "includes_30min_break": False,
-            "off_duty_start": "",
-            "next_day_start": ""
-        }
-
-        # How much driving can we do today?
-        max_driving_today = min(Decimal('11.0'), remaining_cycle)
-        driving_today = min(max_driving_today, driving_left)
-
-        # 30-minute break if driving > 8 hours
-        break_needed = driving_today > Decimal('8.0')
-        on_duty_today = driving_today
-        if break_needed:
-            on_duty_today += Decimal('0.5')
-            day_entry["includes_30min_break"] = True
-
-        # Pickup on day 1, dropoff on last day
-        if day == 1:
-            on_duty_today += Decimal('1.0')  # pickup
-        if driving_left <= driving_today + Decimal('0.5'):  # last day
-            on_duty_today += Decimal('1.0')  # dropoff
-
-        # Fuel stop every ~1000 miles
-        cumulative_driving += driving_today
-        if cumulative_driving >= Decimal('950') and not any(d.get("fuel_stop") for d in daily_plan):
-            day_entry["fuel_stop"] = True
-            day_entry["events"].append("30-min fuel stop")
-
-        # Final numbers (convert to float only for display)
-        day_entry["driving_hours"] = round(float(driving_today), 1)
-        day_entry["on_duty_hours"] = round(float(on_duty_today), 1)
-        day_entry["events"].append(f"Drive {round(float(driving_today), 1)}h")
-
-        # 14-hour window + 10-hour reset
-        off_duty_start = current_time + timedelta(hours=14)
-        off_duty_end = off_duty_start + timedelta(hours=10)
 
-        day_entry["off_duty_start"] = off_duty_start.strftime("%H:%M")
-        day_entry["next_day_start"] = off_duty_end.strftime("%H:%M (+1 day)")
-
-        daily_plan.append(day_entry)
-
-        # Update counters
-        driving_left -= driving_today
-        cycle_used += on_duty_today
-        remaining_cycle = Decimal('70') - cycle_used
-
-        # 34-hour restart if needed
-        if remaining_cycle <= 0 and driving_left > Decimal('0.1'):
+    for day in timeline.days:
+        if day.number - 1 in restarts_after:
             daily_plan.append({
                 "day": "RESET",
                 "event": "34-HOUR RESTART",
                 "note": "Required to regain 70-hour cycle"
             })
-            current_time += timedelta(hours=34)
-            cycle_used = Decimal(cycle_used_hours)  # reset cycle
-            remaining_cycle = Decimal('70') - cycle_used
-        else:
-            current_time = off_duty_end
 
-        day += 1
+        day_index = day.start // DAY_MINUTES
+        driving_hours = round(day.driving / 60, 1)
+
+        events = ["30-min fuel stop"] * day.fuel_stops
+        events.append(f"Drive {driving_hours}h")
+
+        days_ahead = day.next_start // DAY_MINUTES - day_index
+        daily_plan.append({
+            "day": day.number,
+            "date": (start_date + timedelta(days=day_index)).strftime("%Y-%m-%d"),
+            "start_time": _clock(day.start),
+            "driving_hours": driving_hours,
+            "on_duty_hours": round(day.on_duty / 60, 1),
+            "events": events,
+            "fuel_stop": day.fuel_stop,
+            "fuel_stops": day.fuel_stops,
+            "includes_30min_break": day.break_taken,
+            "off_duty_start": _clock(day.work_end),
+            "next_day_start": f"{_clock(day.next_start)} (+{days_ahead} day{'s' if days_ahead != 1 else ''})",
+            "duty_periods": [
+                {"status": status, "start": start, "end": end}
+                for status, start, end in periods_by_day.get(day_index, ())
+            ],
+        })
+
+    last_day_index = timeline.days[-1].start // DAY_MINUTES if timeline.days else 0
+    return {
+        "total_days_needed": len(timeline.days),
+        "total_on_duty_hours": round(timeline.total_on_duty / 60, 1),
+        # Rolling 70h/8-day figure on arrival: restarts and expired days included
+        "remaining_cycle_after_trip": round(timeline.recap.available / 60, 1),
+        "requires_34h_reset": bool(timeline.restarts),
+        # Per-day on-duty minutes ending on the last trip day, for DriverRecap
+        "recap_after_trip": {
+            "as_of": (start_date + timedelta(days=last_day_index)).strftime("%Y-%m-%d"),
+            "minutes": timeline.recap.days(),
+        },
+        # What this trip adds to the driver's recap, for DriverRecap.trips
+        "cycle_days": _cycle_days(timeline, start_date),
+        "daily_plan": daily_plan
+    }
 
-    # Final summary
-    total_on_duty_added = sum(Decimal(str(d["on_duty_hours"])) for d in daily_plan if "on_duty_hours" in d)
-    final_remaining = Decimal('70') - (Decimal(cycle_used_hours) + total_on_duty_added)
 
+def _cycle_days(timeline, start_date):
+    """
+    On-duty minutes per calendar day from `start_date`, and the day offsets
+    on which each 34-hour restart ends (see recap.recap_on).
+    """
+    minutes = [0] * (timeline.days[-1].start // DAY_MINUTES + 1 if timeline.days else 0)
+    for day in timeline.days:
+        minutes[day.start // DAY_MINUTES] += day.on_duty
     return {
-        "total_days_needed": len([d for d in daily_plan if isinstance(d.get("day"), int)]),
-        "total_on_duty_hours": round(float(total_on_duty_added), 1),
-        "remaining_cycle_after_trip": max(0, round(float(final_remaining), 1)),
-        "requires_34h_reset": any("34-HOUR" in str(d) for d in daily_plan),
-        "daily_plan": daily_plan
-    }
\ No newline at end of file
+        "start": start_date.strftime("%Y-%m-%d"),
+        "minutes": minutes,
+        "restarts": [restart.end // DAY_MINUTES for restart in timeline.restarts],
+    }
+
+
+def _clock(minute):
+    minute %= DAY_MINUTES
+    return f"{minute // 60:02d}:{minute % 60:02d}"
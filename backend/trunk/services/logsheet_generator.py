@@ -1,15 +1,86 @@
 from reportlab.lib.pagesizes import LETTER
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
-from datetime import datetime
-import os
-
-def generate_daily_log_pdf(day_data, trip, output_dir="logs"):
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # FIXED: Use str(trip.id) and avoid smart quotes
-    filename = f"logs/Log_Day_{day_data['day']}_{str(trip.id)[:8]}.pdf"
-    c = canvas.Canvas(filename, pagesize=LETTER)
+import io
+import zipfile
+
+# Row offset above the grid baseline and stroke colour per duty status
+DUTY_ROWS = {
+    "off_duty": (0.1*inch, (0, 0, 0)),
+    "sleeper_berth": (0.3*inch, (0.4, 0.4, 0.4)),
+    "driving": (0.55*inch, (1, 0.7, 0)),
+    "on_duty": (0.7*inch, (0, 0.5, 1)),
+}
+
+def draw_duty_periods(c, periods, grid_x, grid_y, hour_width=0.3*inch):
+    """Draw hos_plan duty_periods (minutes of day) onto the 24-hour grid."""
+    for period in periods:
+        offset, color = DUTY_ROWS[period["status"]]
+        c.setStrokeColorRGB(*color)
+        x1 = grid_x + period["start"] / 60 * hour_width
+        x2 = grid_x + period["end"] / 60 * hour_width
+        c.line(x1, grid_y + offset, x2, grid_y + offset)
+
+def daily_logs(trip):
+    """The driving days of trip.hos_plan (RESET markers have no log sheet)."""
+    return [day for day in (trip.hos_plan or {}).get("daily_plan", []) if day.get("day") != "RESET"]
+
+
+def generate_trip_logs_pdf(trip, buffer=None):
+    """
+    Every day of the trip's plan as one multi-page PDF, rendered into
+    `buffer` (a new BytesIO by default) and rewound for reading.
+    """
+    buffer = buffer or io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=LETTER)
+    c.setTitle(f"Daily logs - trip {trip.id}")
+    for day_data in daily_logs(trip):
+        draw_daily_log(c, day_data, trip)
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+def log_filename(trip):
+    return f"Logs_{trip.id}.pdf"
+
+
+class ChunkSink(io.RawIOBase):
+    """Unseekable write target for zipfile; the caller drains what's been written so far."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_trip_logs_zip(trips, render=None):
+    """
+    Yield a zip archive with one PDF per trip, chunk by chunk: each trip's
+    bytes go out as soon as its PDF is rendered, nothing touches the disk.
+    `render(trip)` returns the PDF bytes (default: render it here).
+    """
+    render = render or (lambda trip: generate_trip_logs_pdf(trip).getvalue())
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for trip in trips:
+            archive.writestr(log_filename(trip), render(trip))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def draw_daily_log(c, day_data, trip):
+    """One log sheet page for a hos_plan day on canvas `c`."""
     width, height = LETTER
 
     # Use only ASCII characters – NO smart quotes, NO en-dashes!
@@ -37,31 +108,34 @@ def generate_daily_log_pdf(day_data, trip, output_dir="logs"):
         c.line(x, y, x, y + 0.8*inch)
 
     # Duty status lines (thick colored lines)
-    start_x = 0.5*inch + 5 * 0.3*inch  # 5 AM start
     c.setLineWidth(4)
+    if day_data.get("duty_periods"):
+        draw_duty_periods(c, day_data["duty_periods"], 0.5*inch, y)
+    else:
+        start_x = 0.5*inch + 5 * 0.3*inch  # 5 AM start
 
-    # 1. Off Duty (black)
-    c.setStrokeColorRGB(0, 0, 0)
-    c.line(start_x, y + 0.1*inch, start_x + 1*0.3*inch, y + 0.1*inch)
+        # 1. Off Duty (black)
+        c.setStrokeColorRGB(0, 0, 0)
+        c.line(start_x, y + 0.1*inch, start_x + 1*0.3*inch, y + 0.1*inch)
 
-    # 2. On Duty - Pickup (blue)
-    c.setStrokeColorRGB(0, 0.5, 1)
-    c.line(start_x + 1*0.3*inch, y + 0.7*inch, start_x + 2*0.3*inch, y + 0.7*inch)
+        # 2. On Duty - Pickup (blue)
+        c.setStrokeColorRGB(0, 0.5, 1)
+        c.line(start_x + 1*0.3*inch, y + 0.7*inch, start_x + 2*0.3*inch, y + 0.7*inch)
 
-    # 3. Driving (yellow/orange)
-    c.setStrokeColorRGB(1, 0.7, 0)
-    drive_end = start_x + (2 + day_data["driving_hours"]) * 0.3*inch
-    c.line(start_x + 2*0.3*inch, y + 0.55*inch, drive_end, y + 0.55*inch)
+        # 3. Driving (yellow/orange)
+        c.setStrokeColorRGB(1, 0.7, 0)
+        drive_end = start_x + (2 + day_data["driving_hours"]) * 0.3*inch
+        c.line(start_x + 2*0.3*inch, y + 0.55*inch, drive_end, y + 0.55*inch)
 
-    # 30-min break if needed
-    if day_data.get("includes_30min_break"):
-        c.setStrokeColorRGB(0, 0.5, 1)
-        break_x = start_x + (2 + 8) * 0.3*inch
-        c.line(break_x, y + 0.7*inch, break_x + 0.5*0.3*inch, y + 0.7*inch)
+        # 30-min break if needed
+        if day_data.get("includes_30min_break"):
+            c.setStrokeColorRGB(0, 0.5, 1)
+            break_x = start_x + (2 + 8) * 0.3*inch
+            c.line(break_x, y + 0.7*inch, break_x + 0.5*0.3*inch, y + 0.7*inch)
 
-    # Final Off Duty
-    c.setStrokeColorRGB(0, 0, 0)
-    c.line(drive_end, y + 0.1*inch, width - 0.5*inch, y + 0.1*inch)
+        # Final Off Duty
+        c.setStrokeColorRGB(0, 0, 0)
+        c.line(drive_end, y + 0.1*inch, width - 0.5*inch, y + 0.1*inch)
 
     # Remarks (ASCII only!)
     c.setFont("Helvetica", 9)
@@ -80,6 +154,4 @@ def generate_daily_log_pdf(day_data, trip, output_dir="logs"):
     c.drawString(width - 2.8*inch, height - 5.5*inch, f"Driving: {day_data['driving_hours']}h")
     c.drawString(width - 1.5*inch, height - 5.5*inch, f"On Duty: {day_data['on_duty_hours']}h")
 
-    c.showPage()
-    c.save()
-    return filename
\ No newline at end of file
+    c.showPage()
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+In-process timing instrumentation (METRICS_ENABLED).
+
+    with metrics.timer("geocode"):
+        ...
+
+records the block into a latency histogram and, inside a request, into the
+Server-Timing header that server_timing_middleware adds to the response.
+/api/metrics serves the histograms plus the cache, circuit breaker and
+request-coalescing counters in Prometheus text format. Figures are per
+process: scrape every worker, or sum them.
+
+When METRICS_ENABLED is off, timer() hands back one shared no-op context
+manager and the middleware removes itself at startup, so instrumented
+code pays a single attribute lookup.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+
+# Upper bounds in seconds; +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "trunk_stage_seconds": "Time spent in each instrumented stage.",
+    "trunk_ors_request_seconds": "OpenRouteService HTTP attempts, by endpoint and outcome.",
+    "trunk_http_request_seconds": "Django request handling time, by view and status class.",
+}
+
+_NOOP = nullcontext()
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+_histograms = {}            # (metric, ((label, value), ...)) -> Histogram
+_histograms_lock = threading.Lock()
+
+
+def observe(metric, seconds, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "metric", "labels", "started")
+
+    def __init__(self, name, metric, labels):
+        self.name = name
+        self.metric = metric
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started, self.metric, **self.labels)
+
+
+def record(name, seconds, metric="trunk_stage_seconds", **labels):
+    """Account for an already-measured duration, as timer() would have."""
+    if not settings.METRICS_ENABLED:
+        return
+    observe(metric, seconds, **(labels or {"stage": name}))
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def timer(name, metric="trunk_stage_seconds", **labels):
+    """Time a block as `name` (label stage=name unless other labels are given)."""
+    if not settings.METRICS_ENABLED:
+        return _NOOP
+    return _Timer(name, metric, labels or {"stage": name})
+
+
+def begin_request():
+    """Start collecting Server-Timing entries for the current request (context)."""
+    return _request_timings.set([])
+
+
+def end_request(token):
+    timings = _request_timings.get()
+    _request_timings.reset(token)
+    return timings or []
+
+
+def server_timing(timings, total=None):
+    """
+    Server-Timing header value. Repeated names (one per ORS call, say) are
+    summed and carry their count as the description.
+    """
+    totals, counts = {}, {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+    parts = [
+        f'{name};dur={seconds * 1000:.1f}' + (f';desc="x{counts[name]}"' if counts[name] > 1 else "")
+        for name, seconds in totals.items()
+    ]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histograms(lines):
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    seen = set()
+    for (metric, labels), histogram in items:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} histogram")
+        counts, total = histogram.snapshot()
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_labels(labels)} {cumulative}")
+
+
+def _cache_samples():
+    """(metric, labels, value) for every cache's counters."""
+    from . import artifact_cache, geocode_cache, route_cache
+
+    route = route_cache.stats()
+    geocode = geocode_cache.stats()
+    artifact = artifact_cache.stats()
+    lookups = artifact["memory_hits"] + artifact["disk_hits"] + artifact["renders"]
+    return [
+        ("trunk_cache_hits_total", (("cache", "route"), ("tier", "memory")), route["hits"]),
+        ("trunk_cache_misses_total", (("cache", "route"),), route["misses"]),
+        ("trunk_cache_evictions_total", (("cache", "route"),), route["evictions"]),
+        ("trunk_cache_entries", (("cache", "route"),), route["size"]),
+        ("trunk_cache_bytes", (("cache", "route"),), route["compressed_bytes"]),
+        ("trunk_cache_hit_ratio", (("cache", "route"),), route["hit_rate"]),
+
+        ("trunk_cache_hits_total", (("cache", "geocode"), ("tier", "memory")), geocode["memory_hits"]),
+        ("trunk_cache_hits_total", (("cache", "geocode"), ("tier", "db")), geocode["db_hits"]),
+        ("trunk_cache_misses_total", (("cache", "geocode"),), geocode["misses"]),
+        ("trunk_cache_evictions_total", (("cache", "geocode"),), geocode["db_evictions"]),
+        ("trunk_cache_entries", (("cache", "geocode"),), geocode["db_entries"]),
+        ("trunk_cache_hit_ratio", (("cache", "geocode"),), geocode["hit_rate"]),
+
+        ("trunk_cache_hits_total", (("cache", "artifact"), ("tier", "memory")), artifact["memory_hits"]),
+        ("trunk_cache_hits_total", (("cache", "artifact"), ("tier", "disk")), artifact["disk_hits"]),
+        ("trunk_cache_misses_total", (("cache", "artifact"),), artifact["renders"]),
+        ("trunk_cache_evictions_total", (("cache", "artifact"),), artifact["evicted_files"]),
+        ("trunk_cache_entries", (("cache", "artifact"),), artifact["memory"]["size"]),
+        ("trunk_cache_bytes", (("cache", "artifact"),), artifact["disk_bytes"] or 0),
+        ("trunk_cache_hit_ratio", (("cache", "artifact"),),
+         round((artifact["memory_hits"] + artifact["disk_hits"]) / lookups, 3) if lookups else 0.0),
+    ]
+
+
+CACHE_TYPES = {
+    "trunk_cache_hits_total": ("counter", "Cache hits, by cache and tier."),
+    "trunk_cache_misses_total": ("counter", "Cache misses (for artifacts: renders)."),
+    "trunk_cache_evictions_total": ("counter", "Entries or files evicted."),
+    "trunk_cache_entries": ("gauge", "Entries held (artifact: memory tier; geocode: DB rows, up to a minute old)."),
+    "trunk_cache_bytes": ("gauge", "Bytes held (route: compressed memory; artifact: disk tier)."),
+    "trunk_cache_hit_ratio": ("gauge", "Hits / lookups since process start."),
+}
+
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _resilience_samples():
+    """Circuit breakers of the ORS client and the single-flight groups in routing."""
+    from . import ors_client, routing
+
+    samples = []
+    for endpoint, breaker in sorted(ors_client.breaker_stats().items()):
+        labels = (("endpoint", endpoint),)
+        samples += [
+            ("trunk_ors_circuit_state", labels, CIRCUIT_STATES[breaker["state"]]),
+            ("trunk_ors_circuit_opens_total", labels, breaker["opens"]),
+            ("trunk_ors_circuit_rejected_total", labels, breaker["rejected"]),
+        ]
+    for flight in (routing.geocode_flights, routing.route_flights):
+        stats = flight.stats()
+        labels = (("kind", flight.name),)
+        samples += [
+            ("trunk_singleflight_calls_total", labels, stats["calls"]),
+            ("trunk_singleflight_shared_total", labels, stats["shared"]),
+        ]
+    return samples
+
+
+RESILIENCE_TYPES = {
+    "trunk_ors_circuit_state": ("gauge", "ORS circuit breaker: 0 closed, 1 half-open, 2 open."),
+    "trunk_ors_circuit_opens_total": ("counter", "Times the breaker opened."),
+    "trunk_ors_circuit_rejected_total": ("counter", "Calls failed fast while open or half-open."),
+    "trunk_singleflight_calls_total": ("counter", "Remote lookups actually made."),
+    "trunk_singleflight_shared_total": ("counter", "Lookups that joined an identical one in flight."),
+}
+
+
+def render_prometheus():
+    lines = []
+    _render_histograms(lines)
+    samples = _cache_samples() + _resilience_samples()
+    for metric, (kind, help_text) in {**CACHE_TYPES, **RESILIENCE_TYPES}.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f"{m}{_labels(labels)} {value}" for m, labels, value in samples if m == metric)
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
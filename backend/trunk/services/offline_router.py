@@ -0,0 +1,165 @@
+"""
+Local routing backend (ROUTING_BACKEND = "offline").
+
+Answers get_truck_route() from the memory-mapped RoadGraph with a
+bidirectional A* on truck travel-time weights and returns the same GeoJSON
+shape as ORS directions (summary, per-leg segments, way_points, geometry),
+so nothing downstream can tell which backend planned the trip.
+"""
+import heapq
+import logging
+import math
+import threading
+
+from django.conf import settings
+
+from .road_graph import RoadGraph
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.8
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+class OfflineRoutingError(Exception):
+    pass
+
+
+def get_graph():
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = RoadGraph(settings.ROAD_GRAPH_DIR)
+            logger.info(f"Road graph loaded: {_graph.meta['nodes']} nodes, {_graph.meta['edges']} edges")
+    return _graph
+
+
+def shortest_path(graph, source, target):
+    """
+    Bidirectional A* from node `source` to node `target`.
+
+    Both searches use the averaged potential p(v) = (h_t(v) - h_s(v)) / 2,
+    where h is the chord distance (never longer than the great-circle one)
+    at the graph's top truck speed, a lower bound on any path's weight. That keeps the reduced costs non-negative in
+    both directions, so the search may stop as soon as the two queue minimums
+    sum to at least the best meeting cost found.
+
+    Returns the list of forward edge ids along the path, or None.
+    """
+    if source == target:
+        return []
+    xyz = graph.node_xyz
+    scale = EARTH_RADIUS_MILES * 3600.0 / graph.max_speed_mph / 2
+    sx, sy, sz = xyz[source].tolist()
+    tx, ty, tz = xyz[target].tolist()
+    potentials = {}
+
+    def potential(v):
+        p = potentials.get(v)
+        if p is None:
+            x, y, z = xyz[v].tolist()
+            to_target = math.sqrt((x - tx) ** 2 + (y - ty) ** 2 + (z - tz) ** 2)
+            from_source = math.sqrt((x - sx) ** 2 + (y - sy) ** 2 + (z - sz) ** 2)
+            p = potentials[v] = (to_target - from_source) * scale
+        return p
+
+    indptr, indices, weight = graph.indptr, graph.indices, graph.weight
+    rev_indptr, rev_indices, rev_edge = graph.rev_indptr, graph.rev_indices, graph.rev_edge
+
+    dist = ({source: 0.0}, {target: 0.0})
+    via = ({}, {})                              # node -> (edge id, previous node)
+    done = (set(), set())
+    queues = ([(potential(source), source)], [(-potential(target), target)])
+    best, meet = math.inf, None
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+        side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+        _, u = heapq.heappop(queues[side])
+        if u in done[side]:
+            continue
+        done[side].add(u)
+        du = dist[side][u]
+
+        if side == 0:
+            lo, hi = int(indptr[u]), int(indptr[u + 1])
+            neighbours, edges = indices[lo:hi].tolist(), range(lo, hi)
+            costs = weight[lo:hi].tolist()
+        else:
+            lo, hi = int(rev_indptr[u]), int(rev_indptr[u + 1])
+            neighbours, edges = rev_indices[lo:hi].tolist(), rev_edge[lo:hi]
+            costs = weight[edges].tolist()
+            edges = edges.tolist()
+
+        mine, other = dist[side], dist[1 - side]
+        for v, edge, cost in zip(neighbours, edges, costs):
+            dv = du + cost
+            if dv < mine.get(v, math.inf):
+                mine[v] = dv
+                via[side][v] = (edge, u)
+                key = dv + potential(v) if side == 0 else dv - potential(v)
+                heapq.heappush(queues[side], (key, v))
+                if v in other and dv + other[v] < best:
+                    best, meet = dv + other[v], v
+
+    if meet is None:
+        return None
+
+    path = []
+    v = meet
+    while v != source:
+        edge, v = via[0][v]
+        path.append(edge)
+    path.reverse()
+    v = meet
+    while v != target:
+        edge, v = via[1][v]
+        path.append(edge)
+    return path
+
+
+def get_route(coordinates):
+    """
+    ORS-shaped GeoJSON directions response for [[lon, lat], ...] waypoints,
+    distances in miles. Raises OfflineRoutingError if a waypoint is off the
+    graph or two waypoints aren't connected.
+    """
+    graph = get_graph()
+    nodes = []
+    for lon, lat in coordinates:
+        node = graph.nearest_node(lon, lat, settings.ROAD_GRAPH_SNAP_MILES)
+        if node is None:
+            raise OfflineRoutingError(f"No road within {settings.ROAD_GRAPH_SNAP_MILES} mi of {lon},{lat}")
+        nodes.append(node)
+
+    geometry = [[float(graph.node_lon[nodes[0]]), float(graph.node_lat[nodes[0]])]]
+    segments, way_points = [], [0]
+    for a, b in zip(nodes, nodes[1:]):
+        path = shortest_path(graph, a, b)
+        if path is None:
+            raise OfflineRoutingError(f"No truck route between {graph.node_lon[a]},{graph.node_lat[a]} "
+                                      f"and {graph.node_lon[b]},{graph.node_lat[b]}")
+        targets = graph.indices[path]
+        geometry.extend(zip(graph.node_lon[targets].tolist(), graph.node_lat[targets].tolist()))
+        segments.append({
+            "distance": round(float(graph.miles[path].sum()), 3),
+            "duration": round(float(graph.seconds[path].sum()), 1),
+        })
+        way_points.append(len(geometry) - 1)
+
+    summary = {
+        "distance": round(sum(s["distance"] for s in segments), 3),
+        "duration": round(sum(s["duration"] for s in segments), 1),
+    }
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [list(p) for p in geometry]},
+            "properties": {"summary": summary, "segments": segments, "way_points": way_points},
+        }],
+        "metadata": {"engine": "offline", "graph": graph.meta.get("source")},
+    }
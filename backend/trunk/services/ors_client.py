@@ -0,0 +1,299 @@
+import asyncio
+import random
+import threading
+import time
+import logging
+import weakref
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import metrics
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ORSUnavailable(Exception):
+    """The endpoint's circuit breaker is open: ORS is failing, so we don't call it."""
+
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"OpenRouteService {endpoint} is unavailable, retry in {retry_after:.0f}s")
+
+
+class ORSClient:
+    """
+    Pooled keep-alive session for OpenRouteService.
+
+    One instance is shared by the whole process (see get_client) so every
+    geocode/directions call reuses an open TCP+TLS connection. Retries
+    429/5xx and connection errors with jittered exponential backoff,
+    honouring Retry-After when ORS sends it. A caller's `deadline` bounds
+    the whole loop: each attempt's timeout is cut to the time left, and no
+    retry is made whose wait would end past it.
+
+    Each endpoint has its own circuit breaker. Connection errors, timeouts
+    and 5xx responses count as failures; any other response proves ORS is
+    up. While a breaker is open, calls raise ORSUnavailable immediately,
+    and so does a retry loop that opens it.
+    """
+
+    def __init__(self, base_url, pool_size=10, timeouts=None,
+                 max_retries=3, backoff_base=0.5, max_backoff=8.0, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = timeouts or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.breaker_options = breaker or {}
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request("GET", endpoint, path, **kwargs)
+
+    def post(self, endpoint, path, **kwargs):
+        return self.request("POST", endpoint, path, **kwargs)
+
+    def request(self, method, endpoint, path, deadline=None, **kwargs):
+        """
+        `endpoint` names the ORS service ("geocode", "directions") and picks
+        its timeout. `deadline` is a time.monotonic() value the call must not
+        run past; requests.Timeout is raised once it has.
+        """
+        url = f"{self.base_url}{path}"
+        timeout = kwargs.pop("timeout", self.timeouts.get(endpoint, 30))
+
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            attempt_timeout = self._attempt_timeout(timeout, deadline)
+            if attempt_timeout is None:
+                raise requests.exceptions.Timeout(f"ORS {endpoint} deadline passed")
+            if not breaker.allow():
+                raise ORSUnavailable(endpoint, breaker.retry_after())
+            started = time.perf_counter()
+            settled = False
+            try:
+                response = self.session.request(method, url, timeout=attempt_timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(endpoint, started, type(e).__name__)
+                breaker.record_failure()
+                settled = True
+                delay = self._backoff(attempt)
+                if not self._will_retry(attempt, delay, deadline):
+                    raise
+                logger.warning(f"ORS {endpoint} {type(e).__name__}, retry {attempt + 1} in {delay:.2f}s")
+            else:
+                self._record(endpoint, started, str(response.status_code))
+                self._settle(breaker, response)
+                settled = True
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._retry_after(response) or self._backoff(attempt)
+                if not self._will_retry(attempt, delay, deadline):
+                    return response
+                logger.warning(f"ORS {endpoint} HTTP {response.status_code}, retry {attempt + 1} in {delay:.2f}s")
+            finally:
+                if not settled:
+                    breaker.release()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def breaker(self, endpoint):
+        with self._breakers_lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(f"ors-{endpoint}", **self.breaker_options)
+            return self.breakers[endpoint]
+
+    @staticmethod
+    def _attempt_timeout(timeout, deadline):
+        """The next attempt's timeout: `timeout` cut to the time left, None if there is none."""
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.monotonic()
+        return min(timeout, remaining) if remaining > 0 else None
+
+    def _will_retry(self, attempt, delay, deadline):
+        return attempt < self.max_retries and (deadline is None or time.monotonic() + delay < deadline)
+
+    @staticmethod
+    def _settle(breaker, response):
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _record(self, endpoint, started, outcome):
+        metrics.record(f"ors_{endpoint}", time.perf_counter() - started, "trunk_ors_request_seconds",
+                       endpoint=endpoint, outcome=outcome)
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many workers instead of synchronising them
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.max_backoff)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncORSClient:
+    """
+    httpx twin of ORSClient for the async planning path. It takes the
+    timeouts, retry policy and circuit breakers of the ORSClient it wraps,
+    so an outage seen on either path fails both fast. Its connection pool
+    belongs to one event loop (see get_async_client).
+    """
+
+    def __init__(self, policy, pool_size=10):
+        self.policy = policy
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(base_url=policy.base_url, limits=limits)
+        self.closer = None      # get_async_client's task closing this client with its loop
+
+    async def get(self, endpoint, path, **kwargs):
+        return await self.request("GET", endpoint, path, **kwargs)
+
+    async def post(self, endpoint, path, **kwargs):
+        return await self.request("POST", endpoint, path, **kwargs)
+
+    async def request(self, method, endpoint, path, deadline=None, **kwargs):
+        """ORSClient.request on the event loop; httpx.TimeoutException once `deadline` has passed."""
+        policy = self.policy
+        timeout = kwargs.pop("timeout", policy.timeouts.get(endpoint, 30))
+        breaker = policy.breaker(endpoint)
+
+        attempt = 0
+        while True:
+            attempt_timeout = policy._attempt_timeout(timeout, deadline)
+            if attempt_timeout is None:
+                raise httpx.TimeoutException(f"ORS {endpoint} deadline passed")
+            if not breaker.allow():
+                raise ORSUnavailable(endpoint, breaker.retry_after())
+            started = time.perf_counter()
+            settled = False
+            try:
+                response = await self.client.request(method, path, timeout=attempt_timeout, **kwargs)
+            except httpx.TransportError as e:
+                policy._record(endpoint, started, type(e).__name__)
+                breaker.record_failure()
+                settled = True
+                delay = policy._backoff(attempt)
+                if not policy._will_retry(attempt, delay, deadline):
+                    raise
+                logger.warning(f"ORS {endpoint} {type(e).__name__}, retry {attempt + 1} in {delay:.2f}s")
+            else:
+                policy._record(endpoint, started, str(response.status_code))
+                policy._settle(breaker, response)
+                settled = True
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = policy._retry_after(response) or policy._backoff(attempt)
+                if not policy._will_retry(attempt, delay, deadline):
+                    return response
+                logger.warning(f"ORS {endpoint} HTTP {response.status_code}, retry {attempt + 1} in {delay:.2f}s")
+            finally:
+                # Cancelled (e.g. by a stage deadline) or an unexpected error mid-call
+                if not settled:
+                    breaker.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()     # event loop -> AsyncORSClient
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ORSClient(
+                    base_url=settings.ORS_BASE_URL,
+                    pool_size=settings.ORS_POOL_SIZE,
+                    timeouts=settings.ORS_TIMEOUTS,
+                    max_retries=settings.ORS_MAX_RETRIES,
+                    backoff_base=settings.ORS_BACKOFF_BASE_SECONDS,
+                    max_backoff=settings.ORS_BACKOFF_MAX_SECONDS,
+                    breaker={
+                        "failure_threshold": settings.ORS_BREAKER_FAILURE_THRESHOLD,
+                        "reset_timeout": settings.ORS_BREAKER_RESET_SECONDS,
+                        "half_open_probes": settings.ORS_BREAKER_HALF_OPEN_PROBES,
+                    },
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    The running event loop's AsyncORSClient. httpx connections can't move
+    between loops; under ASGI there is one loop per process, so this is one
+    pooled client per process. Under WSGI, async_to_sync runs each request
+    on a loop of its own, so the client is closed when its loop shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncORSClient(get_client(), pool_size=settings.ORS_ASYNC_POOL_SIZE)
+        client.closer = loop.create_task(_close_with_loop(loop, client))
+    return client
+
+
+async def _close_with_loop(loop, client):
+    """Wait until the loop shuts down (asyncio.run cancels leftover tasks), then close `client`."""
+    try:
+        await loop.create_future()
+    finally:
+        if _async_clients.get(loop) is client:
+            del _async_clients[loop]
+        await client.aclose()
+
+
+def reset_client():
+    """Drop the shared clients, e.g. after pointing ORS_BASE_URL at a local stand-in."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _async_clients.clear()
+
+
+def breaker_stats():
+    """{endpoint: breaker stats} for the shared client (empty before its first call)."""
+    client = _client
+    if client is None:
+        return {}
+    with client._breakers_lock:
+        return {endpoint: breaker.stats() for endpoint, breaker in client.breakers.items()}
@@ -0,0 +1,130 @@
+import os
+import socket
+import threading
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import PlanningJob
+from .trip_pipeline import plan_trip, PlanningError
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(trip):
+    return PlanningJob.objects.create(trip=trip)
+
+
+def claim_next(worker_id):
+    """
+    Atomically move the oldest due job from queued to running.
+    The conditional UPDATE is the lock, so this works on SQLite and Postgres
+    alike and two workers can never claim the same job.
+    """
+    candidates = (
+        PlanningJob.objects
+        .filter(state=PlanningJob.QUEUED, available_at__lte=timezone.now())
+        .order_by("available_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = PlanningJob.objects.filter(pk=pk, state=PlanningJob.QUEUED).update(
+            state=PlanningJob.RUNNING,
+            locked_by=worker_id,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return PlanningJob.objects.select_related("trip").get(pk=pk)
+    return None
+
+
+def process(job):
+    trip = job.trip
+    try:
+        plan_trip(trip)
+    except Exception as e:
+        transient = getattr(e, "transient", not isinstance(e, PlanningError))
+        if transient and job.attempts < settings.PLANNING_MAX_ATTEMPTS:
+            logger.warning(f"Planning {trip.id} attempt {job.attempts} failed, requeueing: {e}")
+            job.state = PlanningJob.QUEUED
+            job.available_at = timezone.now() + timedelta(
+                seconds=settings.PLANNING_RETRY_DELAY_SECONDS * job.attempts
+            )
+        else:
+            logger.error(f"Planning {trip.id} failed: {e}")
+            job.state = PlanningJob.FAILED
+            job.finished_at = timezone.now()
+            trip.status = "failed"
+            trip.save(update_fields=["status"])
+        job.error = str(e)
+    else:
+        job.state = PlanningJob.DONE
+        job.error = ""
+        job.finished_at = timezone.now()
+    job.locked_by = ""
+    job.save()
+    return job
+
+
+def requeue_stale():
+    """Put back jobs whose worker died mid-run."""
+    cutoff = timezone.now() - timedelta(seconds=settings.PLANNING_STALE_AFTER_SECONDS)
+    return PlanningJob.objects.filter(state=PlanningJob.RUNNING, started_at__lt=cutoff).update(
+        state=PlanningJob.QUEUED, locked_by=""
+    )
+
+
+def run_once(worker_id):
+    """Claim and process one job. Returns False when the queue is empty."""
+    job = claim_next(worker_id)
+    if job is None:
+        return False
+    process(job)
+    return True
+
+
+def _worker_loop(worker_id, stop_event, poll_interval, drain):
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            if run_once(worker_id):
+                continue
+            if drain:
+                return
+            stop_event.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def run_workers(num_workers=2, poll_interval=1.0, stop_event=None, drain=False):
+    """
+    Run `num_workers` planning threads until `stop_event` is set
+    (or, with drain=True, until the queue is empty).
+    """
+    stop_event = stop_event or threading.Event()
+    requeue_stale()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(
+            target=_worker_loop,
+            args=(f"{prefix}:{i}", stop_event, poll_interval, drain),
+            name=f"planning-{i}",
+            daemon=True,
+        )
+        for i in range(num_workers)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for t in threads:
+            t.join()
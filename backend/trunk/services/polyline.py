@@ -0,0 +1,42 @@
+"""
+Encoded polyline algorithm (Google / ORS "encoded" geometry format).
+
+Coordinates go in and come out in GeoJSON order, [lon, lat]; the encoded
+string itself uses the standard lat,lon order so it can be handed straight
+to map clients.
+"""
+import numpy as np
+
+# 5-bit groups per value; 7 cover deltas far beyond +-180 degrees at precision 6
+_SHIFTS = np.arange(7) * 5
+
+
+def encode(coordinates, precision=5):
+    """Vectorized: every value's 5-bit groups are computed at once, then masked to length."""
+    points = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    scaled = np.round(points[:, ::-1] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    groups = values[:, None] >> _SHIFTS
+    lengths = np.maximum(1, np.count_nonzero(groups, axis=1))
+    column = np.arange(len(_SHIFTS))
+    chars = (groups & 0x1F) + 63 + 0x20 * (column < (lengths - 1)[:, None])
+    return chars[column < lengths[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode(encoded, precision=5):
+    data = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if not len(data):
+        return []
+    last = data < 0x20
+    if not last[-1]:
+        raise ValueError("Truncated polyline")
+    ends = np.flatnonzero(last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Each value's groups, least significant first, shifted into place and summed
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((data & 0x1F) << (5 * position), starts)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    coordinates = np.cumsum(values.reshape(-1, 2), axis=0) / 10 ** precision
+    return coordinates[:, ::-1].tolist()
@@ -0,0 +1,139 @@
+from datetime import date, timedelta
+
+WINDOW_DAYS = 8
+CYCLE_LIMIT_MINUTES = 70 * 60
+
+
+class CycleRecap:
+    """
+    Rolling 70-hour/8-day recap.
+
+    On-duty minutes per calendar day live in a fixed ring buffer of
+    WINDOW_DAYS slots with a running total, so adding today's hours and
+    rolling the window forward are O(1) per day instead of re-summing the
+    driver's history.
+    """
+    __slots__ = ("window", "limit", "_slots", "_head", "_total")
+
+    def __init__(self, window=WINDOW_DAYS, limit=CYCLE_LIMIT_MINUTES):
+        self.window = window
+        self.limit = limit
+        self._slots = [0] * window
+        self._head = 0          # slot holding "today"
+        self._total = 0
+
+    @classmethod
+    def from_prior_total(cls, minutes, **kwargs):
+        """
+        Seed from a single "hours used in the cycle" figure. The split across
+        the previous days is unknown, so it is booked on yesterday: the most
+        conservative choice, since it's the last of those days to roll off.
+        """
+        recap = cls(**kwargs)
+        recap.add(minutes)
+        recap.advance(1)
+        return recap
+
+    @classmethod
+    def from_days(cls, minutes_per_day, **kwargs):
+        """`minutes_per_day` oldest → newest, the last entry being today."""
+        recap = cls(**kwargs)
+        for i, minutes in enumerate(minutes_per_day[-recap.window:]):
+            if i:
+                recap.advance(1)
+            recap.add(minutes)
+        return recap
+
+    @property
+    def used(self):
+        return self._total
+
+    @property
+    def available(self):
+        return max(self.limit - self._total, 0)
+
+    @property
+    def today(self):
+        return self._slots[self._head]
+
+    def add(self, minutes):
+        self._slots[self._head] += minutes
+        self._total += minutes
+
+    def advance(self, days=1):
+        """Move "today" forward, expiring days that fall out of the window."""
+        if days >= self.window:
+            self.reset()
+            return
+        for _ in range(days):
+            self._head = (self._head + 1) % self.window
+            self._total -= self._slots[self._head]
+            self._slots[self._head] = 0
+
+    def available_after(self, days):
+        """Minutes available `days` from now if nothing else is worked in between."""
+        if days >= self.window:
+            return self.limit
+        expiring = sum(self._slots[(self._head + i) % self.window] for i in range(1, days + 1))
+        return max(self.limit - (self._total - expiring), 0)
+
+    def reset(self):
+        """34-hour restart: everything before it stops counting."""
+        self._slots = [0] * self.window
+        self._total = 0
+
+    def days(self):
+        """On-duty minutes per day, oldest → newest (today last)."""
+        return [self._slots[(self._head + i) % self.window] for i in range(1, self.window + 1)]
+
+    def copy(self):
+        clone = CycleRecap(self.window, self.limit)
+        clone._slots = list(self._slots)
+        clone._head = self._head
+        clone._total = self._total
+        return clone
+
+
+def recap_on(history, as_of, trips, day):
+    """
+    The driver's CycleRecap positioned on `day`. `history` is their own
+    recorded on-duty minutes for the days ending on `as_of` (oldest first)
+    and `trips` the `cycle_days` of their planned trips. Only days up to and
+    including `day` count; a restart wipes out everything before it ends.
+    """
+    minutes = {}
+    for i, m in enumerate(history):
+        d = as_of - timedelta(days=len(history) - 1 - i)
+        minutes[d] = minutes.get(d, 0) + m
+    cleared = date.min
+    for trip in trips:
+        start = date.fromisoformat(trip["start"])
+        for i, m in enumerate(trip["minutes"]):
+            d = start + timedelta(days=i)
+            minutes[d] = minutes.get(d, 0) + m
+        for offset in trip["restarts"]:
+            end = start + timedelta(days=offset)
+            if cleared < end <= day:
+                cleared = end
+    window = [day - timedelta(days=i) for i in range(WINDOW_DAYS - 1, -1, -1)]
+    return CycleRecap.from_days([minutes.get(d, 0) if d >= cleared else 0 for d in window])
+
+
+def trip_end(trip):
+    """The last calendar day of a trip's `cycle_days` (see hos_planner)."""
+    return date.fromisoformat(trip["start"]) + timedelta(days=max(len(trip["minutes"]) - 1, 0))
+
+
+def recap_to_json(recap, today):
+    days = recap.days()
+    start = today - timedelta(days=len(days) - 1)
+    return {
+        "as_of": today.isoformat(),
+        "days": [
+            {"date": (start + timedelta(days=i)).isoformat(), "on_duty_hours": round(m / 60, 2)}
+            for i, m in enumerate(days)
+        ],
+        "used_hours": round(recap.used / 60, 2),
+        "available_hours": round(recap.available / 60, 2),
+        "available_tomorrow_hours": round(recap.available_after(1) / 60, 2),
+    }
@@ -0,0 +1,219 @@
+"""
+Load-shedding helpers for calls to external services.
+
+SingleFlight collapses identical concurrent calls into one: the first
+caller for a key does the work and everyone who arrives while it is in
+flight waits for, and shares, its result or exception. AsyncSingleFlight
+does the same for coroutines sharing an event loop; there the call runs as
+its own task, so it outlives any one caller being cancelled and is only
+cancelled once nobody is waiting for it.
+
+CircuitBreaker stops calling a service that keeps failing. After
+`failure_threshold` consecutive failures it opens and rejects calls for
+`reset_timeout` seconds. It then lets `half_open_probes` calls through:
+one success closes it again, one failure re-opens it for another period.
+A call that ends without either (cancelled, unexpected error) must
+release() its slot; a probe that hasn't reported back within
+`reset_timeout` counts as failed.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """(result, shared): `shared` is True when another caller's result was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.calls += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class FlightCancelled(Exception):
+    """A shared async call was cancelled under the callers waiting for it."""
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}        # (loop id, key) -> _AsyncCall
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """(result, shared) for `await fn(*args, **kwargs)`, as SingleFlight.do."""
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        call = self._calls.get(slot)
+        shared = call is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.calls += 1
+            call = self._calls[slot] = _AsyncCall(loop.create_task(fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda task: self._finished(slot, call))
+
+        call.waiters += 1
+        try:
+            # shield: a caller giving up must not cancel the call others are waiting for
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.task.cancelled() and not asyncio.current_task().cancelling():
+                # The call was cancelled, not this caller: an error it can handle
+                raise FlightCancelled(f"{self.name} call was cancelled") from None
+            raise
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # Nobody left to use the result
+                self._forget(slot, call)
+                call.task.cancel()
+
+    def _finished(self, slot, call):
+        self._forget(slot, call)
+        if not call.task.cancelled():
+            call.task.exception()   # retrieved: no "never retrieved" warning without waiters
+
+    def _forget(self, slot, call):
+        if self._calls.get(slot) is call:
+            del self._calls[slot]
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._probes = 0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go ahead now. Counts as a probe while half-open;
+        the caller then owes one of record_success, record_failure or release.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state, self._probes = self.HALF_OPEN, 0
+                logger.info(f"Circuit {self.name} half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    if now - self._probe_started >= self.reset_timeout:
+                        logger.warning(f"Circuit {self.name} probe never reported back")
+                        self._open()
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+                self._probe_started = now
+            return True
+
+    def release(self):
+        """An allowed call ended without a verdict: give its half-open probe slot back."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+                self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        logger.warning(f"Circuit {self.name} open for {self.reset_timeout:g}s after {self.failures} failure(s)")
+
+    def retry_after(self):
+        """Seconds until the breaker will let a probe through (0 unless open)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                since = self.opened_at
+            elif self.state == self.HALF_OPEN and self._probes >= self.half_open_probes:
+                since = self._probe_started
+            else:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - since))
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "opens": self.opens, "rejected": self.rejected}
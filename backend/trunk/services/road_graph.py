@@ -0,0 +1,261 @@
+"""
+Offline road graph: build from OSM-derived GeoJSON, load memory-mapped.
+
+The graph is a directory of .npy arrays in CSR form:
+
+    node_lon, node_lat          float64[n]
+    node_xyz                    float64[n, 3] unit vectors, for the A* bound
+    indptr, indices             forward adjacency (edges sorted by source)
+    miles, seconds, weight      per forward edge; weight is the search cost
+    rev_indptr, rev_indices     backward adjacency (edges sorted by target)
+    rev_edge                    forward edge id of each backward edge
+    snap_keys, snap_order       nodes sorted by lat/lon grid cell, for snapping
+    meta.json                   counts and the parameters used to build it
+
+np.load(mmap_mode="r") maps the arrays instead of reading them, so worker
+processes share one copy through the page cache and start instantly.
+"""
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+from .route_index import haversine_miles
+
+GRAPH_VERSION = 1
+SNAP_CELL_DEGREES = 0.05
+COORD_DECIMALS = 7
+
+# Free-flow truck speed by OSM highway class (mph)
+TRUCK_SPEEDS = {
+    "motorway": 65, "motorway_link": 40,
+    "trunk": 55, "trunk_link": 35,
+    "primary": 50, "primary_link": 30,
+    "secondary": 45, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 25, "residential": 20, "living_street": 10, "service": 10, "road": 25,
+}
+# Search-cost multiplier steering trucks off minor roads (reported times stay real)
+TRUCK_PENALTIES = {"residential": 3.0, "living_street": 5.0, "service": 4.0, "unclassified": 1.5}
+
+ARRAYS = ("node_lon", "node_lat", "node_xyz", "indptr", "indices", "miles", "seconds", "weight",
+          "rev_indptr", "rev_indices", "rev_edge", "snap_keys", "snap_order")
+
+
+def _number(value):
+    match = re.match(r"\s*([\d.]+)", str(value or ""))
+    return float(match.group(1)) if match else None
+
+
+def _speed_limit_mph(tag):
+    speed = _number(tag)
+    if speed is None:
+        return None
+    return speed if "mph" in str(tag) else speed * 0.621371
+
+
+def truck_edge_profile(props, max_speed_mph, weight_tonnes, height_m):
+    """
+    (mph, penalty, forward, backward) for a way's tags, or None if trucks
+    can't use it at all (wrong class, hgv=no, weight or height limits).
+    """
+    highway = props.get("highway")
+    if highway not in TRUCK_SPEEDS:
+        return None
+    if props.get("hgv") in ("no", "destination") or props.get("access") in ("no", "private"):
+        return None
+    max_weight = _number(props.get("maxweight"))
+    if max_weight is not None and max_weight < weight_tonnes:
+        return None
+    max_height = _number(props.get("maxheight"))
+    if max_height is not None and max_height < height_m:
+        return None
+
+    mph = TRUCK_SPEEDS[highway]
+    limit = _speed_limit_mph(props.get("maxspeed"))
+    if limit:
+        mph = min(mph, limit)
+    mph = min(mph, max_speed_mph)
+
+    oneway = str(props.get("oneway", "")).lower()
+    if oneway in ("yes", "true", "1") or (highway.startswith("motorway") and oneway != "no"):
+        forward, backward = True, False
+    elif oneway == "-1":
+        forward, backward = False, True
+    else:
+        forward, backward = True, True
+    return mph, TRUCK_PENALTIES.get(highway, 1.0), forward, backward
+
+
+def iter_features(path):
+    """GeoJSON FeatureCollection, or one feature per line (GeoJSONSeq / .geojsonl)."""
+    if path.endswith((".geojsonl", ".geojsons", ".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().lstrip("\x1e")
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f).get("features", [])
+
+
+def _lines(geometry):
+    if geometry["type"] == "LineString":
+        yield geometry["coordinates"]
+    elif geometry["type"] == "MultiLineString":
+        yield from geometry["coordinates"]
+
+
+def _csr(keys, n):
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return order, indptr
+
+
+def unit_vectors(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def snap_key(lon, lat):
+    cols = int(360 / SNAP_CELL_DEGREES) + 1
+    row = np.floor((np.asarray(lat) + 90) / SNAP_CELL_DEGREES).astype(np.int64)
+    col = np.floor((np.asarray(lon) + 180) / SNAP_CELL_DEGREES).astype(np.int64)
+    return row * cols + col
+
+
+def build_graph(source, out_dir, max_speed_mph=65, weight_tonnes=36, height_m=4.1):
+    """Build the CSR arrays from GeoJSON road lines. Returns the meta dict."""
+    node_ids = {}
+    lon, lat = [], []
+    src, dst, mph, penalty = [], [], [], []
+    ways = skipped = 0
+
+    def node(point):
+        key = (round(point[0], COORD_DECIMALS), round(point[1], COORD_DECIMALS))
+        i = node_ids.get(key)
+        if i is None:
+            i = node_ids[key] = len(lon)
+            lon.append(key[0])
+            lat.append(key[1])
+        return i
+
+    for feature in iter_features(source):
+        profile = truck_edge_profile(feature.get("properties") or {}, max_speed_mph, weight_tonnes, height_m)
+        if profile is None:
+            skipped += 1
+            continue
+        ways += 1
+        speed, cost, forward, backward = profile
+        for line in _lines(feature["geometry"]):
+            ids = [node(p) for p in line]
+            for a, b in zip(ids, ids[1:]):
+                if a == b:
+                    continue
+                if forward:
+                    src.append(a); dst.append(b); mph.append(speed); penalty.append(cost)
+                if backward:
+                    src.append(b); dst.append(a); mph.append(speed); penalty.append(cost)
+
+    n = len(lon)
+    node_lon = np.asarray(lon, dtype=np.float64)
+    node_lat = np.asarray(lat, dtype=np.float64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+
+    miles = haversine_miles(node_lon[src], node_lat[src], node_lon[dst], node_lat[dst])
+    seconds = miles / np.asarray(mph, dtype=np.float64) * 3600
+    weight = seconds * np.asarray(penalty, dtype=np.float64)
+
+    order, indptr = _csr(src, n)
+    arrays = {
+        "node_lon": node_lon,
+        "node_lat": node_lat,
+        "node_xyz": unit_vectors(node_lon, node_lat),
+        "indptr": indptr,
+        "indices": dst[order].astype(np.int32),
+        "miles": miles[order].astype(np.float32),
+        "seconds": seconds[order].astype(np.float32),
+        "weight": weight[order].astype(np.float32),
+    }
+    # Backward adjacency over the same (now sorted) forward edge ids
+    sorted_src = src[order]
+    rev_order, rev_indptr = _csr(dst[order], n)
+    arrays["rev_indptr"] = rev_indptr
+    arrays["rev_indices"] = sorted_src[rev_order].astype(np.int32)
+    arrays["rev_edge"] = rev_order.astype(np.int64)
+
+    keys = snap_key(node_lon, node_lat)
+    snap_order = np.argsort(keys, kind="stable")
+    arrays["snap_keys"] = keys[snap_order]
+    arrays["snap_order"] = snap_order.astype(np.int32)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    meta = {
+        "version": GRAPH_VERSION,
+        "nodes": n,
+        "edges": int(len(src)),
+        "ways": ways,
+        "skipped_ways": skipped,
+        "max_speed_mph": max_speed_mph,
+        "weight_tonnes": weight_tonnes,
+        "height_m": height_m,
+        "source": os.path.basename(source),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class RoadGraph:
+    __slots__ = ARRAYS + ("meta", "max_speed_mph")
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != GRAPH_VERSION:
+            raise ValueError(f"Road graph in {directory} is version {self.meta.get('version')}, "
+                             f"expected {GRAPH_VERSION}; rebuild it")
+        for name in ARRAYS:
+            # Plain ndarray view over the mapping: same pages, none of np.memmap's
+            # per-index overhead in the search loop
+            setattr(self, name, np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")))
+        self.max_speed_mph = self.meta["max_speed_mph"]
+
+    def nearest_node(self, lon, lat, max_miles):
+        """Closest node within `max_miles` (searching outward ring by ring), or None."""
+        cols = int(360 / SNAP_CELL_DEGREES) + 1
+        center = int(snap_key(lon, lat))
+        cell_miles = SNAP_CELL_DEGREES * 69.0 * max(math.cos(math.radians(lat)), 0.1)
+        rings = max(1, math.ceil(max_miles / cell_miles))
+
+        best, best_miles = None, max_miles
+        for ring in range(rings + 1):
+            candidates = []
+            for dy in range(-ring, ring + 1):
+                row = center + dy * cols
+                if abs(dy) == ring:
+                    lo = np.searchsorted(self.snap_keys, row - ring, side="left")
+                    hi = np.searchsorted(self.snap_keys, row + ring, side="right")
+                    candidates.append(self.snap_order[lo:hi])
+                else:
+                    for key in (row - ring, row + ring):
+                        lo = np.searchsorted(self.snap_keys, key, side="left")
+                        hi = np.searchsorted(self.snap_keys, key, side="right")
+                        candidates.append(self.snap_order[lo:hi])
+            candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int32)
+            if len(candidates):
+                distances = haversine_miles(lon, lat, self.node_lon[candidates], self.node_lat[candidates])
+                i = int(np.argmin(distances))
+                if distances[i] <= best_miles:
+                    best, best_miles = int(candidates[i]), float(distances[i])
+            # Anything in later rings is at least `ring` cells away
+            if best is not None and best_miles <= ring * cell_miles:
+                break
+        return best
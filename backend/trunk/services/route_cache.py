@@ -0,0 +1,53 @@
+import json
+import zlib
+
+from django.conf import settings
+
+from .cache import LRUCache
+
+# Directions responses are large GeoJSON documents; keep them zlib-compressed in memory,
+# bounded by count and by compressed size (a cross-country route is far bigger than a local one)
+_cache = LRUCache(
+    maxsize=settings.ROUTE_CACHE_MAX_ENTRIES,
+    ttl=settings.ROUTE_CACHE_TTL_SECONDS,
+    max_bytes=settings.ROUTE_CACHE_MAX_BYTES,
+)
+
+
+def make_key(coordinates, options=None):
+    """
+    Quantize [lon, lat] pairs to ROUTE_CACHE_PRECISION decimals so geocodes that
+    differ by a few metres for the same terminal land on the same lane.
+    """
+    precision = settings.ROUTE_CACHE_PRECISION
+    coords = tuple((round(lon, precision), round(lat, precision)) for lon, lat in coordinates)
+    opts = tuple(sorted((k, json.dumps(v, sort_keys=True)) for k, v in (options or {}).items()))
+    return coords, opts
+
+
+def get(coordinates, options=None):
+    blob = _cache.get(make_key(coordinates, options))
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob))
+
+
+def put(coordinates, options, route_data):
+    blob = zlib.compress(json.dumps(route_data, separators=(",", ":")).encode(), 6)
+    _cache.set(make_key(coordinates, options), blob)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    lookups = _cache.hits + _cache.misses
+    return {
+        **_cache.stats(),
+        "hit_rate": round(_cache.hits / lookups, 3) if lookups else 0.0,
+        "compressed_bytes": _cache.bytes,
+        "max_bytes": _cache.max_bytes,
+        "ttl_seconds": _cache.ttl,
+        "precision": settings.ROUTE_CACHE_PRECISION,
+    }
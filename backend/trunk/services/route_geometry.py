@@ -0,0 +1,192 @@
+"""
+Multi-resolution route geometry for map clients.
+
+When a route is saved, simplify() runs Douglas-Peucker once over the full
+geometry and records, for every vertex, the largest tolerance at which it
+survives. Each zoom level in ZOOMS is then just the vertices above that
+level's tolerance, stored as an encoded polyline on Trip.route_geometry.
+Serving a level is a dict lookup, plus a decode when the client clips to
+a bounding box.
+
+A level's tolerance is one pixel at that web-map zoom (256 px tiles, at
+the equator), so the simplified line is visually identical to the full
+one at that zoom and above it would show its corners.
+"""
+import math
+
+import numpy as np
+
+from . import polyline
+from .route_index import route_parts
+
+GEOMETRY_VERSION = 1
+ZOOMS = (4, 6, 8, 10, 12, 14)
+METERS_PER_PIXEL_Z0 = 156543.03
+EARTH_RADIUS_M = 6371008.8
+PRECISION = 5               # ~1 m; map clients decode precision 5 by default
+OVERVIEW_PIXELS = 1024      # viewport the default level has to fit the whole route into
+
+
+def zoom_tolerance(zoom):
+    """Meters per pixel at `zoom`."""
+    return METERS_PER_PIXEL_Z0 / 2 ** zoom
+
+
+def significance(coords):
+    """
+    Douglas-Peucker rank of each vertex, in meters: the vertex is kept by
+    any simplification with a smaller tolerance. Endpoints are infinite.
+    Vertices below the finest zoom level's tolerance aren't ranked (0).
+    """
+    n = len(coords)
+    ranks = np.zeros(n)
+    if n == 0:
+        return ranks
+    ranks[0] = ranks[-1] = np.inf
+    # Equirectangular projection around the route's mean latitude; plenty
+    # for comparing sub-kilometer deviations
+    lat0 = math.radians(float(coords[:, 1].mean()))
+    x = np.radians(coords[:, 0]) * math.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(coords[:, 1]) * EARTH_RADIUS_M
+    floor = zoom_tolerance(ZOOMS[-1])
+
+    # Recursion one depth at a time: every pending interval is split in a
+    # single vectorized pass, so the Python loop runs per depth, not per vertex
+    starts, ends, parents = np.array([0]), np.array([n - 1]), np.array([np.inf])
+    while len(starts):
+        open_ = ends - starts >= 2
+        starts, ends, parents = starts[open_], ends[open_], parents[open_]
+        if not len(starts):
+            break
+        lengths = ends - starts - 1
+        owner = np.repeat(np.arange(len(starts)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        inner = starts[owner] + 1 + np.arange(len(owner)) - offsets[owner]
+        a, b = starts[owner], ends[owner]
+        deviation = _segment_distances(x[inner], y[inner], x[a], y[a], x[b], y[b])
+
+        worst = np.maximum.reduceat(deviation, offsets)
+        # First vertex reaching its interval's maximum
+        hits = np.flatnonzero(deviation == worst[owner])
+        first = hits[np.unique(owner[hits], return_index=True)[1]]
+        split = worst > floor
+        k = inner[first][split]
+        # Capped by the parent's rank so every level is a subset of the next finer one
+        rank = np.minimum(worst[split], parents[split])
+        ranks[k] = rank
+        starts, ends, parents = (np.concatenate((starts[split], k)), np.concatenate((k, ends[split])),
+                                 np.concatenate((rank, rank)))
+    return ranks
+
+
+def _segment_distances(px, py, ax, ay, bx, by):
+    """Distance of each point p to the segment a-b (all arrays)."""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / np.where(length2 == 0, 1.0, length2), 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify(route_data):
+    """
+    The Trip.route_geometry document for an ORS response, or None without
+    geometry: {version, bbox, levels: [{zoom, tolerance_m, points, polyline}]},
+    coarsest level first and the full geometry last (zoom None).
+    """
+    coords, _, _, _ = route_parts(route_data)
+    if not coords or len(coords) < 2:
+        return None
+    coords = np.asarray(coords, dtype=float)[:, :2]
+    ranks = significance(coords)
+
+    levels = []
+    for zoom in ZOOMS:
+        tolerance = zoom_tolerance(zoom)
+        levels.append(_level(coords[ranks > tolerance], zoom, tolerance))
+    levels.append(_level(coords, None, 0.0))
+    return {
+        "version": GEOMETRY_VERSION,
+        "bbox": [round(float(v), 6) for v in (*coords.min(axis=0), *coords.max(axis=0))],
+        "levels": levels,
+    }
+
+
+def _level(coords, zoom, tolerance):
+    return {
+        "zoom": zoom,
+        "tolerance_m": round(tolerance, 1),
+        "points": len(coords),
+        "polyline": polyline.encode(coords, PRECISION),
+    }
+
+
+def overview_zoom(bbox, pixels=OVERVIEW_PIXELS):
+    """Largest zoom at which `bbox` fits in `pixels` (both ways, Web Mercator)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    width = max(max_lon - min_lon, 1e-9) / 360
+    height = max(abs(_mercator_y(max_lat) - _mercator_y(min_lat)), 1e-9)
+    return max(0, math.floor(math.log2(pixels / 256 / max(width, height))))
+
+
+def _mercator_y(lat):
+    lat = max(min(lat, 85.0511), -85.0511)
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) / (2 * math.pi)
+
+
+def select_level(geometry, zoom=None, tolerance=None):
+    """
+    The stored level to serve: the coarsest one that is still exact to one
+    pixel at `zoom`, or whose tolerance doesn't exceed `tolerance` meters.
+    Without either, the level for the zoom that fits the whole route.
+    """
+    levels = geometry["levels"]
+    # Levels go from coarsest to the full geometry, which always qualifies
+    if tolerance is not None:
+        return next(level for level in levels if level["tolerance_m"] <= tolerance)
+    if zoom is None:
+        zoom = overview_zoom(geometry["bbox"])
+    return next(level for level in levels if level["zoom"] is None or level["zoom"] >= zoom)
+
+
+def clip(coords, bbox):
+    """
+    The parts of a line that cross `bbox` (min_lon, min_lat, max_lon,
+    max_lat). Every segment touching the box is kept whole, so parts end
+    just outside it and the line doesn't stop short at the map's edge.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return []
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lon, lat = coords[:, 0], coords[:, 1]
+    a_lon, b_lon, a_lat, b_lat = lon[:-1], lon[1:], lat[:-1], lat[1:]
+    keep = ~(
+        ((a_lon < min_lon) & (b_lon < min_lon)) | ((a_lon > max_lon) & (b_lon > max_lon))
+        | ((a_lat < min_lat) & (b_lat < min_lat)) | ((a_lat > max_lat) & (b_lat > max_lat))
+    )
+    # Runs of kept segments [start, end) become parts with vertices start..end
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return [coords[start:end + 1].tolist() for start, end in zip(starts, ends)]
+
+
+def parse_bbox(value):
+    """`min_lon,min_lat,max_lon,max_lat` -> tuple of floats; ValueError if malformed."""
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(v) for v in parts):
+        raise ValueError("bbox takes four numbers")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimums exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def geometry_for_trip(trip):
+    """The trip's stored geometry levels, computed (and stored) for trips saved before they existed."""
+    geometry = trip.route_geometry
+    if geometry is None or geometry.get("version") != GEOMETRY_VERSION:
+        geometry = simplify(trip.route_raw)
+        if geometry is not None:
+            type(trip).objects.filter(pk=trip.pk).update(route_geometry=geometry)
+            trip.route_geometry = geometry
+    return geometry
@@ -0,0 +1,155 @@
+"""
+Position-along-route lookups over an ORS directions response.
+
+RouteIndex precomputes cumulative miles and seconds for every vertex of the
+route geometry once, so "where is the truck at mile X / hour Y" is a binary
+search plus one interpolation instead of a walk over thousands of points.
+"""
+import numpy as np
+
+from .cache import LRUCache
+from . import polyline
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Indexes for stored trips, keyed by trip id and when its route was calculated, so a
+# re-planned trip (queue retry, re-route) never gets its old route's index
+_trip_indexes = LRUCache(maxsize=256)
+
+
+def route_parts(route_data):
+    """
+    (coordinates [lon, lat], summary, segments, way_points) for either ORS
+    response shape: GeoJSON features or the JSON "routes" format, whose
+    geometry is an encoded polyline unless geometry_format was set.
+    """
+    if not route_data:
+        return None, None, [], []
+    if 'features' in route_data:
+        feature = route_data['features'][0]
+        props = feature.get('properties', {})
+        coords = feature.get('geometry', {}).get('coordinates') or []
+    elif 'routes' in route_data:
+        props = route_data['routes'][0]
+        coords = props.get('geometry') or []
+        if isinstance(coords, str):
+            coords = polyline.decode(coords)
+        elif isinstance(coords, dict):
+            coords = coords.get('coordinates') or []
+    else:
+        return None, None, [], []
+    return coords, props.get('summary'), props.get('segments') or [], props.get('way_points') or []
+
+
+def haversine_miles(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RouteIndex:
+    """
+    `miles[i]` / `seconds[i]` are the cumulative distance and driving time at
+    vertex i. Both are monotonic, so lookups are np.searchsorted.
+    """
+    __slots__ = ("lon", "lat", "miles", "seconds", "way_points")
+
+    def __init__(self, coordinates, miles, seconds, way_points=()):
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.lon = coords[:, 0]
+        self.lat = coords[:, 1]
+        self.miles = np.asarray(miles, dtype=float)
+        self.seconds = np.asarray(seconds, dtype=float)
+        self.way_points = list(way_points)
+
+    @classmethod
+    def from_route(cls, route_data):
+        """
+        Build from an ORS response. Vertex distances are haversine, scaled per
+        leg so they add up to ORS's own leg distances; time within a leg is
+        spread in proportion to distance, which is all ORS gives us without
+        turn-by-turn steps.
+        """
+        coords, summary, segments, way_points = route_parts(route_data)
+        if not coords or len(coords) < 2:
+            return None
+        coords = np.asarray(coords, dtype=float)[:, :2]
+        n = len(coords)
+
+        step = np.zeros(n)
+        step[1:] = haversine_miles(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+        if len(segments) != len(way_points) - 1 or not segments:
+            # No per-leg data: one leg covering the whole route
+            way_points = [0, n - 1]
+            segments = [{
+                "distance": (summary or {}).get("distance", step.sum()),
+                "duration": (summary or {}).get("duration", 0),
+            }]
+
+        step_seconds = np.zeros(n)
+        for leg, (start, end) in zip(segments, zip(way_points, way_points[1:])):
+            part = step[start + 1:end + 1]
+            length = part.sum()
+            if length > 0:
+                share = part / length
+                step[start + 1:end + 1] = share * leg.get("distance", length)
+                step_seconds[start + 1:end + 1] = share * leg.get("duration", 0)
+
+        return cls(coords, np.cumsum(step), np.cumsum(step_seconds), way_points)
+
+    @property
+    def total_miles(self):
+        return float(self.miles[-1])
+
+    @property
+    def total_seconds(self):
+        return float(self.seconds[-1])
+
+    def _locate(self, axis, values):
+        values = np.clip(np.asarray(values, dtype=float), axis[0], axis[-1])
+        right = np.clip(np.searchsorted(axis, values, side="left"), 1, len(axis) - 1)
+        left = right - 1
+        span = axis[right] - axis[left]
+        frac = np.divide(values - axis[left], span, out=np.zeros_like(values), where=span > 0)
+        return left, right, frac
+
+    def _interpolate(self, left, right, frac, array):
+        return array[left] + (array[right] - array[left]) * frac
+
+    def position_at_mile(self, miles):
+        """[lon, lat] at `miles` along the route (scalar or array of miles)."""
+        left, right, frac = self._locate(self.miles, miles)
+        return np.stack([self._interpolate(left, right, frac, self.lon),
+                         self._interpolate(left, right, frac, self.lat)], axis=-1)
+
+    def position_at_seconds(self, seconds):
+        left, right, frac = self._locate(self.seconds, seconds)
+        return np.stack([self._interpolate(left, right, frac, self.lon),
+                         self._interpolate(left, right, frac, self.lat)], axis=-1)
+
+    def mile_at_seconds(self, seconds):
+        left, right, frac = self._locate(self.seconds, seconds)
+        return self._interpolate(left, right, frac, self.miles)
+
+    def seconds_at_mile(self, miles):
+        left, right, frac = self._locate(self.miles, miles)
+        return self._interpolate(left, right, frac, self.seconds)
+
+    def legs(self):
+        """(miles, seconds) per leg between consecutive way points."""
+        return [
+            (float(self.miles[end] - self.miles[start]), float(self.seconds[end] - self.seconds[start]))
+            for start, end in zip(self.way_points, self.way_points[1:])
+        ]
+
+
+def index_for_trip(trip):
+    """RouteIndex for a stored trip, built once per process for each version of its route."""
+    key = (str(trip.id), trip.route_computed_at)
+    index = _trip_indexes.get(key)
+    if index is None:
+        index = RouteIndex.from_route(trip.route_raw)
+        if index is not None:
+            _trip_indexes.set(key, index)
+    return index
@@ -1,67 +1,392 @@
 import requests
+import httpx
+from asgiref.sync import sync_to_async
 from django.conf import settings
+import asyncio
+import contextvars
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import geocode_cache, route_cache, offline_router, gazetteer
+from .ors_client import get_client, get_async_client, ORSUnavailable, RETRY_STATUSES
+from .resilience import SingleFlight, AsyncSingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Shared, bounded pool so a burst of trips can't spawn unbounded threads
+_geocode_pool = ThreadPoolExecutor(
+    max_workers=settings.GEOCODE_MAX_WORKERS, thread_name_prefix="geocode"
+)
+
+# Directions calls of every batch share one pool: concurrent batches queue behind
+# BATCH_ROUTE_CONCURRENCY requests instead of each starting threads of their own
+_route_pool = ThreadPoolExecutor(
+    max_workers=settings.BATCH_ROUTE_CONCURRENCY, thread_name_prefix="route"
+)
+
+# Identical lookups already in flight in this process are joined, not repeated
+geocode_flights = SingleFlight("geocode")
+route_flights = SingleFlight("route")
+ageocode_flights = AsyncSingleFlight("geocode_async")
+aroute_flights = AsyncSingleFlight("route_async")
+
+ROUTE_OPTIONS = {
+    "instructions": False,
+    "preference": "recommended",
+    "units": "mi",
+    "geometry": True
+}
+
+
+class GeocodingError(Exception):
+    def __init__(self, location, message=None):
+        self.location = location
+        super().__init__(message or f"Could not find location: {location}")
+
+
+class GeocodingTimeout(GeocodingError):
+    pass
+
+
+class GeocodingUnavailable(GeocodingError):
+    """ORS couldn't answer (rate limited, failing or unreachable): worth retrying, unlike an unknown place."""
+
+    def __init__(self, location, message=None, retry_after=None):
+        self.retry_after = retry_after
+        super().__init__(location, message)
+
+
+class RoutingTimeout(Exception):
+    """A lane get_truck_routes() didn't get a route for before its deadline."""
+
 def geocode_location(location_str):
-    url = "https://api.openrouteservice.org/geocode/search"
-    params = {
-        "api_key": settings.OPENROUTESERVICE_API_KEY,
-        "text": location_str,
-        "size": 1
+    coords = geocode_cache.lookup(location_str) or _geocode_local(location_str)
+    if coords:
+        return coords
+
+    coords = _geocode_remote(location_str)
+    if coords:
+        geocode_cache.store(location_str, coords)
+    return coords
+
+def geocode_locations(locations, deadline_seconds=None, fail_fast=True):
+    """
+    Geocode several locations concurrently under one shared deadline.
+    Returns coords in input order; raises GeocodingError on the first
+    location that fails and GeocodingTimeout once the deadline passes.
+    With fail_fast=False, each unresolved location is returned as the
+    error instead: GeocodingError if it wasn't found, GeocodingTimeout if
+    it was still being looked up at the deadline, GeocodingUnavailable if
+    ORS kept failing.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = settings.GEOCODE_STAGE_DEADLINE_SECONDS
+    deadline = time.monotonic() + deadline_seconds
+
+    results = [None] * len(locations)
+    pending = {}  # normalized key -> (original string, [indexes])
+    for i, loc in enumerate(locations):
+        coords = geocode_cache.lookup(loc) or _geocode_local(loc)
+        if coords:
+            results[i] = coords
+            continue
+        key = geocode_cache.normalize_location(loc)
+        pending.setdefault(key, (loc, []))[1].append(i)
+
+    # copy_context: ORS timings in the pool threads still reach this request's Server-Timing
+    futures = {
+        _geocode_pool.submit(contextvars.copy_context().run, _geocode_remote, loc, deadline): (loc, indexes)
+        for loc, indexes in pending.values()
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        while futures:
+            remaining = deadline - time.monotonic()
+            done, _ = wait(futures, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                if not fail_fast:
+                    for loc, indexes in futures.values():
+                        for i in indexes:
+                            results[i] = GeocodingTimeout(loc, f"Geocoding timed out after {deadline_seconds}s")
+                    break
+                loc = next(iter(futures.values()))[0]
+                raise GeocodingTimeout(loc, f"Geocoding timed out after {deadline_seconds}s")
+            for future in done:
+                loc, indexes = futures.pop(future)
+                try:
+                    coords = future.result()
+                    if not coords:
+                        raise GeocodingError(loc)
+                except GeocodingError as e:
+                    if fail_fast:
+                        raise
+                    for i in indexes:
+                        results[i] = e
+                    continue
+                geocode_cache.store(loc, coords)
+                for i in indexes:
+                    results[i] = coords
+    finally:
+        # Fail fast: don't start lookups nobody is waiting for anymore
+        for future in futures:
+            future.cancel()
+
+    return results
+
+async def ageocode_locations(locations, deadline_seconds=None):
+    """
+    geocode_locations() for async callers (fail-fast mode): the ORS lookups
+    run concurrently on the event loop instead of in the geocode thread pool.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = settings.GEOCODE_STAGE_DEADLINE_SECONDS
+    deadline = time.monotonic() + deadline_seconds
+
+    results = [None] * len(locations)
+    pending = {}  # normalized key -> (original string, [indexes])
+    for i, loc in enumerate(locations):
+        coords = await geocode_cache.alookup(loc) or _geocode_local(loc)
+        if coords:
+            results[i] = coords
+            continue
+        key = geocode_cache.normalize_location(loc)
+        pending.setdefault(key, (loc, []))[1].append(i)
+
+    lookups = [(loc, indexes, asyncio.ensure_future(_ageocode_remote(loc, deadline))) for loc, indexes in pending.values()]
+    loc = None
+    try:
+        async with asyncio.timeout(deadline_seconds):
+            for loc, indexes, task in lookups:
+                coords = await task
+                if not coords:
+                    raise GeocodingError(loc)
+                await geocode_cache.astore(loc, coords)
+                for i in indexes:
+                    results[i] = coords
+    except TimeoutError:
+        raise GeocodingTimeout(loc, f"Geocoding timed out after {deadline_seconds}s")
+    finally:
+        for _, _, task in lookups:
+            task.cancel()
+
+    return results
+
+def _geocode_local(location_str):
+    """Gazetteer hit, or None (backend off, index missing, or no match) to fall back to ORS."""
+    if settings.GEOCODER_BACKEND != "local":
+        return None
+    try:
+        return gazetteer.get_gazetteer(settings.GAZETTEER_DIR).lookup(location_str)
+    except (OSError, ValueError) as e:
+        logger.error(f"Local geocoder unavailable: {e}")
+        return None
+
+def _geocode_remote(location_str, deadline=None):
+    """
+    ORS lookup, shared with any identical lookup already in flight (whose
+    `deadline`, a time.monotonic() value, then applies). Raises ORSUnavailable.
+    """
+    coords, _ = geocode_flights.do(geocode_cache.normalize_location(location_str), _fetch_geocode, location_str, deadline)
+    return list(coords) if coords else coords
+
+def _fetch_geocode(location_str, deadline=None):
+    """
+    First match's coords, or None if ORS doesn't know the place. Raises
+    GeocodingTimeout / GeocodingUnavailable when ORS didn't answer in time
+    or kept failing, so a transient outage isn't reported as "not found".
+    """
+    try:
+        resp = get_client().get("geocode", "/geocode/search", params=_geocode_params(location_str), deadline=deadline)
+    except requests.exceptions.Timeout:
+        raise GeocodingTimeout(location_str, f"Geocoding timed out: {location_str}")
+    except requests.exceptions.ConnectionError as e:
+        raise GeocodingUnavailable(location_str, f"OpenRouteService geocode unreachable: {e}")
+    _raise_if_transient(location_str, resp)
+    try:
         resp.raise_for_status()
-        data = resp.json()
-        if data.get('features'):
-            coords = data['features'][0]['geometry']['coordinates']
-            return [coords[0], coords[1]]
+        return _first_feature(resp.json())
+    except Exception as e:
+        logger.error(f"Geocode failed: {e}")
         return None
+
+async def _ageocode_remote(location_str, deadline=None):
+    coords, _ = await ageocode_flights.do(geocode_cache.normalize_location(location_str), _afetch_geocode, location_str,
+                                          deadline)
+    return list(coords) if coords else coords
+
+async def _afetch_geocode(location_str, deadline=None):
+    try:
+        resp = await get_async_client().get("geocode", "/geocode/search", params=_geocode_params(location_str),
+                                            deadline=deadline)
+    except httpx.TimeoutException:
+        raise GeocodingTimeout(location_str, f"Geocoding timed out: {location_str}")
+    except httpx.TransportError as e:
+        raise GeocodingUnavailable(location_str, f"OpenRouteService geocode unreachable: {e}")
+    _raise_if_transient(location_str, resp)
+    try:
+        resp.raise_for_status()
+        return _first_feature(resp.json())
     except Exception as e:
         logger.error(f"Geocode failed: {e}")
         return None
 
-def get_truck_route(coordinates):
-    url = "https://api.openrouteservice.org/v2/directions/driving-car"
+def _raise_if_transient(location_str, resp):
+    """GeocodingUnavailable for a 429/5xx that was still failing after the client's retries."""
+    if resp.status_code in RETRY_STATUSES:
+        raise GeocodingUnavailable(location_str, f"OpenRouteService geocode answered HTTP {resp.status_code}",
+                                   retry_after=get_client()._retry_after(resp))
+
+def _geocode_params(location_str):
+    return {
+        "api_key": settings.OPENROUTESERVICE_API_KEY,
+        "text": location_str,
+        "size": 1
+    }
+
+def _first_feature(data):
+    if data.get('features'):
+        coords = data['features'][0]['geometry']['coordinates']
+        return [coords[0], coords[1]]
+    return None
+
+def get_truck_route(coordinates, deadline=None):
+    """
+    ORS directions for [[lon, lat], ...], or None if routing failed. Raises
+    ORSUnavailable while the directions circuit breaker is open. ORS retries
+    stop at `deadline` (a time.monotonic() value).
+    """
+    if settings.ROUTING_BACKEND == "offline":
+        return _get_offline_route(coordinates)
+
+    cached = route_cache.get(coordinates, ROUTE_OPTIONS)
+    if cached is not None:
+        return cached
 
+    data, shared = route_flights.do(route_cache.make_key(coordinates, ROUTE_OPTIONS), _fetch_route, coordinates,
+                                    deadline)
+    # Callers may modify their route; joiners get their own copy from the cache
+    return (route_cache.get(coordinates, ROUTE_OPTIONS) or data) if shared else data
+
+async def aget_truck_route(coordinates, deadline=None):
+    """get_truck_route() for async callers; the offline A* search runs in a worker thread."""
+    if settings.ROUTING_BACKEND == "offline":
+        return await sync_to_async(_get_offline_route, thread_sensitive=False)(coordinates)
+
+    cached = route_cache.get(coordinates, ROUTE_OPTIONS)
+    if cached is not None:
+        return cached
+
+    data, shared = await aroute_flights.do(route_cache.make_key(coordinates, ROUTE_OPTIONS), _afetch_route, coordinates,
+                                           deadline)
+    return (route_cache.get(coordinates, ROUTE_OPTIONS) or data) if shared else data
+
+def _route_request(coordinates):
     headers = {
         'Authorization': settings.OPENROUTESERVICE_API_KEY,
         'Content-Type': 'application/json'
     }
+    return {"coordinates": coordinates, **ROUTE_OPTIONS}, headers
 
-    payload = {
-        "coordinates": coordinates,
-        "instructions": False,
-        "preference": "recommended",
-        "units": "mi",
-        "geometry": True
-    }
-
+def _fetch_route(coordinates, deadline=None):
+    payload, headers = _route_request(coordinates)
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = get_client().post("directions", "/v2/directions/driving-car", json=payload, headers=headers,
+                                     deadline=deadline)
         response.raise_for_status()
-        data = response.json()
-
-        # ✅ SAFE LOGGING (NO CRASHES EVER)
-        if 'routes' in data:
-            logger.info(
-                f"Route success: {data['routes'][0]['summary']['distance']} miles"
-            )
-        elif 'features' in data:
-            logger.info(
-                f"Route success: {data['features'][0]['properties']['summary']['distance']} miles"
-            )
-        else:
-            logger.warning(f"Unknown ORS response format: {data}")
-
-        return data
+        return _accept_route(coordinates, response.json())
 
     except requests.exceptions.HTTPError as e:
         logger.error(f"ORS HTTP Error: {e.response.status_code} - {e.response.text}")
         return None
 
+    except ORSUnavailable:
+        raise
+
     except Exception as e:
         logger.exception("Route failed with full traceback")
         return None
+
+async def _afetch_route(coordinates, deadline=None):
+    payload, headers = _route_request(coordinates)
+    try:
+        response = await get_async_client().post("directions", "/v2/directions/driving-car", json=payload, headers=headers,
+                                                 deadline=deadline)
+        response.raise_for_status()
+        return _accept_route(coordinates, response.json())
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"ORS HTTP Error: {e.response.status_code} - {e.response.text}")
+        return None
+
+    except ORSUnavailable:
+        raise
+
+    except Exception as e:
+        logger.exception("Route failed with full traceback")
+        return None
+
+def _accept_route(coordinates, data):
+    # ✅ SAFE LOGGING (NO CRASHES EVER)
+    if 'routes' in data:
+        logger.info(
+            f"Route success: {data['routes'][0]['summary']['distance']} miles"
+        )
+    elif 'features' in data:
+        logger.info(
+            f"Route success: {data['features'][0]['properties']['summary']['distance']} miles"
+        )
+    else:
+        logger.warning(f"Unknown ORS response format: {data}")
+
+    if 'routes' in data or 'features' in data:
+        route_cache.put(coordinates, ROUTE_OPTIONS, data)
+    return data
+
+def _get_offline_route(coordinates):
+    options = {"backend": "offline"}
+    cached = route_cache.get(coordinates, options)
+    if cached is not None:
+        return cached
+    data, shared = route_flights.do(route_cache.make_key(coordinates, options), _fetch_offline_route, coordinates)
+    return (route_cache.get(coordinates, options) or data) if shared else data
+
+def _fetch_offline_route(coordinates):
+    options = {"backend": "offline"}
+    try:
+        data = offline_router.get_route(coordinates)
+    except (offline_router.OfflineRoutingError, OSError, ValueError) as e:
+        # OSError/ValueError: ROAD_GRAPH_DIR missing or built by another version
+        logger.error(f"Offline route failed: {e}")
+        return None
+    logger.info(f"Route success (offline): {data['features'][0]['properties']['summary']['distance']} miles")
+    route_cache.put(coordinates, options, data)
+    return data
+
+def get_truck_routes(coordinate_lists, deadline_seconds=None):
+    """
+    Route many lanes on the shared route pool. Lanes that quantize to the
+    same route_cache key are requested once. Returns results in input order;
+    a lane still unrouted after `deadline_seconds` comes back as RoutingTimeout.
+    """
+    deadline = time.monotonic() + deadline_seconds if deadline_seconds is not None else None
+    unique = {}
+    for coords in coordinate_lists:
+        unique.setdefault(route_cache.make_key(coords), coords)
+
+    futures = {
+        key: _route_pool.submit(contextvars.copy_context().run, get_truck_route, coords, deadline)
+        for key, coords in unique.items()
+    }
+    try:
+        wait(futures.values(), timeout=deadline_seconds)
+        routes = {
+            key: future.result() if future.done()
+            else RoutingTimeout(f"Routing timed out after {deadline_seconds}s")
+            for key, future in futures.items()
+        }
+    finally:
+        # In-flight calls stop retrying at the deadline; queued lanes never start
+        for future in futures.values():
+            future.cancel()
+
+    return [routes[route_cache.make_key(coords)] for coords in coordinate_lists]
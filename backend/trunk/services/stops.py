@@ -0,0 +1,182 @@
+"""
+Stop placement along the route.
+
+Fuel stops are fixed by distance (every FUEL_INTERVAL_MILES) and handed to
+the HOS engine as driving-minute offsets; once the timeline is built, every
+stop in it (pickup, fuel, 30-min break, 10-hour rest, 34-hour restart,
+dropoff) is anchored on the route geometry through the RouteIndex, so the
+whole pass costs O(stops · log n) in the number of route vertices.
+
+If TRUCK_STOPS_FILE points at a CSV (name,lon,lat) or GeoJSON point file,
+fuel and rest stops are also snapped to the nearest truck stop within
+TRUCK_STOP_SNAP_MILES, looked up through a uniform lat/lon grid.
+"""
+import csv
+import json
+import logging
+import math
+import threading
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .hos_engine import OFF_DUTY, ON_DUTY, DRIVING
+from .route_index import haversine_miles
+
+logger = logging.getLogger(__name__)
+
+SNAPPED_KINDS = ("fuel", "rest", "restart")
+
+_NOTE_KINDS = {
+    "Pickup": "pickup",
+    "Dropoff": "dropoff",
+    "Fuel stop": "fuel",
+    "30-min break": "break",
+    "34-hour restart": "restart",
+}
+
+
+def fuel_stop_offsets(index, interval_miles=None):
+    """Driving-minute offsets of a fuel stop every `interval_miles` along the route."""
+    interval = interval_miles or settings.FUEL_INTERVAL_MILES
+    miles = np.arange(interval, index.total_miles, interval)
+    return [int(m) for m in index.seconds_at_mile(miles) // 60] if len(miles) else []
+
+
+def place_stops(timeline, index, start_date):
+    """
+    [{kind, mile, lon, lat, eta, minutes[, truck_stop]}] for every stop in a
+    hos_engine.Timeline. ETAs are local wall-clock times from midnight of
+    `start_date` (minute 0 of the timeline).
+    """
+    stops = []
+    driven = 0
+    for event in timeline.events:
+        if event.status == DRIVING:
+            driven += event.minutes
+            continue
+        if event.status == ON_DUTY or event.note:
+            kind = _NOTE_KINDS.get(event.note, "on_duty")
+        elif event.status == OFF_DUTY:
+            kind = "rest"
+        else:
+            continue
+        stops.append((kind, event.start, event.minutes, driven))
+    if not stops:
+        return []
+
+    # One vectorized lookup for all stops. Engine minutes come from the
+    # rounded trip duration, so scale onto the index's own time axis.
+    scale = index.total_seconds / (timeline.total_driving * 60) if timeline.total_driving else 0
+    seconds = np.array([s[3] * 60 * scale for s in stops])
+    miles = index.mile_at_seconds(seconds)
+    points = index.position_at_mile(miles)
+
+    origin = datetime.combine(start_date, time())
+    truck_stops = get_truck_stops()
+    placed = []
+    for (kind, start, minutes, _), mile, (lon, lat) in zip(stops, miles, points):
+        stop = {
+            "kind": kind,
+            "mile": round(float(mile), 1),
+            "lon": round(float(lon), 6),
+            "lat": round(float(lat), 6),
+            "eta": (origin + timedelta(minutes=start)).strftime("%Y-%m-%dT%H:%M"),
+            "minutes": minutes,
+        }
+        if truck_stops is not None and kind in SNAPPED_KINDS:
+            nearest = truck_stops.nearest(lon, lat, settings.TRUCK_STOP_SNAP_MILES)
+            if nearest is not None:
+                stop["truck_stop"] = nearest
+        placed.append(stop)
+    return placed
+
+
+class TruckStopIndex:
+    """
+    Uniform grid over lat/lon: each cell holds the indexes of the POIs inside
+    it, and nearest() only looks at the cells a search radius can reach.
+    """
+
+    def __init__(self, names, lon, lat, cell_degrees=0.5):
+        self.names = list(names)
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.cell = cell_degrees
+        self.grid = {}
+        for i, key in enumerate(zip(self._cell(self.lon), self._cell(self.lat))):
+            self.grid.setdefault((int(key[0]), int(key[1])), []).append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cell(self, value):
+        return np.floor(np.asarray(value) / self.cell)
+
+    def nearest(self, lon, lat, max_miles):
+        # ~69 miles per degree of latitude; longitude degrees shrink with cos(lat)
+        lat_cells = math.ceil(max_miles / 69.0 / self.cell)
+        lon_cells = math.ceil(max_miles / (69.0 * max(math.cos(math.radians(lat)), 0.01)) / self.cell)
+        cx, cy = int(self._cell(lon)), int(self._cell(lat))
+
+        candidates = [
+            i
+            for x in range(cx - lon_cells, cx + lon_cells + 1)
+            for y in range(cy - lat_cells, cy + lat_cells + 1)
+            for i in self.grid.get((x, y), ())
+        ]
+        if not candidates:
+            return None
+        candidates = np.asarray(candidates)
+        distances = haversine_miles(lon, lat, self.lon[candidates], self.lat[candidates])
+        best = int(np.argmin(distances))
+        if distances[best] > max_miles:
+            return None
+        i = candidates[best]
+        return {
+            "name": self.names[i],
+            "lon": float(self.lon[i]),
+            "lat": float(self.lat[i]),
+            "distance_miles": round(float(distances[best]), 2),
+        }
+
+    @classmethod
+    def from_file(cls, path, cell_degrees=0.5):
+        names, lon, lat = [], [], []
+        if path.lower().endswith((".json", ".geojson")):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for feature in data.get("features", []):
+                x, y = feature["geometry"]["coordinates"][:2]
+                names.append(feature.get("properties", {}).get("name", ""))
+                lon.append(x)
+                lat.append(y)
+        else:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    names.append(row.get("name", ""))
+                    lon.append(float(row["lon"]))
+                    lat.append(float(row["lat"]))
+        return cls(names, lon, lat, cell_degrees)
+
+
+_truck_stops = None
+_truck_stops_lock = threading.Lock()
+
+
+def get_truck_stops():
+    """The TRUCK_STOPS_FILE index, loaded once per process; None when not configured."""
+    global _truck_stops
+    path = settings.TRUCK_STOPS_FILE
+    if not path:
+        return None
+    with _truck_stops_lock:
+        if _truck_stops is None:
+            try:
+                _truck_stops = TruckStopIndex.from_file(path, settings.TRUCK_STOP_GRID_DEGREES)
+                logger.info(f"Loaded {len(_truck_stops)} truck stops from {path}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Could not load truck stops from {path}: {e}")
+                _truck_stops = TruckStopIndex([], [], [])
+    return _truck_stops if len(_truck_stops) else None
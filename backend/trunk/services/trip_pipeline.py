@@ -0,0 +1,243 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import DriverRecap
+from . import metrics, route_geometry
+from .routing import (
+    geocode_locations, get_truck_route, ageocode_locations, aget_truck_route, GeocodingError, GeocodingTimeout,
+    GeocodingUnavailable,
+)
+from .ors_client import ORSUnavailable
+from .resilience import FlightCancelled
+from .hos_planner import plan_hos_compliant_trip
+from .recap import WINDOW_DAYS, recap_on, trip_end
+from .route_index import RouteIndex, route_parts, index_for_trip
+
+logger = logging.getLogger(__name__)
+
+
+class PlanningError(Exception):
+    """
+    A planning stage failed. `transient` errors are worth retrying later,
+    after `retry_after` seconds when we know how long.
+    """
+
+    def __init__(self, message, status_code=500, transient=False, retry_after=None):
+        self.status_code = status_code
+        self.transient = transient
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+def trip_locations(trip):
+    return [trip.current_location, trip.pickup_location, trip.dropoff_location]
+
+
+def calculate_route(locations):
+    """
+    Geocode + route the three trip locations.
+    Returns the fields TripViewSet.create stores on the trip.
+    """
+    with _routing_errors():
+        with metrics.timer("geocode"):
+            coords = geocode_locations(locations)
+        with metrics.timer("route"):
+            route_data = get_truck_route(coords, deadline=_route_deadline())
+    return route_fields(locations, route_data)
+
+
+async def acalculate_route(locations):
+    """calculate_route() on the event loop (async HTTP, concurrent geocodes)."""
+    with _routing_errors():
+        with metrics.timer("geocode"):
+            coords = await ageocode_locations(locations)
+        with metrics.timer("route"):
+            route_data = await aget_truck_route(coords, deadline=_route_deadline())
+    return route_fields(locations, route_data)
+
+
+def _route_deadline():
+    return time.monotonic() + settings.ROUTE_STAGE_DEADLINE_SECONDS
+
+
+@contextmanager
+def _routing_errors():
+    try:
+        yield
+    except GeocodingTimeout as e:
+        raise PlanningError(str(e), status_code=504, transient=True)
+    except GeocodingUnavailable as e:
+        raise PlanningError(str(e), status_code=503, transient=True, retry_after=e.retry_after)
+    except GeocodingError as e:
+        raise PlanningError(str(e), status_code=400)
+    except ORSUnavailable as e:
+        raise PlanningError(str(e), status_code=503, transient=True, retry_after=e.retry_after)
+    except FlightCancelled as e:
+        raise PlanningError(str(e), status_code=503, transient=True)
+
+
+def route_fields(locations, route_data):
+    """Turn an ORS directions response into the route fields stored on Trip."""
+    if not route_data or ('routes' not in route_data and 'features' not in route_data):
+        logger.error(f"Route failed: {route_data}")
+        raise PlanningError("Route calculation failed", transient=True)
+
+    _, summary, segments, _ = route_parts(route_data)
+
+    total_miles = Decimal(summary['distance'])
+    total_hours = Decimal(summary['duration']) / 3600
+
+    # Convert Decimal → float before JSON
+    total_miles_float = float(total_miles)
+    total_hours_float = round(float(total_hours), 2)
+
+    route_summary_clean = {
+        "total_distance_miles": total_miles_float,
+        "total_driving_hours": total_hours_float,
+        "segments": [
+            {
+                "from": origin,
+                "to": destination,
+                "miles": round(miles, 1),
+                "hours": round(seconds / 3600, 2),
+            }
+            for (origin, destination), (miles, seconds)
+            in zip(zip(locations, locations[1:]), _leg_totals(route_data, segments, len(locations) - 1))
+        ]
+    }
+
+    with metrics.timer("simplify"):
+        geometry = route_geometry.simplify(route_data)
+
+    return {
+        "total_distance_miles": total_miles,
+        "total_driving_hours": total_hours,
+        "route_raw": route_data,
+        "route_summary": route_summary_clean,
+        "route_geometry": geometry,
+        "route_computed_at": timezone.now(),
+    }
+
+
+def _leg_totals(route_data, segments, legs):
+    """(miles, seconds) per leg: ORS segments when present, else measured on the geometry."""
+    if len(segments) == legs:
+        return [(s.get('distance', 0), s.get('duration', 0)) for s in segments]
+    index = RouteIndex.from_route(route_data)
+    if index is not None and len(index.way_points) == legs + 1:
+        return index.legs()
+    # Nothing to split on (e.g. pickup == current location collapsed a way point)
+    logger.warning(f"Route has {len(segments)} segments for {legs} legs, reporting it as one leg")
+    _, summary, _, _ = route_parts(route_data)
+    return [(summary['distance'], summary['duration'])] + [(0, 0)] * (legs - 1)
+
+
+def calculate_hos(trip):
+    return plan_hos(trip, driver_recap(trip.driver_id, exclude_trip=trip.id))
+
+
+async def acalculate_hos(trip):
+    return plan_hos(trip, await adriver_recap(trip.driver_id, exclude_trip=trip.id))
+
+
+def plan_hos(trip, recap, start_date=None):
+    total_driving_seconds = int(round(trip.total_driving_hours * 3600))
+    with metrics.timer("hos"):
+        return plan_hos_compliant_trip(
+            total_driving_seconds=total_driving_seconds,
+            cycle_used_hours=Decimal(str(trip.cycle_used_hours)),
+            start_date=start_date,
+            recap=recap,
+            route_index=index_for_trip(trip),
+        )
+
+
+def driver_recap(driver_id, today=None, exclude_trip=None):
+    """
+    The driver's recap as of today, or None if we have no history for them
+    (the planner then falls back to cycle_used_hours). `exclude_trip` leaves
+    out a trip's own hours when it is being planned again.
+    """
+    if not driver_id:
+        return None
+    return _stored_recap(DriverRecap.objects.filter(driver_id=driver_id).first(), today, exclude_trip)
+
+
+async def adriver_recap(driver_id, today=None, exclude_trip=None):
+    if not driver_id:
+        return None
+    return _stored_recap(await DriverRecap.objects.filter(driver_id=driver_id).afirst(), today, exclude_trip)
+
+
+def _stored_recap(stored, today, exclude_trip):
+    if stored is None:
+        return None
+    trips = [days for trip_id, days in stored.trips.items() if trip_id != str(exclude_trip)]
+    return recap_on(stored.minutes, stored.as_of, trips, today or date.today())
+
+
+def store_driver_recap(trip):
+    """
+    Record a planned trip's on-duty days against its driver, replacing the
+    trip's earlier plan if it had one. A driver seen for the first time
+    starts from the recap the trip was planned with.
+    """
+    days = (trip.hos_plan or {}).get("cycle_days")
+    if not trip.driver_id or not days:
+        return
+    departure = trip.hos_plan["recap_at_departure"]
+    with transaction.atomic():
+        DriverRecap.objects.get_or_create(driver_id=trip.driver_id, defaults={
+            "as_of": date.fromisoformat(departure["as_of"]), "minutes": departure["minutes"],
+        })
+        stored = DriverRecap.objects.select_for_update().get(driver_id=trip.driver_id)
+        # Trips that ended before the current window can't affect any recap again
+        expired = date.today() - timedelta(days=WINDOW_DAYS)
+        stored.trips = {trip_id: other for trip_id, other in stored.trips.items() if trip_end(other) >= expired}
+        stored.trips[str(trip.id)] = days
+        stored.save(update_fields=["trips", "updated_at"])
+
+
+async def astore_driver_recap(trip):
+    await sync_to_async(store_driver_recap)(trip)
+
+
+def apply_route(trip, route_fields):
+    for name, value in route_fields.items():
+        setattr(trip, name, value)
+    trip.status = "route_calculated"
+    with metrics.timer("save_route"):
+        trip.save()
+
+
+def apply_hos(trip, hos_result):
+    trip.hos_plan = hos_result
+    trip.hos_computed_at = timezone.now()
+    trip.status = "hos_compliant"
+    with metrics.timer("save_hos"):
+        trip.save()
+        store_driver_recap(trip)
+
+
+async def aapply_hos(trip, hos_result):
+    trip.hos_plan = hos_result
+    trip.hos_computed_at = timezone.now()
+    trip.status = "hos_compliant"
+    with metrics.timer("save_hos"):
+        await trip.asave()
+        await astore_driver_recap(trip)
+
+
+def plan_trip(trip):
+    """Full pipeline for an already-saved pending trip (used by the planning queue)."""
+    apply_route(trip, calculate_route(trip_locations(trip)))
+    apply_hos(trip, calculate_hos(trip))
+    return trip
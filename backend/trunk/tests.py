@@ -1,3 +1,1587 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import heapq
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import requests
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .fields import pack_route, unpack_route
+from . import views
+from .middleware import server_timing_middleware
+from .models import DriverRecap, GeocodeCacheEntry, PlanningJob, Trip
+from .services import (
+    artifact_cache, gazetteer, geocode_cache, hos_engine, metrics, offline_router, planning_queue, polyline,
+    route_cache, route_geometry, routing, trip_pipeline,
+)
+from .services.artifact_cache import artifact_key
+from .services.batch_planner import _plan_in_sequence, plan_trips_batch
+from .services.cache import LRUCache
+from .services.hos_planner import plan_hos_compliant_trip
+from .services.hos_batch import evaluate_scenarios
+from .services import ors_client
+from .services.ors_client import AsyncORSClient, ORSClient, ORSUnavailable
+from .services.recap import recap_on
+from .services.road_graph import RoadGraph
+from .services.route_index import haversine_miles, index_for_trip, route_parts
+from .services.resilience import AsyncSingleFlight, CircuitBreaker, FlightCancelled
+
+
+def _open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_rejects(self):
+        breaker = CircuitBreaker("t", failure_threshold=3, reset_timeout=60)
+        _open_breaker(breaker)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 59)
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("t", failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.01, half_open_probes=1)
+        _open_breaker(breaker)
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())       # only one probe at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_released_probe_frees_its_slot(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.01)
+        _open_breaker(breaker)
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+    def test_probe_that_never_reports_back_reopens(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.05)
+        _open_breaker(breaker)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())        # probe taken, then lost
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+        time.sleep(0.06)
+        self.assertFalse(breaker.allow())       # stale probe: back to open
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+
+
+class ORSClientBreakerTests(SimpleTestCase):
+    def _client(self):
+        return ORSClient("http://ors.test", max_retries=0,
+                         breaker={"failure_threshold": 1, "reset_timeout": 0.05})
+
+    def _half_open(self, client, endpoint):
+        breaker = client.breaker(endpoint)
+        _open_breaker(breaker)
+        time.sleep(0.06)
+        return breaker
+
+    def test_unexpected_error_releases_probe(self):
+        client = self._client()
+        breaker = self._half_open(client, "geocode")
+
+        def explode(*args, **kwargs):
+            raise ValueError("unexpected")
+        client.session.request = explode
+        with self.assertRaises(ValueError):
+            client.get("geocode", "/geocode/search")
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_cancelled_async_probe_releases_slot(self):
+        """Regression: a probe cut off by a stage deadline used to wedge the breaker half-open."""
+        policy = self._client()
+        breaker = self._half_open(policy, "geocode")
+
+        async def never_answers(request):
+            await asyncio.sleep(3600)
+
+        async def run():
+            client = AsyncORSClient(policy)
+            client.client = httpx.AsyncClient(base_url="http://ors.test",
+                                              transport=httpx.MockTransport(never_answers))
+            try:
+                with self.assertRaises(TimeoutError):
+                    async with asyncio.timeout(0.05):
+                        await client.get("geocode", "/geocode/search")
+            finally:
+                await client.aclose()
+        asyncio.run(run())
+
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())        # the sync path may probe again
+
+    def test_open_breaker_fails_fast(self):
+        client = self._client()
+        _open_breaker(client.breaker("directions"))
+        with self.assertRaises(ORSUnavailable):
+            client.post("directions", "/v2/directions/driving-hgv")
+
+
+class ORSClientDeadlineTests(SimpleTestCase):
+    def _client(self, timeouts):
+        client = ORSClient("http://ors.test", timeouts={"geocode": 10}, max_retries=10, backoff_base=0.05,
+                           max_backoff=0.05, breaker={"failure_threshold": 100})
+
+        def refuse(method, url, timeout=None, **kwargs):
+            timeouts.append(timeout)
+            time.sleep(0.02)
+            raise requests.exceptions.ConnectionError("refused")
+        client.session.request = refuse
+        return client
+
+    def test_retries_stop_at_the_deadline(self):
+        timeouts = []
+        client = self._client(timeouts)
+        started = time.monotonic()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get("geocode", "/geocode/search", deadline=started + 0.3)
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertLess(len(timeouts), 11)
+        self.assertTrue(all(t <= 0.3 for t in timeouts))
+
+    def test_no_attempt_after_the_deadline(self):
+        timeouts = []
+        with self.assertRaises(requests.exceptions.Timeout):
+            self._client(timeouts).get("geocode", "/geocode/search", deadline=time.monotonic() - 1)
+        self.assertEqual(timeouts, [])
+
+    def test_without_a_deadline_the_endpoint_timeout_applies(self):
+        timeouts = []
+        client = self._client(timeouts)
+        client.max_retries = 1
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get("geocode", "/geocode/search")
+        self.assertEqual(timeouts, [10, 10])
+
+
+class GeocodeTransientErrorTests(TestCase):
+    """ORS timing out or rate limiting is a transient 504/503, not "Could not find location"."""
+    BODY = {"current_location": "Dallas, TX", "pickup_location": "Dallas, TX", "dropoff_location": "Tulsa, OK",
+            "cycle_used_hours": 0}
+
+    def setUp(self):
+        geocode_cache.clear()
+
+    def create(self, answer):
+        client = ORSClient("http://ors.test", max_retries=0, breaker={"failure_threshold": 100})
+        client.session.request = answer
+        with mock.patch.object(routing, "get_client", return_value=client):
+            return APIClient().post("/api/trips/", self.BODY, format="json")
+
+    def test_timeout_is_a_504(self):
+        def time_out(method, url, timeout=None, **kwargs):
+            raise requests.exceptions.ReadTimeout("read timed out")
+        response = self.create(time_out)
+        self.assertEqual(response.status_code, 504)
+        self.assertFalse(Trip.objects.exists())
+
+    def test_rate_limit_is_a_503(self):
+        def rate_limited(method, url, timeout=None, **kwargs):
+            response = requests.Response()
+            response.status_code = 429
+            response.headers["Retry-After"] = "3"
+            return response
+        response = self.create(rate_limited)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertIn("429", response.json()["message"])
+
+    def test_unknown_place_is_still_a_400(self):
+        def nothing_found(method, url, timeout=None, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"features": []}'
+            return response
+        self.assertEqual(self.create(nothing_found).status_code, 400)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def test_cancelled_leader_leaves_joiners_their_result(self):
+        flights = AsyncSingleFlight("t")
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "coords"
+
+        async def run():
+            leader = asyncio.create_task(flights.do("k", fetch))
+            await asyncio.sleep(0)
+            joiner = asyncio.create_task(flights.do("k", fetch))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            self.assertEqual(await joiner, ("coords", True))
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+        asyncio.run(run())
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    def test_call_is_cancelled_once_nobody_waits(self):
+        flights = AsyncSingleFlight("t")
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            with self.assertRaises(TimeoutError):
+                async with asyncio.timeout(0.01):
+                    await flights.do("k", fetch)
+            await asyncio.sleep(0)
+        asyncio.run(run())
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    def test_call_cancelled_underneath_joiners_raises(self):
+        flights = AsyncSingleFlight("t")
+
+        async def run():
+            waiters = [asyncio.create_task(flights.do("k", asyncio.sleep, 3600)) for _ in range(2)]
+            await asyncio.sleep(0)
+            next(iter(flights._calls.values())).task.cancel()
+            for waiter in waiters:
+                with self.assertRaises(FlightCancelled):
+                    await waiter
+        asyncio.run(run())
+
+
+class AsyncRouteDeadlineTests(SimpleTestCase):
+    def test_async_route_stage_has_the_sync_deadline(self):
+        deadlines = []
+
+        class Client:
+            async def post(self, endpoint, path, deadline=None, **kwargs):
+                deadlines.append(deadline)
+                return httpx.Response(200, json=ROUTE, request=httpx.Request("POST", "http://ors.test" + path))
+
+        async def geocode(locations):
+            return [[-96.80, 32.78], [-96.80, 32.78], [-95.99, 36.15]]
+
+        route_cache.clear()
+        with mock.patch.object(trip_pipeline, "ageocode_locations", geocode), \
+                mock.patch.object(routing, "get_async_client", return_value=Client()), \
+                self.settings(ROUTE_STAGE_DEADLINE_SECONDS=7):
+            started = time.monotonic()
+            fields = asyncio.run(trip_pipeline.acalculate_route(["Dallas, TX", "Dallas, TX", "Tulsa, OK"]))
+        self.assertEqual(fields["route_summary"]["total_distance_miles"], 254.8)
+        self.assertEqual(len(deadlines), 1)
+        self.assertAlmostEqual(deadlines[0] - started, 7, delta=0.5)
+
+
+class AsyncClientLifetimeTests(SimpleTestCase):
+    def tearDown(self):
+        ors_client.reset_client()
+
+    def test_client_is_closed_with_its_loop(self):
+        async def use():
+            return ors_client.get_async_client()
+
+        first = asyncio.run(use())
+        second = asyncio.run(use())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.client.is_closed)
+        self.assertTrue(second.client.is_closed)
+        self.assertEqual(len(ors_client._async_clients), 0)
+
+
+def _work_days(timeline):
+    """[(day, events from its start up to its off-duty start)] for a Timeline."""
+    return [(day, [e for e in timeline.events if day.start <= e.start < day.work_end])
+            for day in timeline.days]
+
+
+class HOSEngineLimitTests(SimpleTestCase):
+    def assertCompliant(self, timeline, cycle_used_minutes):
+        used = cycle_used_minutes
+        for day, events in _work_days(timeline):
+            driving = [e for e in events if e.status == hos_engine.DRIVING]
+            if not driving:
+                continue
+            last_drive = driving[-1].end
+            self.assertLessEqual(last_drive, day.start + hos_engine.DUTY_WINDOW, "drove past the 14-hour window")
+            self.assertLessEqual(sum(e.minutes for e in driving), hos_engine.MAX_DRIVING_PER_DAY)
+            since_break = 0
+            for e in events:
+                if e.status == hos_engine.DRIVING:
+                    since_break += e.minutes
+                    self.assertLessEqual(since_break, hos_engine.BREAK_AFTER_DRIVING, "8 hours without a break")
+                elif e.minutes >= hos_engine.BREAK_MINUTES:
+                    since_break = 0
+            if len(timeline.days) <= 8 and not timeline.restarts:
+                used += sum(e.minutes for e in events if e.end <= last_drive)
+                self.assertLessEqual(used, 70 * 60, "drove past 70 hours on duty")
+                used += sum(e.minutes for e in events if e.end > last_drive)
+
+    def test_fuel_stops_count_against_the_70_hour_budget(self):
+        timeline = hos_engine.build_timeline(40 * 60, cycle_used_minutes=3600, fuel_stops=[240])
+        first = timeline.days[0]
+        self.assertEqual(first.on_duty, 600)
+        self.assertCompliant(timeline, 3600)
+
+    def test_fuel_stop_is_the_30_minute_break(self):
+        timeline = hos_engine.build_timeline(11 * 60, fuel_stops=[300])
+        notes = [e.note for e in timeline.events]
+        self.assertIn("Fuel stop", notes)
+        self.assertNotIn("30-min break", notes)
+        self.assertTrue(timeline.days[0].break_taken)
+        self.assertEqual(timeline.days[0].driving, 11 * 60)
+
+    def test_break_still_taken_without_fuel_stops(self):
+        timeline = hos_engine.build_timeline(11 * 60)
+        self.assertIn("30-min break", [e.note for e in timeline.events])
+
+    def test_many_fuel_stops_stay_inside_the_14_hour_window(self):
+        stops = list(range(60, 40 * 60, 60))
+        timeline = hos_engine.build_timeline(40 * 60, fuel_stops=stops)
+        self.assertCompliant(timeline, 0)
+        self.assertEqual(timeline.total_driving, 40 * 60)
+
+    def test_random_trips_are_compliant(self):
+        rng = random.Random(13)
+        for _ in range(300):
+            total = rng.randint(60, 60 * 60)
+            cycle = rng.randint(0, 70 * 60)
+            stops = sorted({rng.randint(1, total) for _ in range(rng.randint(0, 8))})
+            self.assertCompliant(hos_engine.build_timeline(total, cycle, fuel_stops=stops), cycle)
+
+    def test_batch_evaluator_matches_engine_with_fuel_stops(self):
+        rng = random.Random(10)
+        for _ in range(60):
+            total = rng.randint(60, 90 * 60)
+            stops = sorted({rng.randint(1, total) for _ in range(rng.randint(0, 6))})
+            cycles = [rng.randint(0, 70 * 60) for _ in range(4)]
+            result = evaluate_scenarios(total * 60, np.array(cycles) / 60, [5], fuel_stops=stops)
+            for k, cycle in enumerate(cycles):
+                timeline = hos_engine.build_timeline(total, cycle, fuel_stops=stops)
+                self.assertEqual(result["total_days_needed"][k], len(timeline.days))
+                self.assertEqual(result["total_on_duty_minutes"][k], timeline.total_on_duty)
+                self.assertEqual(result["restarts"][k], len(timeline.restarts))
+                self.assertEqual(result["elapsed_minutes"][k],
+                                 timeline.days[-1].work_end - hos_engine.DEFAULT_START_MINUTE)
+
+
+def _decimal_daily_driving(total_driving_seconds, cycle_used_hours):
+    """
+    Driving hours per day from the Decimal planner that hos_engine replaced,
+    for trips that don't need a restart: up to 11h a day until done, with
+    leftovers of 0.1h or less dropped.
+    """
+    driving_left = Decimal(str(round(total_driving_seconds / 3600, 2)))
+    remaining_cycle = Decimal("70") - Decimal(cycle_used_hours)
+    days = []
+    while driving_left > Decimal("0.1"):
+        today = min(Decimal("11.0"), remaining_cycle, driving_left)
+        on_duty = today + (Decimal("0.5") if today > 8 else 0) + (0 if days else 1)
+        if driving_left <= today + Decimal("0.5"):
+            on_duty += 1
+        days.append(today)
+        driving_left -= today
+        remaining_cycle -= on_duty
+    return days
+
+
+class DecimalPlannerParityTests(SimpleTestCase):
+    def test_daily_driving_matches_the_decimal_planner(self):
+        rng = random.Random(9)
+        for _ in range(300):
+            seconds = rng.randint(30, 40 * 60) * 60
+            cycle = rng.randint(0, 10)
+            plan = plan_hos_compliant_trip(seconds, Decimal(cycle))
+            expected = _decimal_daily_driving(seconds, cycle)
+            self.assertFalse(plan["requires_34h_reset"])
+            self.assertEqual(plan["total_days_needed"], len(expected), (seconds, cycle))
+            for day, hours in zip(plan["daily_plan"], expected):
+                self.assertAlmostEqual(day["driving_hours"], float(hours), delta=0.11)
+                self.assertEqual(day["includes_30min_break"], hours > 8)
+
+
+PLACES = [
+    # name, lon, lat, state, zip, population
+    ("Portland", -122.68, 45.52, "OR", "97201", 650000),
+    ("Portland", -70.26, 43.66, "ME", "04101", 68000),
+    ("Springfield", -93.29, 37.21, "MO", "65801", 170000),
+    ("Springfield", -89.65, 39.78, "IL", "62701", 114000),
+    ("Springfield", -72.59, 42.10, "MA", "01103", 155000),
+    ("New York", -74.00, 40.71, "NY", "10001", 8300000),
+    ("Washington", -77.04, 38.91, "DC", "20001", 690000),
+    ("Washington", -91.69, 41.30, "IA", "52353", 7000),
+    ("Dallas", -96.80, 32.78, "TX", "75201", 1300000),
+    ("Kansas City", -94.63, 39.11, "Kansas", "66101", 156000),
+]
+
+
+class GazetteerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp(prefix="trunk-gazetteer-")
+        source = os.path.join(cls.directory, "places.csv")
+        with open(source, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "lon", "lat", "state", "zip", "population"])
+            writer.writerows(PLACES)
+        gazetteer.build_index(source, cls.directory)
+        cls.index = gazetteer.Gazetteer(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def assertFinds(self, text, lon):
+        coords = self.index.lookup(text)
+        self.assertIsNotNone(coords, text)
+        self.assertEqual(coords[0], lon, text)
+
+    def test_parse_reads_the_state_from_the_trailing_component_only(self):
+        self.assertEqual(gazetteer.parse("Dallas, Texas, USA"), ("dallas", "tx"))
+        self.assertEqual(gazetteer.parse("dallas tx"), ("dallas", "tx"))
+        self.assertEqual(gazetteer.parse("New York"), ("new york", None))
+        self.assertEqual(gazetteer.parse("New York, New York"), ("new york", "ny"))
+        self.assertEqual(gazetteer.parse("Washington, DC"), ("washington", "dc"))
+        self.assertEqual(gazetteer.parse("Kansas City, Missouri"), ("kansas city", "mo"))
+
+    def test_state_picks_the_place(self):
+        self.assertFinds("Portland, ME", -70.26)
+        self.assertFinds("Portland, Oregon", -122.68)
+        self.assertFinds("Springfield, IL", -89.65)
+        self.assertFinds("Springfield MA", -72.59)
+        self.assertFinds("Washington, DC", -77.04)
+        self.assertFinds("Washington, Iowa", -91.69)
+        self.assertFinds("New York, NY", -74.00)
+        self.assertFinds("Kansas City, KS", -94.63)
+
+    def test_name_alone_and_zip(self):
+        self.assertFinds("Portland", -122.68)       # highest ranked
+        self.assertFinds("New York", -74.00)
+        self.assertFinds("75201", -96.80)
+
+    def test_state_mismatch_falls_back(self):
+        self.assertIsNone(self.index.lookup("Springfield, CA"))
+        self.assertIsNone(self.index.lookup("Dallas, GA"))
+        self.assertIsNone(self.index.lookup("Portlnd, ID"))
+
+    def test_prefix_and_typos_only_touch_the_name(self):
+        self.assertFinds("Dall, TX", -96.80)
+        self.assertFinds("Dalas, TX", -96.80)
+        self.assertFinds("Portlnd, ME", -70.26)
+        self.assertFinds("Sprngfield, IL", -89.65)
+        self.assertIsNone(self.index.lookup("N"))
+        self.assertIsNone(self.index.lookup("New"))
+
+    def test_build_index_keeps_one_sorted_key_per_name(self):
+        keys = [self.index.keys[i] for i in range(len(self.index.keys))]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(self.index.meta["places"], len(PLACES))
+        self.assertEqual(self.index.meta["keys"], len(keys))
+        self.assertIn("kansas city,ks", keys)       # "Kansas" in the state column
+        self.assertEqual(keys.count("springfield"), 1)
+        self.assertFinds("Springfield", -93.29)     # the highest ranked of the three
+        self.assertFalse(self.index._offsets.flags.owndata)    # still the mmap, not a copy
+
+    def test_parse_without_a_state(self):
+        self.assertEqual(gazetteer.parse("dall, tx"), ("dall", "tx"))
+        self.assertEqual(gazetteer.parse("Dallas, Nowhere"), ("dallas nowhere", None))
+        self.assertEqual(gazetteer.parse("Dallas, United States"), ("dallas", None))
+        self.assertEqual(gazetteer.parse(" , "), ("", None))
+
+    def test_prefix_in_the_state(self):
+        self.assertFinds("dall, tx", -96.80)
+        self.assertFinds("Springf, MA", -72.59)
+        self.assertFinds("Springf", -93.29)
+        self.assertIsNone(self.index.lookup("dall, ok"))
+        self.assertIsNone(self.index.lookup("Springf, CA"))
+
+    def test_one_typo_names(self):
+        self.assertFinds("Dalls", -96.80)            # deletion
+        self.assertFinds("Dallass, TX", -96.80)      # insertion
+        self.assertFinds("Portlamd, OR", -122.68)    # substitution
+        self.assertFinds("Washingtn, IA", -91.69)
+        self.assertIsNone(self.index.lookup("Dalas, OK"))
+        self.assertIsNone(self.index.lookup("Daxxas, TX"))     # two typos in a short name
+
+
+def _road(coordinates, **tags):
+    return {"type": "Feature", "geometry": {"type": "LineString", "coordinates": coordinates},
+            "properties": {"highway": "primary", **tags}}
+
+
+def _grid_roads(size, rng):
+    """A size x size street grid 0.02 degrees apart with mixed road classes, one-ways and hgv bans."""
+    classes = ["motorway", "trunk", "primary", "secondary", "tertiary", "residential", "service"]
+    point = lambda i, j: [-97.0 + 0.02 * i, 32.0 + 0.02 * j]
+    roads = []
+    for i in range(size):
+        for j in range(size):
+            for a, b in (((i, j), (i + 1, j)), ((i, j), (i, j + 1))):
+                if b[0] >= size or b[1] >= size:
+                    continue
+                tags = {"highway": rng.choice(classes)}
+                roll = rng.random()
+                if roll < 0.15:
+                    tags["oneway"] = "yes"
+                elif roll < 0.2:
+                    tags["oneway"] = "-1"
+                elif roll < 0.25:
+                    tags["hgv"] = "no"
+                roads.append(_road([point(*a), point(*b)], **tags))
+    return roads
+
+
+def _dijkstra(graph, source, target):
+    dist, queue = {source: 0.0}, [(0.0, source)]
+    while queue:
+        d, u = heapq.heappop(queue)
+        if u == target:
+            return d
+        if d > dist[u]:
+            continue
+        for edge in range(int(graph.indptr[u]), int(graph.indptr[u + 1])):
+            v, dv = int(graph.indices[edge]), d + float(graph.weight[edge])
+            if dv < dist.get(v, float("inf")):
+                dist[v] = dv
+                heapq.heappush(queue, (dv, v))
+    return None
+
+
+class OfflineRouterTests(SimpleTestCase):
+    def build(self, roads):
+        """Write `roads` as GeoJSON, build it with build_road_graph and map it back in."""
+        directory = tempfile.mkdtemp(prefix="trunk-road-graph-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = os.path.join(directory, "roads.geojson")
+        with open(source, "w") as f:
+            json.dump({"type": "FeatureCollection", "features": roads}, f)
+        call_command("build_road_graph", source, out=directory, stdout=StringIO())
+        return RoadGraph(directory)
+
+    def node(self, graph, lon, lat):
+        return graph.nearest_node(lon, lat, 0.1)
+
+    def test_bidirectional_a_star_matches_dijkstra(self):
+        rng = random.Random(18)
+        graph = self.build(_grid_roads(12, rng))
+        self.assertIsInstance(graph.weight, np.ndarray)
+        routed = unreachable = 0
+        for _ in range(200):
+            source, target = rng.randrange(graph.meta["nodes"]), rng.randrange(graph.meta["nodes"])
+            path = offline_router.shortest_path(graph, source, target)
+            expected = _dijkstra(graph, source, target)
+            if expected is None:
+                self.assertIsNone(path)
+                unreachable += 1
+                continue
+            routed += 1
+            # A connected chain of edges from source to target, as cheap as Dijkstra's
+            tails = [source] + graph.indices[path].tolist()
+            for edge, tail in zip(path, tails):
+                self.assertTrue(graph.indptr[tail] <= edge < graph.indptr[tail + 1])
+            self.assertEqual(tails[-1], target)
+            self.assertAlmostEqual(float(graph.weight[path].astype(float).sum()), expected, delta=expected * 1e-5)
+        self.assertGreater(routed, 150)
+
+    def test_oneway_and_hgv_tags(self):
+        graph = self.build([
+            _road([[-97.0, 32.0], [-96.99, 32.0]], oneway="yes"),
+            _road([[-96.99, 32.0], [-96.98, 32.0]], oneway="-1"),
+            _road([[-96.98, 32.0], [-96.97, 32.0]], highway="motorway"),
+            _road([[-96.97, 32.0], [-96.96, 32.0]], hgv="no"),
+            _road([[-96.97, 32.0], [-96.97, 32.01]], highway="footway"),
+        ])
+        self.assertEqual(graph.meta["skipped_ways"], 2)
+        self.assertEqual(graph.meta["edges"], 3)
+        a, b, c, d = (self.node(graph, lon, 32.0) for lon in (-97.0, -96.99, -96.98, -96.97))
+        self.assertIsNone(self.node(graph, -96.96, 32.0))
+        self.assertEqual(len(offline_router.shortest_path(graph, a, b)), 1)
+        self.assertIsNone(offline_router.shortest_path(graph, b, a))
+        self.assertIsNone(offline_router.shortest_path(graph, b, c))
+        self.assertEqual(len(offline_router.shortest_path(graph, c, b)), 1)
+        self.assertEqual(len(offline_router.shortest_path(graph, c, d)), 1)      # motorways are one-way
+        self.assertIsNone(offline_router.shortest_path(graph, d, c))
+
+    def test_nearest_node_snaps_to_the_closest_node(self):
+        rng = random.Random(5)
+        graph = self.build(_grid_roads(8, rng))
+        for _ in range(100):
+            lon, lat = -97.05 + rng.random() * 0.25, 31.95 + rng.random() * 0.25
+            distances = haversine_miles(lon, lat, graph.node_lon, graph.node_lat)
+            node = graph.nearest_node(lon, lat, 10)
+            self.assertEqual(distances[node], distances.min())
+            self.assertIsNone(graph.nearest_node(lon, lat, float(distances.min()) * 0.99))
+        self.assertIsNone(graph.nearest_node(-90.0, 32.0, 5))
+
+    def test_route_is_shaped_like_ors(self):
+        graph = self.build(_grid_roads(6, random.Random(3)) + [
+            _road([[-97.0 + 0.02 * i, 32.0 + 0.02 * j] for i, j in ((0, 0), (5, 0), (5, 5), (0, 5), (0, 0))],
+                  highway="motorway_link", oneway="no"),
+        ])
+        waypoints = [[-97.0, 32.0], [-96.9, 32.1], [-97.0, 32.1]]
+        with mock.patch.object(offline_router, "_graph", graph):
+            data = offline_router.get_route(waypoints)
+            with self.assertRaises(offline_router.OfflineRoutingError):
+                offline_router.get_route([[-97.0, 32.0], [-90.0, 40.0]])
+        coords, summary, segments, way_points = route_parts(data)
+        self.assertEqual(coords[0], waypoints[0])
+        self.assertEqual([coords[i] for i in way_points], waypoints)
+        self.assertAlmostEqual(summary["distance"], sum(s["distance"] for s in segments), places=2)
+
+        fields = trip_pipeline.route_fields(["A", "B", "C"], data)
+        self.assertEqual(fields["total_distance_miles"], Decimal(summary["distance"]))
+        self.assertEqual([leg["miles"] for leg in fields["route_summary"]["segments"]],
+                         [round(s["distance"], 1) for s in segments])
+        self.assertEqual(fields["route_geometry"]["levels"][-1]["points"], len(coords))
+
+
+class RecapTests(SimpleTestCase):
+    today = date(2026, 10, 17)
+
+    def trip(self, start, minutes, restarts=()):
+        return {"start": start.isoformat(), "minutes": minutes, "restarts": list(restarts)}
+
+    def test_future_trip_days_dont_count_yet(self):
+        trip = self.trip(self.today, [600, 600, 600])
+        self.assertEqual(recap_on([], self.today, [trip], self.today).used, 600)
+        self.assertEqual(recap_on([], self.today, [trip], self.today + timedelta(days=2)).used, 1800)
+
+    def test_history_rolls_off(self):
+        history = [300] * 8
+        self.assertEqual(recap_on(history, self.today, [], self.today).used, 2400)
+        self.assertEqual(recap_on(history, self.today, [], self.today + timedelta(days=3)).used, 1500)
+        # As of a day before the stored one, only the days up to it count
+        recap = recap_on(history, self.today, [], self.today - timedelta(days=2))
+        self.assertEqual(recap.days(), [0, 0, 300, 300, 300, 300, 300, 300])
+
+    def test_restart_clears_everything_before_it(self):
+        trip = self.trip(self.today, [660, 0, 0, 600], restarts=[3])
+        recap = recap_on([600] * 8, self.today, [trip], self.today + timedelta(days=3))
+        self.assertEqual(recap.used, 600)
+        self.assertEqual(recap_on([600] * 8, self.today, [trip], self.today + timedelta(days=2)).used,
+                         6 * 600 + 660)
+
+
+class PolylineTests(SimpleTestCase):
+    def test_reference_encoding(self):
+        coords = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+        self.assertEqual(polyline.encode(coords), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        np.testing.assert_allclose(polyline.decode("_p~iF~ps|U_ulLnnqC_mqNvxq`@"), coords)
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(7)
+        coords = np.column_stack((rng.uniform(-180, 180, 500), rng.uniform(-85, 85, 500)))
+        for precision in (5, 6):
+            decoded = np.asarray(polyline.decode(polyline.encode(coords, precision), precision))
+            np.testing.assert_allclose(decoded, coords, atol=0.5 / 10 ** precision)
+
+    def test_truncated_input_is_rejected(self):
+        with self.assertRaises(ValueError):
+            polyline.decode(polyline.encode([[1.5, 2.5], [3.5, 4.5]])[:-1])
+
+    def test_empty(self):
+        self.assertEqual(polyline.decode(""), [])
+
+
+def _wiggly_route(points=1500, seed=25):
+    """An ORS-shaped Dallas -> Chicago line with road-like wiggles at every scale."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, points)
+    lon = -96.8 + 9.2 * t + np.cumsum(rng.normal(0, 0.004, points)) + 0.3 * np.sin(t * 40)
+    lat = 32.78 + 9.1 * t + np.cumsum(rng.normal(0, 0.004, points))
+    coords = np.round(np.stack([lon, lat], axis=1), 5).tolist()
+    return {"features": [{"geometry": {"coordinates": coords},
+                          "properties": {"summary": {"distance": 925.0, "duration": 50000.0}}}]}
+
+
+class RouteGeometryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.route = _wiggly_route()
+        cls.coords = cls.route["features"][0]["geometry"]["coordinates"]
+        cls.geometry = route_geometry.simplify(cls.route)
+
+    def level_points(self, level):
+        return [tuple(p) for p in polyline.decode(level["polyline"])]
+
+    def test_each_level_is_a_subset_of_the_next_finer_one(self):
+        levels = self.geometry["levels"]
+        self.assertEqual([level["zoom"] for level in levels], [*route_geometry.ZOOMS, None])
+        full = self.level_points(levels[-1])
+        self.assertEqual(full, [tuple(p) for p in self.coords])
+        finer = full
+        for level in reversed(levels[:-1]):
+            points = self.level_points(level)
+            self.assertEqual(len(points), level["points"])
+            self.assertEqual((points[0], points[-1]), (full[0], full[-1]))
+            # An ordered subsequence of the finer level
+            remaining = iter(finer)
+            self.assertTrue(all(point in remaining for point in points), level["zoom"])
+            self.assertLess(len(points), len(finer))
+            finer = points
+
+    def test_levels_stay_within_their_tolerance(self):
+        full = np.asarray(self.coords)
+        for level in self.geometry["levels"][:-1]:
+            kept = np.asarray(polyline.decode(level["polyline"]))
+            # Every original vertex lies within tolerance of the simplified line (equirectangular meters)
+            lat0 = np.radians(full[:, 1].mean())
+            scale = np.array([np.cos(lat0), 1.0]) * np.radians(1) * route_geometry.EARTH_RADIUS_M
+            p, a, b = full * scale, kept[:-1] * scale, kept[1:] * scale
+            distances = np.min([
+                route_geometry._segment_distances(p[:, 0], p[:, 1], ax, ay, bx, by)
+                for (ax, ay), (bx, by) in zip(a, b)
+            ], axis=0)
+            self.assertLessEqual(distances.max(), level["tolerance_m"] * 1.01, level["zoom"])
+
+    def test_clip_keeps_segments_crossing_the_box(self):
+        line = [[0, 0], [1, 0], [2, 0], [3, 0], [3, 3], [2, 3], [1, 3], [0, 3]]
+        parts = route_geometry.clip(line, (0.5, -1, 1.5, 4))
+        # Out along y=0 and back along y=3: two parts, each ending just outside the box
+        self.assertEqual(parts, [[[0, 0], [1, 0], [2, 0]], [[2, 3], [1, 3], [0, 3]]])
+        # A segment passing straight through without a vertex inside is kept
+        self.assertEqual(route_geometry.clip([[0, 0], [3, 0]], (1, -1, 2, 1)), [[[0, 0], [3, 0]]])
+        self.assertEqual(route_geometry.clip(line, (10, 10, 11, 11)), [])
+
+    def test_overview_and_zoom_levels(self):
+        overview = route_geometry.select_level(self.geometry)
+        self.assertEqual(overview["zoom"], route_geometry.ZOOMS[1])
+        self.assertLess(overview["points"], 500)
+        for query, zoom in (({"zoom": 0}, 4), ({"zoom": 9}, 10), ({"zoom": 14}, 14), ({"zoom": 20}, None),
+                            ({"tolerance": 0}, None), ({"tolerance": 100}, 12), ({"tolerance": 1e6}, 4)):
+            self.assertEqual(route_geometry.select_level(self.geometry, **query)["zoom"], zoom, query)
+
+
+class CompactRouteFieldTests(TestCase):
+    def test_pack_round_trip_is_lossless(self):
+        route = {
+            "bbox": [-96.8, 32.78, -95.99, 36.15],
+            "features": [{
+                "geometry": {"type": "LineString",
+                             "coordinates": [[-96.801234, 32.781234], [-96.3, 33.6], [-95.990001, 36.15]]},
+                "properties": {"way_points": [0, 2], "segments": [{"distance": 254.8, "steps": []}]},
+            }],
+        }
+        self.assertEqual(unpack_route(pack_route(route)), route)
+        self.assertEqual(unpack_route(b'{"routes": []}'), {"routes": []})   # pre-migration JSON rows
+
+    def test_pack_round_trip_of_a_full_ors_response(self):
+        route = _ors_response(_wiggly_route())
+        packed = pack_route(route)
+        self.assertEqual(unpack_route(packed), route)
+        self.assertLess(len(packed), len(json.dumps(route)) / 2)
+
+    def test_model_round_trip(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C",
+                                   cycle_used_hours=0, route_raw=ROUTE)
+        self.assertEqual(Trip.objects.get(pk=trip.pk).route_raw, ROUTE)
+        self.assertIsNone(Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C",
+                                              cycle_used_hours=0).route_raw)
+
+
+def _ors_response(route):
+    """`route` wrapped in everything else an ORS GeoJSON directions response carries."""
+    feature = route["features"][0]
+    coords = feature["geometry"]["coordinates"]
+    return {
+        "type": "FeatureCollection",
+        "bbox": [-96.8, 32.78, -87.6, 41.88],
+        "features": [{
+            "bbox": [-96.8, 32.78, -87.6, 41.88],
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": {
+                **feature["properties"],
+                "segments": [{"distance": 925.0, "duration": 50000.0, "steps": [
+                    {"distance": 0.4, "duration": 51.2, "type": 11, "instruction": "Head north on Main St",
+                     "name": "Main St", "way_points": [0, 3]},
+                    {"distance": 924.6, "duration": 49948.8, "type": 10, "instruction": "Arrive",
+                     "name": "-", "way_points": [3, len(coords) - 1]},
+                ]}],
+                "way_points": [0, len(coords) - 1],
+            },
+        }],
+        "metadata": {"attribution": "openrouteservice.org | OpenStreetMap contributors", "service": "routing",
+                     "timestamp": 1760000000000, "query": {"coordinates": [coords[0], coords[-1]], "units": "mi"},
+                     "engine": {"version": "9.0.0", "build_date": "2025-01-01T00:00:00Z"}},
+    }
+
+
+class RouteMigrationTests(TransactionTestCase):
+    """0006 moves route_raw from JSON to CompactRouteField and back."""
+    before = [("trunk", "0005_planningjob")]
+    after = [("trunk", "0006_compact_route_raw")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forward_and_backward(self):
+        route = _ors_response(_wiggly_route())
+        apps = self.migrate(self.before)
+        OldTrip = apps.get_model("trunk", "Trip")
+        fields = dict(current_location="A", pickup_location="B", dropoff_location="C", cycle_used_hours=0)
+        planned = OldTrip.objects.create(**fields, route_raw=route)
+        pending = OldTrip.objects.create(**fields)
+
+        apps = self.migrate(self.after)
+        Packed = apps.get_model("trunk", "Trip")
+        self.assertEqual(Packed.objects.get(pk=planned.pk).route_raw, route)
+        self.assertIsNone(Packed.objects.get(pk=pending.pk).route_raw)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT route_raw FROM trunk_trip WHERE id = %s", [planned.pk.hex])
+            self.assertLess(len(bytes(cursor.fetchone()[0])), len(json.dumps(route)) / 2)
+
+        apps = self.migrate(self.before)
+        OldTrip = apps.get_model("trunk", "Trip")
+        self.assertEqual(OldTrip.objects.get(pk=planned.pk).route_raw, route)
+        self.assertIsNone(OldTrip.objects.get(pk=pending.pk).route_raw)
+
+
+ROUTE = {"features": [{
+    "geometry": {"coordinates": [[-96.80, 32.78], [-96.30, 33.60], [-95.99, 36.15]]},
+    "properties": {"summary": {"distance": 254.8, "duration": 14400.0}},
+}]}
+
+
+class TripEndpointValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = Trip.objects.create(
+            current_location="Dallas, TX", pickup_location="Dallas, TX", dropoff_location="Tulsa, OK",
+            cycle_used_hours=10, total_distance_miles=254.8, total_driving_hours=4,
+            route_raw=ROUTE, status="hos_compliant",
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, action, query):
+        return self.client.get(f"/api/trips/{self.trip.id}/{action}/?{query}")
+
+    def test_position(self):
+        response = self.get("position", "mile=0,100")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["mile"] for p in response.json()["positions"]], [0.0, 100.0])
+
+    def test_position_rejects_bad_input(self):
+        for query in ("mile=,", "hour=,,", "mile=nan", "hour=inf", "mile=x", "", "mile=1&hour=1",
+                      "mile=" + ",".join(["1"] * 1001)):
+            self.assertEqual(self.get("position", query).status_code, 400, query)
+
+    def test_geometry_rejects_bad_input(self):
+        for query in ("zoom=x", "zoom=25", "zoom=-1", "tolerance=nan", "tolerance=-1", "bbox=1,2,3",
+                      "bbox=3,0,1,1", "bbox=0,0,inf,1", "encoding=wkt"):
+            self.assertEqual(self.get("geometry", query).status_code, 400, query)
+
+    def test_list_rejects_unknown_fields(self):
+        response = self.client.get("/api/trips/?fields=id,nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("nope", response.json()["message"])
+
+    def test_export_rejects_bad_input(self):
+        for query in ("start=2026-01-01", "start=someday&end=2026-01-02", "start=2026-01-01&end=2026-01-02&output=csv"):
+            self.assertEqual(self.client.get(f"/api/trips/export/?{query}").status_code, 400, query)
+
+    def test_async_plan_rejects_bad_bodies(self):
+        for body in (b"{", b'{"current_location": "Dallas, TX"}', b'{"cycle_used_hours": "many"}'):
+            response = self.client.generic("POST", "/api/trips/plan/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_what_if(self):
+        response = self.get("what-if", "cycle_step=10&departures=5,12.5")
+        self.assertEqual(response.status_code, 200)
+
+    def test_what_if_rejects_bad_input(self):
+        for query in ("cycle_step=1e-7", "departure_step=1e-300", "cycle_step=5e-324", "cycle_step=0",
+                      "departure_step=-1", "cycle_step=nan", "cycles=nan", "departures=inf", "cycles=71",
+                      "cycles=-1", "departures=24", "departures=-0.5", "cycles=,", "cycle_step=x"):
+            self.assertEqual(self.get("what-if", query).status_code, 400, query)
+
+
+class TripPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Trip.objects.bulk_create([
+            Trip(current_location="A", pickup_location="B", dropoff_location=f"C{i}", cycle_used_hours=0)
+            for i in range(23)
+        ])
+        # Several trips per instant, so pages have to break ties on the id
+        base = timezone.now()
+        for i, trip in enumerate(Trip.objects.order_by("id")):
+            Trip.objects.filter(pk=trip.pk).update(created_at=base - timedelta(seconds=i // 5))
+        cls.expected = [str(pk) for pk in Trip.objects.order_by("-created_at", "-id").values_list("id", flat=True)]
+
+    def test_pages_neither_skip_nor_repeat_rows(self):
+        client = APIClient()
+        url, seen = "/api/trips/?page_size=4&fields=id", []
+        while url:
+            body = client.get(url).json()
+            self.assertEqual(set(body), {"next", "page_size", "results"})
+            self.assertLessEqual(len(body["results"]), 4)
+            seen.extend(trip["id"] for trip in body["results"])
+            url = body["next"]
+        self.assertEqual(seen, self.expected)
+
+    def test_tampered_cursor_is_a_400(self):
+        cursors = ["not-a-cursor", base64.urlsafe_b64encode(b"yesterday|nope").decode(),
+                   base64.urlsafe_b64encode(f"{timezone.now().isoformat()}|12".encode()).decode(),
+                   base64.urlsafe_b64encode(b"\xff\xfe").decode()]
+        for cursor in cursors:
+            self.assertEqual(APIClient().get(f"/api/trips/?cursor={cursor}").status_code, 400, cursor)
+
+
+class RouteIndexCacheTests(TestCase):
+    def test_a_recalculated_route_gets_a_new_index(self):
+        locations = ["Dallas, TX", "Dallas, TX", "Tulsa, OK"]
+        trip = Trip.objects.create(current_location="Dallas, TX", pickup_location="Dallas, TX",
+                                   dropoff_location="Tulsa, OK", cycle_used_hours=0)
+        trip_pipeline.apply_route(trip, trip_pipeline.route_fields(locations, ROUTE))
+        self.assertAlmostEqual(index_for_trip(Trip.objects.get(pk=trip.pk)).total_miles, 254.8, places=3)
+
+        detour = {"features": [{
+            "geometry": {"coordinates": [[-96.80, 32.78], [-97.52, 35.47], [-95.99, 36.15]]},
+            "properties": {"summary": {"distance": 312.4, "duration": 18000.0}},
+        }]}
+        trip_pipeline.apply_route(trip, trip_pipeline.route_fields(locations, detour))
+        self.assertAlmostEqual(index_for_trip(Trip.objects.get(pk=trip.pk)).total_miles, 312.4, places=3)
+        self.assertAlmostEqual(index_for_trip(trip).total_miles, 312.4, places=3)
+
+
+class DriverRecapTests(TestCase):
+    def make_trip(self, hours=30):
+        return Trip(current_location="Dallas, TX", pickup_location="Dallas, TX", dropoff_location="Tulsa, OK",
+                    cycle_used_hours=20, total_distance_miles=hours * 60, total_driving_hours=hours,
+                    route_raw=ROUTE, driver_id="d1")
+
+    def test_replanning_a_trip_replaces_its_hours(self):
+        trip = self.make_trip()
+        trip.save()
+        first = trip_pipeline.calculate_hos(trip)
+        trip_pipeline.apply_hos(trip, first)
+        again = trip_pipeline.calculate_hos(trip)
+        self.assertEqual(again["recap_at_departure"], first["recap_at_departure"])
+        trip_pipeline.apply_hos(trip, again)
+        self.assertEqual(list(DriverRecap.objects.get(driver_id="d1").trips), [str(trip.id)])
+
+    def test_recap_is_as_of_today(self):
+        trip = self.make_trip()
+        trip.save()
+        trip_pipeline.apply_hos(trip, trip_pipeline.calculate_hos(trip))
+        today = date.today()
+        recap = trip_pipeline.driver_recap("d1", today)
+        # Yesterday's 20 h plus the first trip day; the later days haven't happened yet
+        self.assertEqual(recap.days()[-2:], [20 * 60, trip.hos_plan["cycle_days"]["minutes"][0]])
+        tomorrow = trip_pipeline.driver_recap("d1", today + timedelta(days=1))
+        self.assertEqual(tomorrow.used - recap.used, trip.hos_plan["cycle_days"]["minutes"][1])
+
+    def test_batch_chains_a_drivers_trips(self):
+        drivers = {}
+        first, second = self.make_trip(15), self.make_trip(15)
+        plan1 = _plan_in_sequence(first, drivers)
+        plan2 = _plan_in_sequence(second, drivers)
+        ends = date.fromisoformat(plan1["daily_plan"][-1]["date"])
+        self.assertEqual(plan2["cycle_days"]["start"], (ends + timedelta(days=1)).isoformat())
+        self.assertEqual(plan2["daily_plan"][0]["date"], plan2["cycle_days"]["start"])
+        # The second trip starts with the first one's hours on the books
+        self.assertEqual(plan2["recap_at_departure"]["minutes"][-len(plan1["cycle_days"]["minutes"]) - 1:-1],
+                         plan1["cycle_days"]["minutes"])
+
+
+class PlanningQueueTests(TestCase):
+    BODY = {"current_location": "Dallas, TX", "pickup_location": "Dallas, TX", "dropoff_location": "Tulsa, OK",
+            "cycle_used_hours": 0}
+
+    def queue_trip(self):
+        trip = Trip.objects.create(**self.BODY)
+        return planning_queue.enqueue(trip)
+
+    def test_async_create_queues_the_trip(self):
+        response = APIClient().post("/api/trips/?async=1", self.BODY, format="json")
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body["status"], "pending")
+        self.assertTrue(body["status_url"].endswith(f"/api/trips/{body['trip_id']}/status/"))
+        self.assertEqual(PlanningJob.objects.get(trip_id=body["trip_id"]).state, PlanningJob.QUEUED)
+
+        status = APIClient().get(body["status_url"]).json()
+        self.assertEqual((status["status"], status["done"], status["job"]["state"]), ("pending", False, "queued"))
+
+    def test_long_poll_is_capped(self):
+        trip = self.queue_trip().trip
+        started = time.monotonic()
+        with mock.patch.object(views, "STATUS_MAX_WAIT_SECONDS", 0.1):
+            response = APIClient().get(f"/api/trips/{trip.id}/status/?wait=30")
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_claims_are_exclusive(self):
+        first, second = self.queue_trip(), self.queue_trip()
+        claimed = planning_queue.claim_next("w1")
+        self.assertEqual((claimed.pk, claimed.state, claimed.attempts, claimed.locked_by),
+                         (first.pk, PlanningJob.RUNNING, 1, "w1"))
+        self.assertEqual(planning_queue.claim_next("w2").pk, second.pk)
+        self.assertIsNone(planning_queue.claim_next("w3"))
+
+    def test_a_job_claimed_underneath_a_worker_is_skipped(self):
+        first, second = self.queue_trip(), self.queue_trip()
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if kwargs.get("locked_by") == "w2":
+                # w1 claims the first job between w2 reading the candidates and updating
+                update(PlanningJob.objects.filter(pk=first.pk), state=PlanningJob.RUNNING, locked_by="w1")
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", racing_update):
+            claimed = planning_queue.claim_next("w2")
+        self.assertEqual(claimed.pk, second.pk)
+        first.refresh_from_db()
+        self.assertEqual((first.locked_by, first.attempts), ("w1", 0))
+
+    def test_transient_failures_back_off_then_fail(self):
+        job = self.queue_trip()
+        error = trip_pipeline.PlanningError("ORS down", status_code=503, transient=True)
+        with mock.patch.object(planning_queue, "plan_trip", side_effect=error), \
+                self.settings(PLANNING_MAX_ATTEMPTS=2, PLANNING_RETRY_DELAY_SECONDS=30):
+            job = planning_queue.claim_next("w1")
+            before = timezone.now()
+            planning_queue.process(job)
+            job.refresh_from_db()
+            self.assertEqual((job.state, job.error, job.locked_by), (PlanningJob.QUEUED, "ORS down", ""))
+            self.assertGreaterEqual(job.available_at, before + timedelta(seconds=30))
+            self.assertIsNone(planning_queue.claim_next("w1"))      # not due yet
+
+            PlanningJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+            job = planning_queue.claim_next("w1")
+            planning_queue.process(job)
+        job.refresh_from_db()
+        job.trip.refresh_from_db()
+        self.assertEqual((job.state, job.attempts, job.trip.status), (PlanningJob.FAILED, 2, "failed"))
+
+    def test_permanent_failure_is_not_retried(self):
+        self.queue_trip()
+        error = trip_pipeline.PlanningError("Could not find location: Tulsa, OK", status_code=400)
+        with mock.patch.object(planning_queue, "plan_trip", side_effect=error):
+            job = planning_queue.process(planning_queue.claim_next("w1"))
+        self.assertEqual((job.state, job.attempts), (PlanningJob.FAILED, 1))
+
+    def test_success(self):
+        self.queue_trip()
+        with mock.patch.object(planning_queue, "plan_trip"):
+            job = planning_queue.process(planning_queue.claim_next("w1"))
+        self.assertEqual((job.state, job.error), (PlanningJob.DONE, ""))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs_are_requeued(self):
+        stale, fresh = self.queue_trip(), self.queue_trip()
+        planning_queue.claim_next("dead")
+        planning_queue.claim_next("alive")
+        PlanningJob.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        with self.settings(PLANNING_STALE_AFTER_SECONDS=300):
+            self.assertEqual(planning_queue.requeue_stale(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.state, stale.locked_by), (PlanningJob.QUEUED, ""))
+        self.assertEqual((fresh.state, fresh.locked_by), (PlanningJob.RUNNING, "alive"))
+
+
+class ArtifactKeyTests(SimpleTestCase):
+    def test_key_covers_the_trip_id(self):
+        """The PDF's title names the trip, so identical plans of two trips are different files."""
+        fields = dict(current_location="A", pickup_location="B", dropoff_location="C",
+                      total_distance_miles=100, hos_plan={"daily_plan": []})
+        first, second = Trip(**fields), Trip(**fields)
+        self.assertEqual(artifact_key(first, "pdf"), artifact_key(first, "pdf"))
+        self.assertNotEqual(artifact_key(first, "pdf"), artifact_key(second, "pdf"))
+
+
+class PlannedTripTestCase(TestCase):
+    """A planned trip, with the artifact cache in a throwaway directory."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = Trip.objects.create(
+            current_location="Dallas, TX", pickup_location="Dallas, TX", dropoff_location="Tulsa, OK",
+            cycle_used_hours=10, total_distance_miles=254.8, total_driving_hours=4, route_raw=ROUTE,
+        )
+        trip_pipeline.apply_hos(cls.trip, trip_pipeline.calculate_hos(cls.trip))
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="trunk-artifacts-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(ARTIFACT_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        artifact_cache.clear()
+        self.client = APIClient()
+
+
+class ArtifactConditionalGetTests(PlannedTripTestCase):
+    def url(self):
+        return f"/api/trips/{self.trip.id}/logs/pdf/"
+
+    def test_matching_etag_is_a_304(self):
+        first = self.client.get(self.url())
+        self.assertEqual(first.status_code, 200)
+        renders = artifact_cache.stats()["renders"]
+        again = self.client.get(self.url(), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+        self.assertEqual(artifact_cache.stats()["renders"], renders)
+
+    def test_not_modified_since_is_a_304(self):
+        first = self.client.get(self.url())
+        again = self.client.get(self.url(), HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+
+    def test_replanning_changes_the_etag(self):
+        first = self.client.get(self.url())
+        self.trip.cycle_used_hours = 40
+        self.trip.save()
+        trip_pipeline.apply_hos(self.trip, trip_pipeline.calculate_hos(self.trip))
+        again = self.client.get(self.url(), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], first["ETag"])
+        self.assertTrue(again.content.startswith(b"%PDF"))
+
+
+class TripLogsEndpointTests(PlannedTripTestCase):
+    def test_single_pdf(self):
+        response = self.client.get(f"/api/trips/{self.trip.id}/logs/pdf/?download=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="Logs_{self.trip.id}.pdf"')
+
+    def test_zip_holds_one_pdf_per_trip_in_request_order(self):
+        other = Trip.objects.create(
+            current_location="Tulsa, OK", pickup_location="Tulsa, OK", dropoff_location="Dallas, TX",
+            cycle_used_hours=0, total_distance_miles=254.8, total_driving_hours=4, route_raw=ROUTE,
+        )
+        trip_pipeline.apply_hos(other, trip_pipeline.calculate_hos(other))
+        unplanned = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C",
+                                        cycle_used_hours=0)
+
+        ids = [other.id, unplanned.id, self.trip.id]
+        response = self.client.get(f"/api/trips/logs/zip/?ids={','.join(map(str, ids))}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [f"Logs_{other.id}.pdf", f"Logs_{self.trip.id}.pdf"])
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b"%PDF"))
+
+    def test_zip_rejects_bad_ids(self):
+        for query in ("", "ids=", "ids=nope", f"ids={','.join(str(self.trip.id) for _ in range(501))}"):
+            self.assertEqual(self.client.get(f"/api/trips/logs/zip/?{query}").status_code, 400, query)
+
+
+class FleetExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = Trip.objects.create(
+            current_location="Dallas, TX", pickup_location="Dallas, TX", dropoff_location="Tulsa, OK",
+            cycle_used_hours=10, total_distance_miles=254.8, total_driving_hours=4, route_raw=ROUTE,
+        )
+        trip_pipeline.apply_hos(cls.trip, trip_pipeline.calculate_hos(cls.trip))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="trunk-artifacts-")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self):
+        day = self.trip.created_at.date()
+        response = APIClient().get(f"/api/trips/export/?start={day}&end={day + timedelta(days=1)}")
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+    def test_http_export_renders_through_the_artifact_cache(self):
+        with override_settings(ARTIFACT_CACHE_DIR=self.directory):
+            artifact_cache.clear()
+            renders = artifact_cache.stats()["renders"]
+            first = self.export()
+            second = self.export()
+        self.assertEqual(artifact_cache.stats()["renders"], renders + 1)
+        name = f"Logs_{self.trip.id}.pdf"
+        self.assertEqual(first.read(name), second.read(name))
+        self.assertEqual(first.read(name), artifact_cache.get_artifact(self.trip, "pdf").data)
+
+
+PROMETHEUS_SAMPLE = re.compile(r'^([a-z_]+)(\{[^}]*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_sums_repeated_stages(self):
+        def view(request):
+            for seconds in (0.01, 0.02):
+                metrics.record("geocode", seconds)
+            metrics.record("route", 0.5)
+            return HttpResponse()
+
+        response = server_timing_middleware(view)(RequestFactory().get("/api/trips/"))
+        entries = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(entries["geocode"], 'dur=30.0;desc="x2"')
+        self.assertEqual(entries["route"], "dur=500.0")
+        self.assertIn("total", entries)
+
+    def test_api_responses_carry_server_timing(self):
+        self.assertIn("total;dur=", APIClient().get("/api/trips/")["Server-Timing"])
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_middleware_unloads_when_metrics_are_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            server_timing_middleware(lambda request: HttpResponse())
+        self.assertNotIn("Server-Timing", APIClient().get("/api/trips/"))
+        with metrics.timer("geocode"):
+            pass
+        self.assertNotIn("trunk_stage_seconds", metrics.render_prometheus())
+
+    def test_prometheus_text(self):
+        for seconds in (0.0005, 0.003, 0.003, 0.7, 45):
+            metrics.observe("trunk_stage_seconds", seconds, stage="geocode")
+        response = APIClient().get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+        buckets, counts, typed = [], {}, set()
+        for line in response.content.decode().splitlines():
+            if line.startswith("# TYPE "):
+                typed.add(line.split()[2])
+                continue
+            if line.startswith("#"):
+                continue
+            match = PROMETHEUS_SAMPLE.match(line)
+            self.assertIsNotNone(match, line)
+            name, labels, value = match.groups()
+            self.assertIn(re.sub(r"_(bucket|sum|count)$", "", name), typed, line)
+            if labels and 'stage="geocode"' in labels:
+                if name.endswith("_bucket"):
+                    buckets.append(int(value))
+                elif name.endswith("_count"):
+                    counts[name] = int(value)
+        # Cumulative: one bucket per bound plus +Inf, never decreasing, +Inf equal to _count
+        self.assertEqual(len(buckets), len(metrics.BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[0], 1)
+        self.assertEqual(buckets[-2:], [4, 5])
+        self.assertEqual(counts, {"trunk_stage_seconds_count": 5})
+
+    def test_scrapes_reuse_the_geocode_row_count(self):
+        geocode_cache.clear()
+        geocode_cache.stats()
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                metrics.render_prometheus()
+
+
+class RouteCacheTests(SimpleTestCase):
+    LANE = [[-96.80001, 32.78002], [-95.99, 36.15]]
+
+    def use(self, **options):
+        cache = LRUCache(**{"maxsize": 100, "max_bytes": 1 << 30, **options})
+        patch = mock.patch.object(route_cache, "_cache", cache)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return cache
+
+    @override_settings(ROUTE_CACHE_PRECISION=4)
+    def test_nearby_points_share_a_key(self):
+        key = route_cache.make_key(self.LANE, {"units": "mi", "geometry": True})
+        self.assertEqual(route_cache.make_key([[-96.800014, 32.780018], [-95.99003, 36.14997]],
+                                              {"geometry": True, "units": "mi"}), key)
+        self.assertNotEqual(route_cache.make_key([[-96.8003, 32.78002], [-95.99, 36.15]],
+                                                 {"units": "mi", "geometry": True}), key)
+        self.assertNotEqual(route_cache.make_key(self.LANE, {"units": "km", "geometry": True}), key)
+        self.assertNotEqual(route_cache.make_key(self.LANE[::-1], {"units": "mi", "geometry": True}), key)
+
+    def test_round_trip_is_compressed_and_a_copy(self):
+        cache = self.use()
+        route = {"features": [{"geometry": {"coordinates": [[-96.8, 32.78]] * 500},
+                               "properties": {"summary": {"distance": 254.8, "duration": 14400.0}}}]}
+        route_cache.put(self.LANE, None, route)
+        self.assertLess(cache.bytes, len(json.dumps(route)) / 10)
+        cached = route_cache.get(self.LANE)
+        self.assertEqual(cached, route)
+        cached["features"].clear()
+        self.assertEqual(route_cache.get(self.LANE), route)
+
+    def test_entries_expire(self):
+        self.use(ttl=60)
+        route_cache.put(self.LANE, None, {"routes": []})
+        with mock.patch("trunk.services.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(route_cache.get(self.LANE))
+        self.assertEqual(route_cache.stats()["size"], 0)
+
+    def test_least_recently_used_lanes_go_over_the_byte_budget(self):
+        rng = random.Random(1)
+        route = {"routes": [{"geometry": "".join(rng.choice("abcdefgh") for _ in range(3000))}]}
+        lanes = [[[-96.0 - i, 32.0], [-95.0, 36.0]] for i in range(4)]
+        self.use()
+        route_cache.put(lanes[0], None, route)
+        size = route_cache.stats()["compressed_bytes"]
+
+        cache = self.use(max_bytes=int(size * 3.5))
+        for lane in lanes[:3]:
+            route_cache.put(lane, None, route)
+        route_cache.get(lanes[0])
+        route_cache.put(lanes[3], None, route)
+        self.assertEqual([route_cache.get(lane) is not None for lane in lanes], [True, False, True, True])
+        self.assertEqual((cache.evictions, cache.bytes), (1, 3 * size))
+
+        # Replacing an entry doesn't count its old size twice
+        route_cache.put(lanes[3], None, route)
+        self.assertEqual((cache.evictions, cache.bytes), (1, 3 * size))
+
+    def test_stats(self):
+        self.use()
+        route_cache.get(self.LANE)
+        route_cache.put(self.LANE, None, {"routes": []})
+        route_cache.get(self.LANE)
+        route_cache.get(self.LANE)
+        stats = route_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.667)
+        self.assertGreater(stats["compressed_bytes"], 0)
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+
+    def test_round_trip(self):
+        geocode_cache.store("Dallas, TX", [-96.8, 32.78])
+        geocode_cache._memory.clear()
+        self.assertEqual(geocode_cache.lookup("  dallas ,tx. "), [-96.8, 32.78])
+
+    def test_database_errors_are_misses(self):
+        misses = geocode_cache.stats()["misses"]
+        with mock.patch.object(GeocodeCacheEntry.objects, "filter", side_effect=DatabaseError("locked")):
+            self.assertIsNone(geocode_cache.lookup("Dallas, TX"))
+        self.assertEqual(geocode_cache.stats()["misses"], misses + 1)
+
+    def test_database_hit_keeps_the_rows_remaining_ttl(self):
+        geocode_cache.store("Dallas, TX", [-96.8, 32.78])
+        ttl = geocode_cache._memory.ttl
+        GeocodeCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=ttl - 10))
+        geocode_cache._memory.clear()
+
+        self.assertEqual(geocode_cache.lookup("Dallas, TX"), [-96.8, 32.78])
+        _, expires_at = geocode_cache._memory._data["dallas, tx"]
+        self.assertLessEqual(expires_at - time.monotonic(), 10)
+
+        GeocodeCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=ttl + 1))
+        geocode_cache._memory.clear()
+        self.assertIsNone(geocode_cache.lookup("Dallas, TX"))
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_eviction_counts_the_table_every_n_writes(self):
+        count = mock.Mock(wraps=GeocodeCacheEntry.objects.count)
+        with mock.patch.object(geocode_cache, "EVICT_EVERY_WRITES", 3), \
+                override_settings(GEOCODE_CACHE_MAX_ENTRIES=2), \
+                mock.patch.object(GeocodeCacheEntry.objects, "count", count):
+            for i in range(5):
+                geocode_cache.store(f"Town {i}, TX", [-96.0 - i, 32.0])
+            self.assertEqual(count.call_count, 1)
+            self.assertEqual(GeocodeCacheEntry.objects.filter().count(), 4)
+
+            geocode_cache.store("Town 5, TX", [-101.0, 32.0])
+            self.assertEqual(count.call_count, 2)
+        self.assertEqual(
+            sorted(GeocodeCacheEntry.objects.values_list("query", flat=True)), ["town 4, tx", "town 5, tx"]
+        )
+        self.assertEqual(geocode_cache.stats()["db_entries"], 2)
+
+
+class GeocodeStageTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def remote(self, location, deadline=None):
+        with self.lock:
+            self.calls.append((location, deadline))
+        if location == "Nowhere":
+            return None
+        time.sleep(0.2)
+        return [-96.8, 32.78]
+
+    def geocode(self, locations, **kwargs):
+        with mock.patch.object(routing, "_geocode_remote", self.remote), \
+                mock.patch.object(geocode_cache, "lookup", return_value=None), \
+                mock.patch.object(geocode_cache, "store"):
+            return routing.geocode_locations(locations, **kwargs)
+
+    def test_lookups_run_concurrently_under_one_deadline(self):
+        started = time.monotonic()
+        coords = self.geocode(["Dallas, TX", "Tulsa, OK", "Austin, TX"], deadline_seconds=5)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(coords, [[-96.8, 32.78]] * 3)
+        self.assertEqual(len({deadline for _, deadline in self.calls}), 1)
+        self.assertLessEqual(self.calls[0][1], started + 5.1)
+
+    def test_deadline_covers_the_whole_stage(self):
+        started = time.monotonic()
+        with self.assertRaises(routing.GeocodingTimeout):
+            self.geocode(["Dallas, TX", "Tulsa, OK"], deadline_seconds=0.05)
+        self.assertLess(time.monotonic() - started, 0.15)
+
+    def test_first_failure_cancels_lookups_not_yet_started(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        started = time.monotonic()
+        with mock.patch.object(routing, "_geocode_pool", pool), self.assertRaises(routing.GeocodingError):
+            self.geocode(["Nowhere", "Dallas, TX", "Tulsa, OK", "Austin, TX"], deadline_seconds=5)
+        self.assertLess(time.monotonic() - started, 0.15)
+        pool.shutdown(wait=True)
+        # The lookup the worker picked up as the failure landed may run; the rest never start
+        self.assertLessEqual(len(self.calls), 2)
+
+
+class TripCreateTests(TestCase):
+    PLACES = {"Dallas, TX": [-96.80, 32.78], "Oklahoma City, OK": [-97.52, 35.47], "Tulsa, OK": [-95.99, 36.15]}
+
+    def setUp(self):
+        geocode_cache.clear()
+        route_cache.clear()
+        self.in_flight = self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def ors(self, method, url, timeout=None, params=None, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/geocode/search"):
+            with self.lock:
+                self.in_flight += 1
+                self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            time.sleep(0.1)
+            with self.lock:
+                self.in_flight -= 1
+            body = {"features": [{"geometry": {"coordinates": self.PLACES[params["text"]]}}]}
+        else:
+            self.assertEqual(kwargs["json"]["coordinates"], list(self.PLACES.values()))
+            body = {"features": [{
+                "geometry": {"coordinates": list(self.PLACES.values())},
+                "properties": {"summary": {"distance": 312.4, "duration": 18000.0},
+                               "segments": [{"distance": 105.0, "duration": 6000.0},
+                                            {"distance": 207.4, "duration": 12000.0}],
+                               "way_points": [0, 1, 2]},
+            }]}
+        response._content = json.dumps(body).encode()
+        return response
+
+    def test_create_geocodes_concurrently_and_saves_the_trip(self):
+        client = ORSClient("http://ors.test", max_retries=0, breaker={"failure_threshold": 100})
+        client.session.request = self.ors
+        with mock.patch.object(routing, "get_client", return_value=client):
+            response = APIClient().post("/api/trips/", {
+                "current_location": "Dallas, TX", "pickup_location": "Oklahoma City, OK",
+                "dropoff_location": "Tulsa, OK", "cycle_used_hours": 12,
+            }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.most_in_flight, 3)
+
+        trip = Trip.objects.get(pk=response.json()["trip_id"])
+        self.assertEqual((trip.status, trip.total_distance_miles), ("hos_compliant", Decimal("312.4")))
+        self.assertEqual([leg["miles"] for leg in trip.route_summary["segments"]], [105.0, 207.4])
+        self.assertEqual(trip.hos_plan, response.json()["hos"])
+        self.assertEqual(geocode_cache.lookup("tulsa, ok"), self.PLACES["Tulsa, OK"])
+
+
+class BatchStageDeadlineTests(TestCase):
+    def slow_geocode(self, location, deadline=None):
+        if location == "Nowhere":
+            return None
+        if location == "Slow":
+            time.sleep(0.5)
+        return [-96.8, 32.78]
+
+    def test_geocode_timeouts_are_told_apart_from_unknown_places(self):
+        with mock.patch.object(routing, "_geocode_remote", self.slow_geocode):
+            found, missing, slow = routing.geocode_locations(
+                ["Dallas, TX", "Nowhere", "Slow"], deadline_seconds=0.1, fail_fast=False)
+        self.assertEqual(found, [-96.8, 32.78])
+        self.assertIs(type(missing), routing.GeocodingError)
+        self.assertIsInstance(slow, routing.GeocodingTimeout)
+
+    def test_route_stage_has_a_deadline(self):
+        def route(coordinates, deadline=None):
+            if coordinates[0] == [0, 0]:
+                time.sleep(0.5)
+            return {"routes": []}
+
+        started = time.monotonic()
+        with mock.patch.object(routing, "get_truck_route", route):
+            fast, slow = routing.get_truck_routes([[[1, 1], [2, 2]], [[0, 0], [2, 2]]], deadline_seconds=0.1)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(fast, {"routes": []})
+        self.assertIsInstance(slow, routing.RoutingTimeout)
+
+    def test_batch_reports_timeouts_separately(self):
+        data = {"current_location": "Dallas, TX", "pickup_location": "Dallas, TX", "cycle_used_hours": 0}
+        items = [(0, {**data, "dropoff_location": "Nowhere"}), (1, {**data, "dropoff_location": "Slow"})]
+        with mock.patch.object(routing, "_geocode_remote", self.slow_geocode), \
+                self.settings(BATCH_STAGE_DEADLINE_SECONDS=0.1):
+            missing, slow = plan_trips_batch(items)
+        self.assertEqual(missing["message"], "Could not find location: Nowhere")
+        self.assertNotIn("timed_out", missing)
+        self.assertTrue(slow["timed_out"])
+        self.assertIn("timed out", slow["message"])
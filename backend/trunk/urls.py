@@ -1,11 +1,16 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import TripViewSet
+from .views import TripViewSet, driver_recap_view, metrics_view, plan_trip_async
 
 router = DefaultRouter()
 router.register(r'trips', TripViewSet, basename='trip')
 
 urlpatterns = [
+    # Ahead of the router, whose trips/<pk>/ pattern would otherwise claim it
+    path('trips/plan/', plan_trip_async, name='trip-plan'),
     path('', include(router.urls)),
     path('trips/<uuid:pk>/print-logs/', TripViewSet.as_view({'get': 'print_logs'}), name='print-logs'),
+    path('drivers/<str:driver_id>/recap/', driver_recap_view, name='driver-recap'),
+    # Scrapers are configured with /api/metrics; don't make them follow an APPEND_SLASH redirect
+    re_path(r'^metrics/?$', metrics_view, name='metrics'),
 ]
\ No newline at end of file
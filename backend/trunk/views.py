@@ -1,27 +1,126 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from .models import Trip
+from rest_framework.generics import get_object_or_404
+from rest_framework.reverse import reverse
+from .models import Trip, PlanningJob
 from .serializers import TripSerializer
-from .services.routing import geocode_location, get_truck_route
-from .services.hos_planner import plan_hos_compliant_trip
-from datetime import datetime
-from decimal import Decimal
+from .pagination import TripKeysetPagination
+from .services.trip_pipeline import (
+    calculate_route, calculate_hos, apply_hos, driver_recap, PlanningError,
+    acalculate_route, acalculate_hos, aapply_hos,
+)
+from .services.planning_queue import enqueue
+from .services.ors_client import ORSUnavailable
+from .services.batch_planner import plan_trips_batch
+from .services.hos_batch import evaluate_scenarios, scenarios_to_json
+from .services.recap import recap_to_json
+from .services.route_index import index_for_trip
+from .services.stops import fuel_stop_offsets
+from .services import metrics
+from .services.route_geometry import clip, geometry_for_trip, parse_bbox, select_level
+from .services import polyline
+from datetime import date
 import json
+import math
+import time
+import numpy as np
 import logging
+from django.conf import settings
 logger = logging.getLogger(__name__)
 
-import os
-from rest_framework.decorators import action
-from rest_framework.response import Response
-from .services.logsheet_generator import generate_daily_log_pdf
-import zipfile
-import io
-from django.http import HttpResponse
-from datetime import datetime
+from rest_framework.decorators import action, api_view
+from .services.logsheet_generator import stream_trip_logs_zip, log_filename
+from .services.artifact_cache import artifact_key, get_artifact
+from .services.fleet_export import ExportError, parse_bound, select_trips, stream_export_zip, export_merged_pdf
+import uuid
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+TERMINAL_STATUSES = ("hos_compliant", "failed")
+# A long poll holds a sync worker; clients poll again rather than park one for long
+STATUS_MAX_WAIT_SECONDS = 5.0
+MAX_WHAT_IF_SCENARIOS = 100_000
+
+
+def _axis_size(values, span, step):
+    """Points on a what-if axis: the explicit values, or arange(0, span, step) without building it."""
+    if values is not None:
+        return len(values)
+    return math.ceil(min(span / step, MAX_WHAT_IF_SCENARIOS + 1))
+
+
+def _float_list(value):
+    """Comma-separated numbers -> list of floats; ValueError on anything non-finite."""
+    if not value:
+        return None
+    values = [float(v) for v in value.split(',') if v.strip()]
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError("non-finite value")
+    return values
+
+
+# Columns that can be megabytes per row; the list view only loads them on request
+HEAVY_FIELDS = ('route_raw', 'route_summary', 'hos_plan')
+GEOMETRY_ENCODINGS = ('polyline', 'geojson')
+
+
+def _planning_error_response(error, response_class=Response):
+    response = response_class({"message": str(error)}, status=error.status_code)
+    if error.retry_after is not None:
+        response["Retry-After"] = str(max(1, math.ceil(error.retry_after)))
+    return response
+
+
+def _unknown_fields_response(unknown):
+    return Response({"message": f"Unknown fields: {', '.join(unknown)}"},
+                    status=status.HTTP_400_BAD_REQUEST)
+
 
 class TripViewSet(viewsets.ModelViewSet):
     queryset = Trip.objects.all().order_by('-created_at')
     serializer_class = TripSerializer
+    pagination_class = TripKeysetPagination
+
+    def get_queryset(self):
+        # Nothing but the trip's own geometry document is read for the map
+        if self.action == 'geometry':
+            return self.queryset.defer(*HEAVY_FIELDS)
+        return self.queryset.defer('route_geometry')
+
+    def _requested_fields(self, request):
+        """(fields, unknown) for `?fields=a,b`; fields is None when not given."""
+        requested = request.query_params.get('fields')
+        if not requested:
+            return None, []
+        fields = [f.strip() for f in requested.split(',') if f.strip()]
+        return fields, [f for f in fields if f not in TripSerializer.Meta.fields]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Paginated, lightweight listing: {"next", "page_size", "results"}, see
+        TripKeysetPagination. `?fields=id,status,...` picks the fields to
+        return; heavy JSON columns are deferred at the ORM level unless
+        explicitly requested. `?status=` and `?driver_id=` filter.
+        """
+        fields, unknown = self._requested_fields(request)
+        if unknown:
+            return _unknown_fields_response(unknown)
+        if fields is None:
+            fields = [f for f in TripSerializer.Meta.fields if f not in HEAVY_FIELDS]
+
+        deferred = [f for f in HEAVY_FIELDS if f not in fields]
+        queryset = self.filter_queryset(self.get_queryset()).defer(*deferred)
+        for name in ('status', 'driver_id'):
+            value = request.query_params.get(name)
+            if value is not None:
+                queryset = queryset.filter(**{name: value})
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True, fields=fields)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -31,224 +130,429 @@ class TripViewSet(viewsets.ModelViewSet):
                 "errors": serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Geocode locations
         locations = [
             request.data['current_location'],
             request.data['pickup_location'],
             request.data['dropoff_location']
         ]
-        coords = []
-        for loc in locations:
-            coord = geocode_location(loc)
-            if not coord:
-                return Response({"message": f"Could not find location: {loc}"}, 
-                              status=status.HTTP_400_BAD_REQUEST)
-            coords.append(coord)
-
-        # Get route
-        route_data = get_truck_route(coords)
-        if not route_data or ('routes' not in route_data and 'features' not in route_data):
-            logger.exception(f"Route failed: {route_data}")
-            return Response({"message": "Route calculation failed"}, status=500)
-
-        # Extract routes safely
-        # SAFE: Handle BOTH old + geojson formats
-        if 'routes' in route_data:
-            # Old JSON format
-            route = route_data['routes'][0]
-            summary = route['summary']
-
-        elif 'features' in route_data:
-            # GeoJSON format (what you're actually using)
-            feature = route_data['features'][0]
-            summary = feature['properties']['summary']
-
-        else:
-            logger.error(f"Invalid ORS response format: {route_data}")
-            return Response({"message": "Invalid route format"}, status=500)
-
-        total_miles = Decimal(summary['distance'])
-        total_hours = Decimal(summary['duration']) / 3600
-
-        # CRITICAL FIX: Convert Decimal → float before JSON
-        total_miles_float = float(total_miles)
-        total_hours_float = round(float(total_hours), 2)
-
-        # Build clean summary with only JSON-serializable types
-        route_summary_clean = {
-            "total_distance_miles": total_miles_float,
-            "total_driving_hours": total_hours_float,
-            "segments": [
-                {
-                    "from": locations[0],
-                    "to": locations[1],
-                    "miles": total_miles_float * 0.4,  # placeholder split
-                    "hours": total_hours_float * 0.4
-                },
-                {
-                    "from": locations[1],
-                    "to": locations[2],
-                    "miles": total_miles_float * 0.6,
-                    "hours": total_hours_float * 0.6
-                }
-            ]
-        }
 
-        # Save trip — now safe for JSONField
-        trip = serializer.save(
-            total_distance_miles=total_miles,
-            total_driving_hours=total_hours,
-            route_raw=route_data,
-            route_summary=route_summary_clean,   # ← Now 100% JSON-safe
-            status="route_calculated"
-        )
+        if self._wants_async(request):
+            trip = serializer.save(status="pending")
+            enqueue(trip)
+            return Response({
+                "trip_id": str(trip.id),
+                "message": "Trip queued for planning",
+                "status": trip.status,
+                "status_url": reverse('trip-planning-status', args=[trip.id], request=request)
+            }, status=status.HTTP_202_ACCEPTED)
 
-        total_driving_seconds = int(summary['duration'])
+        try:
+            route_fields = calculate_route(locations)
+        except PlanningError as e:
+            return _planning_error_response(e)
 
-        # Run HOS planner
-        hos_result = plan_hos_compliant_trip(
-            total_driving_seconds=int(total_driving_seconds),
-            cycle_used_hours=Decimal(str(request.data['cycle_used_hours']))
-        )
+        # Save trip — route_fields are JSON-safe
+        with metrics.timer("save_route"):
+            trip = serializer.save(**route_fields, status="route_calculated")
 
-        # Save HOS plan
-        trip.hos_plan = hos_result
-        trip.hos_computed_at = datetime.now()
-        trip.status = "hos_compliant"
-        trip.save()
+        # Run HOS planner and save
+        hos_result = calculate_hos(trip)
+        apply_hos(trip, hos_result)
 
         return Response({
             "trip_id": str(trip.id),
             "message": "Route calculated successfully!",
-            "route": route_summary_clean,
+            "route": trip.route_summary,
             "hos": hos_result
         }, status=status.HTTP_201_CREATED)
 
+    def retrieve(self, request, *args, **kwargs):
+        """One trip; `?fields=` picks fields as in list (the map page skips route_raw)."""
+        fields, unknown = self._requested_fields(request)
+        if unknown:
+            return _unknown_fields_response(unknown)
+        if fields is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        deferred = [f for f in HEAVY_FIELDS if f not in fields]
+        trip = get_object_or_404(self.get_queryset().defer(*deferred), pk=kwargs['pk'])
+        self.check_object_permissions(request, trip)
+        return Response(self.get_serializer(trip, fields=fields).data)
+
+    def _wants_async(self, request):
+        flag = request.query_params.get('async')
+        if flag is None:
+            return settings.TRIP_PLANNING_ASYNC
+        return flag.lower() in ('1', 'true', 'yes')
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch_create(self, request):
+        """
+        Plan many trips in one request: {"trips": [{...}, {...}]}.
+        Each item is reported separately; invalid or unroutable items don't
+        stop the rest of the batch.
+        """
+        items = request.data.get('trips') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({"message": "Expected a non-empty list of trips"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BATCH_MAX_TRIPS:
+            return Response({"message": f"At most {settings.BATCH_MAX_TRIPS} trips per batch"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results.append({"index": index, "ok": False, "message": "Invalid data",
+                                "errors": serializer.errors})
+
+        if valid:
+            try:
+                results.extend(plan_trips_batch(valid))
+            except ORSUnavailable as e:
+                # Nothing in the batch can be routed until ORS recovers
+                return _planning_error_response(
+                    PlanningError(str(e), status_code=503, transient=True, retry_after=e.retry_after))
+        results.sort(key=lambda r: r["index"])
+
+        created = sum(1 for r in results if r["ok"])
+        return Response({
+            "created": created,
+            "failed": len(results) - created,
+            "results": results
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'], url_path='what-if')
+    def what_if(self, request, pk=None):
+        """
+        HOS outcome of this trip's lane across a grid of starting cycle hours
+        and departure hours. Query params (all optional):
+        cycle_step (default 1), departure_step (default 1),
+        cycles=0,10,35 and departures=5,6,7 to pass explicit values.
+        """
+        trip = self.get_object()
+        if trip.total_driving_hours is None:
+            return Response({"error": "Trip has no route yet"}, status=400)
+
+        params = request.query_params
+        try:
+            cycles = _float_list(params.get('cycles'))
+            departures = _float_list(params.get('departures'))
+            cycle_step = float(params.get('cycle_step', 1))
+            departure_step = float(params.get('departure_step', 1))
+        except ValueError:
+            return Response({"error": "Invalid scenario parameters"}, status=400)
+        if not (math.isfinite(cycle_step) and cycle_step > 0
+                and math.isfinite(departure_step) and departure_step > 0):
+            return Response({"error": "Invalid scenario parameters"}, status=400)
+        # Size the grid before np.arange builds it: a tiny step would allocate gigabytes
+        cycle_count = _axis_size(cycles, 70 + 1e-9, cycle_step)
+        departure_count = _axis_size(departures, 24, departure_step)
+        if not cycle_count or not departure_count or cycle_count * departure_count > MAX_WHAT_IF_SCENARIOS:
+            return Response({"error": "Invalid scenario parameters"}, status=400)
+
+        cycles = np.asarray(cycles if cycles is not None else np.arange(0, 70 + 1e-9, cycle_step), dtype=float)
+        departures = np.asarray(departures if departures is not None else np.arange(0, 24, departure_step),
+                                dtype=float)
+        if not (np.isfinite(cycles).all() and np.isfinite(departures).all()) \
+                or cycles.min() < 0 or cycles.max() > 70 or departures.min() < 0 or departures.max() >= 24:
+            return Response({"error": "Invalid scenario parameters"}, status=400)
+
+        index = index_for_trip(trip)
+        result = evaluate_scenarios(
+            total_driving_seconds=int(round(trip.total_driving_hours * 3600)),
+            cycle_used_hours=cycles,
+            departure_hours=departures,
+            fuel_stops=fuel_stop_offsets(index) if index is not None else (),
+        )
+        return Response({
+            "trip_id": str(trip.id),
+            "total_driving_hours": float(trip.total_driving_hours),
+            **scenarios_to_json(result)
+        })
+
+    @action(detail=True, methods=['get'], url_path='position')
+    def position(self, request, pk=None):
+        """
+        Where the truck is along the route at `?mile=X` or `?hour=Y` of
+        driving (comma-separated lists allowed), via the trip's RouteIndex.
+        """
+        trip = self.get_object()
+        index = index_for_trip(trip)
+        if index is None:
+            return Response({"error": "Trip has no route geometry"}, status=400)
+
+        try:
+            miles = _float_list(request.query_params.get('mile'))
+            hours = _float_list(request.query_params.get('hour'))
+        except ValueError:
+            return Response({"error": "Invalid position parameters"}, status=400)
+        if (miles is None) == (hours is None):
+            return Response({"error": "Pass either mile or hour"}, status=400)
+        requested = miles if miles is not None else hours
+        if not requested or len(requested) > 1000:
+            return Response({"error": "Invalid position parameters"}, status=400)
+
+        if miles is None:
+            seconds = np.clip(np.asarray(hours) * 3600, 0, index.total_seconds)
+            miles = index.mile_at_seconds(seconds)
+        else:
+            miles = np.clip(np.asarray(miles), 0, index.total_miles)
+            seconds = index.seconds_at_mile(miles)
+        points = index.position_at_mile(miles)
+
+        return Response({
+            "trip_id": str(trip.id),
+            "positions": [
+                {"mile": round(float(m), 2), "hour": round(float(s) / 3600, 3),
+                 "lon": round(float(lon), 6), "lat": round(float(lat), 6)}
+                for m, s, (lon, lat) in zip(np.atleast_1d(miles), np.atleast_1d(seconds), points.reshape(-1, 2))
+            ]
+        })
+
+    @action(detail=True, methods=['get'], url_path='geometry')
+    def geometry(self, request, pk=None):
+        """
+        The route line for a map, simplified for `?zoom=Z` (web-map zoom) or
+        `?tolerance=M` meters, else for the zoom that shows the whole route.
+        `?bbox=min_lon,min_lat,max_lon,max_lat` keeps only the parts crossing
+        the viewport. `?encoding=polyline` (default, precision 5, one string
+        per part) or `geojson`.
+        """
+        trip = self.get_object()
+        params = request.query_params
+        try:
+            zoom = int(params['zoom']) if 'zoom' in params else None
+            tolerance = float(params['tolerance']) if 'tolerance' in params else None
+            bbox = parse_bbox(params['bbox']) if 'bbox' in params else None
+        except ValueError:
+            return Response({"error": "Invalid geometry parameters"}, status=400)
+        encoding = params.get('encoding', 'polyline')
+        if encoding not in GEOMETRY_ENCODINGS or (zoom is not None and not 0 <= zoom <= 24) \
+                or (tolerance is not None and not tolerance >= 0):
+            return Response({"error": "Invalid geometry parameters"}, status=400)
+
+        geometry = geometry_for_trip(trip)
+        if geometry is None:
+            return Response({"error": "Trip has no route geometry"}, status=400)
+        level = select_level(geometry, zoom=zoom, tolerance=tolerance)
+
+        if bbox is None and encoding == 'polyline':
+            # Served as stored, without decoding
+            parts, encoded = None, [level["polyline"]]
+            points = level["points"]
+        else:
+            parts = [polyline.decode(level["polyline"])]
+            if bbox is not None:
+                parts = clip(parts[0], bbox)
+            points = sum(len(part) for part in parts)
+            encoded = [polyline.encode(part) for part in parts] if encoding == 'polyline' else None
+
+        body = {
+            "trip_id": str(trip.id),
+            "zoom": level["zoom"],
+            "tolerance_m": level["tolerance_m"],
+            "bbox": geometry["bbox"],
+            "points": points,
+            "encoding": encoding,
+        }
+        if encoding == 'polyline':
+            body["polylines"] = encoded
+        elif bbox is None:
+            body["geometry"] = {"type": "LineString", "coordinates": parts[0]}
+        else:
+            body["geometry"] = {"type": "MultiLineString", "coordinates": parts}
+        return Response(body)
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def planning_status(self, request, pk=None):
+        """
+        Progress of a trip. `?wait=N` long-polls up to N seconds (at most
+        STATUS_MAX_WAIT_SECONDS) for the status to move past `?since=<status>`
+        (default: current status).
+        """
+        trip = self.get_object()
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), STATUS_MAX_WAIT_SECONDS)
+        except ValueError:
+            wait = 0.0
+        since = request.query_params.get('since', trip.status)
+
+        deadline = time.monotonic() + wait
+        while trip.status == since and trip.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(0.5)
+            trip.refresh_from_db(fields=['status'])
+
+        job = PlanningJob.objects.filter(trip=trip).first()
+        return Response({
+            "trip_id": str(trip.id),
+            "status": trip.status,
+            "done": trip.status in TERMINAL_STATUSES,
+            "job": {
+                "state": job.state,
+                "attempts": job.attempts,
+                "error": job.error or None,
+            } if job else None
+        })
+
+    @action(detail=True, methods=['get'], url_path='logs/pdf')
+    def logs_pdf(self, request, pk=None):
+        """All days of the trip as one PDF, served from the artifact cache (rendered in memory on a miss)."""
+        trip = self.get_object()
+        if not trip.hos_plan:
+            return Response({"error": "No HOS plan"}, status=400)
+        response = self._artifact_response(request, trip, "pdf")
+        if request.query_params.get('download') == '1' and response.status_code == 200:
+            response["Content-Disposition"] = f'attachment; filename="{log_filename(trip)}"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='logs/zip')
+    def logs_zip(self, request):
+        """`?ids=<uuid>,<uuid>,...`: one PDF per trip, streamed as a zip."""
+        try:
+            ids = [uuid.UUID(v) for v in request.query_params.get('ids', '').split(',') if v.strip()]
+        except ValueError:
+            return Response({"error": "Invalid trip id"}, status=400)
+        if not ids or len(ids) > settings.BATCH_MAX_TRIPS:
+            return Response({"error": f"Pass between 1 and {settings.BATCH_MAX_TRIPS} trip ids"}, status=400)
+
+        trips = list(Trip.objects.filter(id__in=ids, hos_plan__isnull=False).defer('route_raw'))
+        if not trips:
+            return Response({"error": "No planned trips found"}, status=404)
+        position = {trip_id: i for i, trip_id in enumerate(ids)}
+        trips.sort(key=lambda trip: position[trip.id])
+
+        response = StreamingHttpResponse(
+            stream_trip_logs_zip(trips, render=lambda trip: get_artifact(trip, "pdf").data),
+            content_type="application/zip",
+        )
+        response["Content-Disposition"] = 'attachment; filename="trip_logs.zip"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_logs(self, request):
+        """
+        Logs of every planned trip created in [?start, ?end) (YYYY-MM-DD or ISO
+        datetimes). `?output=zip` (default) streams, rendering through the
+        artifact cache in this process (the export_logs command is the way
+        to render a large range on every core); `?output=pdf` returns one
+        merged PDF for smaller ranges.
+        """
+        try:
+            start = parse_bound(request.query_params.get('start', ''))
+            end = parse_bound(request.query_params.get('end', ''))
+        except ExportError as e:
+            return Response({"error": str(e)}, status=400)
+        fmt = request.query_params.get('output', 'zip')   # ?format= is DRF's content negotiation
+        if fmt not in ('zip', 'pdf'):
+            return Response({"error": "output must be zip or pdf"}, status=400)
+
+        trips = select_trips(start, end)
+        count = trips.count()
+        if not count:
+            return Response({"error": "No planned trips in that range"}, status=404)
+        if count > settings.EXPORT_MAX_TRIPS:
+            return Response({"error": f"{count} trips exceeds EXPORT_MAX_TRIPS ({settings.EXPORT_MAX_TRIPS})"}, status=400)
+
+        filename = f"logs_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}"
+        if fmt == 'pdf':
+            try:
+                response = HttpResponse(export_merged_pdf(list(trips)).getvalue(), content_type="application/pdf")
+            except ExportError as e:
+                return Response({"error": str(e)}, status=400)
+        else:
+            response = StreamingHttpResponse(
+                stream_export_zip(trips.iterator(chunk_size=200), workers=1), content_type="application/zip"
+            )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["X-Trip-Count"] = str(count)
+        return response
+
     @action(detail=True, methods=['get'], url_path='logs')
     def print_logs(self, request, pk=None):
         trip = self.get_object()
         if not trip.hos_plan:
             return Response({"error": "No HOS plan"}, status=400)
+        return self._artifact_response(request, trip, "html")
 
-        logs_html = ""
-        for day in trip.hos_plan["daily_plan"]:
-            if not isinstance(day.get("day"), int):
-                continue
-
-            start_hour = 5
-            pickup_end = start_hour + 1
-            driving_start = pickup_end
-            driving_end = driving_start + day['driving_hours']
-            break_inserted = day.get('includes_30min_break', False)
-            break_at = driving_start + 8 if break_inserted else driving_end
-            off_duty_at = start_hour + 14
-
-            logs_html += f"""
-            <div class="log-page">
-                <div class="fmsca-header">
-                    <h1>DRIVER'S RECORD OF DUTY STATUS</h1>
-                    <p class="rule">Property-Carrying • 70-Hour/8-Day Rule • §395.8</p>
-                </div>
-
-                <table class="info-grid">
-                    <tr><td class="label">Date:</td><td>{day['date']}</td><td class="label">24-Hour Period Starting:</td><td>{day['start_time']}</td></tr>
-                    <tr><td class="label">Driver Name:</td><td colspan="3" class="underline">________________________________________________</td></tr>
-                    <tr><td class="label">Main Office:</td><td>{trip.current_location}</td><td class="label">Home Terminal:</td><td>{trip.current_location}</td></tr>
-                    <tr><td class="label">Trip:</td><td colspan="3">{trip.pickup_location} to {trip.dropoff_location}</td></tr>
-                </table>
-
-                <div class="graph-container">
-                    <div class="hour-labels">
-                        {"".join(f'<span style="left: calc({i} * 4.1666%)">{i}</span>' for i in range(25))}
-                    </div>
-                    <svg viewBox="0 0 1200 400" preserveAspectRatio="xMidYMid meet">
-                        <!-- 4 Official Horizontal Lines -->
-                        <line x1="0" y1="80"  x2="1200" y2="80"  stroke="#ccc" stroke-width="3"/>  <!-- Line 1: Off Duty -->
-                        <line x1="0" y1="160" x2="1200" y2="160" stroke="#ccc" stroke-width="3"/>  <!-- Line 2: Sleeper Berth -->
-                        <line x1="0" y1="240" x2="1200" y2="240" stroke="#ccc" stroke-width="3"/>  <!-- Line 3: Driving -->
-                        <line x1="0" y1="320" x2="1200" y2="320" stroke="#ccc" stroke-width="3"/>  <!-- Line 4: On Duty ND -->
-
-                        <!-- Vertical grid -->
-                        <g stroke="#ddd" stroke-width="1">
-                            {"".join(f'<line x1="{50*i}" y1="40" x2="{50*i}" y2="360"/>' for i in range(25))}
-                        </g>
-
-                        <!-- ACTUAL DUTY STATUS LINES (THICK & COLORED) -->
-                        <!-- Line 1: Off Duty (Black) -->
-                        <line x1="0" y1="80" x2="{50*pickup_end}" y2="80" stroke="black" stroke-width="12"/>
-                        <line x1="{50*off_duty_at}" y1="80" x2="1200" y2="80" stroke="black" stroke-width="12"/>
-
-                        <!-- Line 2: Sleeper Berth (Gray) — NOT USED IN THIS PLAN -->
-                        <!-- (Left empty — correct for property-carrying) -->
-
-                        <!-- Line 3: Driving (Blue) -->
-                        <line x1="{50*driving_start}" y1="240" x2="{50*driving_end}" y2="240" stroke="#0066cc" stroke-width="14"/>
-
-                        <!-- Line 4: On Duty Not Driving (Orange) -->
-                        <line x1="{50*pickup_end}" y1="320" x2="{50*driving_start}" y2="320" stroke="#ff9900" stroke-width="14"/>
-                        {f'<line x1="{50*break_at}" y1="320" x2="{50*(break_at + 0.5)}" y2="320" stroke="#ff9900" stroke-width="14"/>' if break_inserted else ''}
-
-                        <!-- Legend -->
-                        <text x="20" y="390" font-size="18" fill="#000" font-weight="bold">
-                            Line 1: Off Duty | Line 2: Sleeper Berth | Line 3: Driving | Line 4: On Duty (Not Driving)
-                        </text>
-                    </svg>
-                </div>
-
-                <table class="totals">
-                    <tr><td>Total Miles Today:</td><td>~{int(trip.total_distance_miles / trip.hos_plan['total_days_needed'])} mi</td></tr>
-                    <tr><td>Driving:</td><td>{day['driving_hours']} hours</td></tr>
-                    <tr><td>On Duty:</td><td>{day['on_duty_hours']} hours</td></tr>
-                    <tr><td>Remarks:</td><td>
-                        {'30-minute break taken' if break_inserted else 'None'}
-                        {', Fuel stop' if day.get('fuel_stop') else ''}
-                    </td></tr>
-                </table>
-
-                <div class="signature">
-                    <p>I certify this log is true and correct.</p>
-                    <p>Driver Signature: _________________________________________ Date: __________</p>
-                </div>
-            </div>
-            """
-
-        css = """
-        <style>
-            @page { size: landscape letter; margin: 0.5in; }
-            body { font-family: Arial, sans-serif; margin: 0; background: #f8f9fa; }
-            .log-page { background: white; padding: 40px; margin: 20px auto; max-width: 11in; box-shadow: 0 5px 25px rgba(0,0,0,0.15); page-break-after: always; }
-            .fmsca-header { text-align: center; border-bottom: 6px solid #002856; padding: 20px; background: #002856; color: white; margin-bottom: 30px; }
-            .fmsca-header h1 { margin: 0; font-size: 32px; }
-            .rule { font-size: 18px; margin: 10px 0; }
-            .info-grid { width: 100%; border-collapse: collapse; margin: 20px 0; font-size: 15px; }
-            .info-grid td { padding: 12px; border: 2px solid #333; }
-            .info-grid .label { background: #e3f2fd; font-weight: bold; width: 28%; }
-            .underline { border-bottom: 2px solid #000; display: inline-block; width: 95%; }
-            .graph-container { position: relative; width: 1200px; margin: 40px auto; }
-            .hour-labels { position: absolute; top: -35px; width: 1200px; }
-            .hour-labels span { position: absolute; font-weight: bold; font-size: 14px; transform: translateX(-50%); }
-            svg { border: 5px solid black; background: white; width: 1200px; height: 400px; }
-            .totals { width: 70%; margin: 30px auto; border-collapse: collapse; font-size: 18px; }
-            .totals td { padding: 15px; border: 2px solid black; }
-            .totals td:first-child { background: #f0f0f0; font-weight: bold; }
-            .signature { margin-top: 60px; text-align: center; font-size: 18px; }
-            button { position: fixed; top: 20px; right: 40px; padding: 20px 50px; background: #002856; color: white; font-size: 22px; border: none; border-radius: 10px; cursor: pointer; box-shadow: 0 6px 20px rgba(0,0,0,0.3); }
-            @media print { button { display: none; } body { background: white; } }
-        </style>
-        """
-
-        return HttpResponse(f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>FMCSA Official Logs</title>
-            {css}
-        </head>
-        <body>
-            <button onclick="window.print()">PRINT ALL LOGS</button>
-            <h1 style="text-align:center; color:#002856; margin:50px 0; font-size:40px;">OFFICIAL FMCSA DAILY LOGS</h1>
-            {logs_html}
-        </body>
-        </html>
-        """, content_type="text/html")
\ No newline at end of file
+    def _artifact_response(self, request, trip, kind):
+        """
+        Cached rendering of the trip's logs. The artifact key is the ETag and
+        hos_computed_at the Last-Modified, so revalidating clients get a 304
+        without anything being rendered or read.
+        """
+        key = artifact_key(trip, kind)
+        last_modified = int(trip.hos_computed_at.timestamp()) if trip.hos_computed_at else None
+        not_modified = get_conditional_response(request, etag=f'"{key}"', last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        artifact = get_artifact(trip, kind, key)
+        response = HttpResponse(artifact.data, content_type=artifact.content_type)
+        response["ETag"] = artifact.etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+@api_view(['GET'])
+def driver_recap_view(request, driver_id):
+    """Rolling 70-hour/8-day recap for a driver, as of today."""
+    today = date.today()
+    recap = driver_recap(driver_id, today)
+    if recap is None:
+        return Response({"message": "No recap stored for this driver"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"driver_id": driver_id, **recap_to_json(recap, today)})
+
+
+@csrf_exempt
+@require_POST
+async def plan_trip_async(request):
+    """
+    POST /api/trips/plan/: TripViewSet.create as a native async view, with
+    the same body and response. Under ASGI the ORS calls are awaited on the
+    event loop (geocodes concurrently), so a worker holds many in-flight
+    trips without a thread each; the ORM saves use the async API.
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"message": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = TripSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse({
+            "message": "Invalid data",
+            "errors": serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    fields = serializer.validated_data
+    locations = [fields['current_location'], fields['pickup_location'], fields['dropoff_location']]
+    try:
+        route_fields = await acalculate_route(locations)
+    except PlanningError as e:
+        return _planning_error_response(e, JsonResponse)
+
+    trip = Trip(**fields, **route_fields, status="route_calculated")
+    with metrics.timer("save_route"):
+        await trip.asave()
+
+    hos_result = await acalculate_hos(trip)
+    await aapply_hos(trip, hos_result)
+
+    return JsonResponse({
+        "trip_id": str(trip.id),
+        "message": "Route calculated successfully!",
+        "route": trip.route_summary,
+        "hos": hos_result
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+def metrics_view(request):
+    """Stage/ORS/request latency histograms and cache counters, Prometheus text format."""
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
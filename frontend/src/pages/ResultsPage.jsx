@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect } from "react";
 import { useParams } from "react-router-dom";
-import { MapContainer, TileLayer, Polyline } from "react-leaflet";
+import { MapContainer, TileLayer, Polyline, useMapEvents } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
 import L from "leaflet";
 
@@ -16,19 +16,99 @@ L.Icon.Default.mergeOptions({
     "https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png",
 });
 
+const API = "https://trunk-trip-planner-3.onrender.com/api";
+const TRIP_FIELDS = "id,current_location,dropoff_location,total_distance_miles";
+
+// Encoded polyline (precision 5) -> [[lat, lng], ...] for Leaflet
+function decodePolyline(encoded) {
+  const points = [];
+  let index = 0, lat = 0, lng = 0;
+  while (index < encoded.length) {
+    for (const axis of [0, 1]) {
+      let result = 0, shift = 0, b;
+      do {
+        b = encoded.charCodeAt(index++) - 63;
+        result |= (b & 0x1f) << shift;
+        shift += 5;
+      } while (b >= 0x20);
+      const delta = result & 1 ? ~(result >> 1) : result >> 1;
+      if (axis === 0) lat += delta;
+      else lng += delta;
+    }
+    points.push([lat / 1e5, lng / 1e5]);
+  }
+  return points;
+}
+
+// Starts from the whole-route overview; once zoomed in past it, asks the
+// geometry endpoint for the finer level, clipped to the area around the view
+function RouteLine({ tripId, overview }) {
+  const [detail, setDetail] = useState(null);
+  const [view, setView] = useState(null);
+  const zoomedIn = view !== null && view.zoom > overview.zoom;
+  const map = useMapEvents({
+    moveend: () => setView({ zoom: map.getZoom(), bounds: map.getBounds().pad(0.5) }),
+  });
+
+  useEffect(() => {
+    if (!zoomedIn) return;
+    const controller = new AbortController();
+    const b = view.bounds;
+    const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()]
+      .map((v) => v.toFixed(5))
+      .join(",");
+    fetch(`${API}/trips/${tripId}/geometry/?zoom=${view.zoom}&bbox=${bbox}`, {
+      signal: controller.signal,
+    })
+      .then((r) => r.json())
+      .then((data) => setDetail(data.polylines.map(decodePolyline)))
+      .catch(() => {});
+    return () => controller.abort();
+  }, [tripId, view, zoomedIn]);
+
+  return (
+    <Polyline
+      positions={zoomedIn && detail ? detail : overview.parts}
+      color="#4f46e5"
+      weight={8}
+      opacity={0.9}
+    />
+  );
+}
+
 export default function ResultsPage() {
   const { id } = useParams();
   const [trip, setTrip] = useState(null);
+  const [overview, setOverview] = useState(null);
+  const [mapUnavailable, setMapUnavailable] = useState(false);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    fetch(`https://trunk-trip-planner-3.onrender.com/api/trips/${id}/`)
+    // Only the summary fields: route_raw is the full ORS response
+    fetch(`${API}/trips/${id}/?fields=${TRIP_FIELDS}`)
       .then((r) => r.json())
       .then((data) => {
         setTrip(data);
         setLoading(false);
       })
       .catch(() => setLoading(false));
+
+    // A failed or empty geometry response ends in the unavailable state, not endless loading
+    fetch(`${API}/trips/${id}/geometry/`)
+      .then((r) => (r.ok ? r.json() : null))
+      .then((data) => {
+        if (!data || !data.polylines || !data.polylines.length) {
+          setMapUnavailable(true);
+          return;
+        }
+        const [w, s, e, n] = data.bbox;
+        setOverview({
+          zoom: data.zoom,
+          parts: data.polylines.map(decodePolyline),
+          bounds: [[s, w], [n, e]],
+        });
+      })
+      .catch(() => setMapUnavailable(true));
   }, [id]);
 
   if (loading)
@@ -42,10 +122,6 @@ export default function ResultsPage() {
       </div>
     );
 
-  // EXTRACT COORDINATES — WORKS WITH ORS /geojson
-  const coords = trip.route_raw?.routes?.[0]?.geometry?.coordinates || [];
-  const routeCoords = coords.map((c) => [c[1], c[0]]); // [lat, lng]
-
   return (
     <div className="min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100 py-12">
       <div className="max-w-7xl mx-auto px-6">
@@ -59,19 +135,18 @@ export default function ResultsPage() {
               Route Map
             </h2>
             <div className="h-96 rounded-2xl overflow-hidden">
-              {routeCoords.length > 0 ? (
+              {overview ? (
                 <MapContainer
-                  bounds={routeCoords}
+                  bounds={overview.bounds}
                   style={{ height: "100%", width: "100%" }}
                 >
                   <TileLayer url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png" />
-                  <Polyline
-                    positions={routeCoords}
-                    color="#4f46e5"
-                    weight={8}
-                    opacity={0.9}
-                  />
+                  <RouteLine tripId={id} overview={overview} />
                 </MapContainer>
+              ) : mapUnavailable ? (
+                <div className="h-full bg-gray-200 flex items-center justify-center text-gray-600">
+                  Route map unavailable
+                </div>
               ) : (
                 <div className="h-full bg-gray-200 flex items-center justify-center text-gray-600">
                   Route loading...
@@ -103,7 +178,7 @@ export default function ResultsPage() {
 
         <div className="text-center">
           <a
-            href={`https://trunk-trip-planner-3.onrender.com/api/trips/${id}/logs/`}
+            href={`${API}/trips/${id}/logs/`}
             target="_blank"
             rel="noopener noreferrer"
             className="inline-block px-24 py-12 bg-gradient-to-r from-indigo-800 to-purple-900 text-white text-5xl font-bold rounded-3xl shadow-3xl hover:shadow-4xl transform hover:scale-110 transition-all duration-300"